@@ -0,0 +1,318 @@
+"""
+Прием задач транскрибации с учетом длительности аудио
+
+Раньше каждая задача сразу получала свой поток, и несколько многочасовых
+загрузок одновременно могли исчерпать память. AdmissionController перед
+приемом задачи:
+- определяет длительность файлов по заголовкам (audio_probe), а для
+  загрузок, данные которых еще не пришли, - по заявленному размеру;
+- оценивает время обработки по медианному RTF последних транскрибаций
+  (TRANSCRIPTION_DEFAULT_RTF, пока истории нет);
+- проверяет свободное место на диске и свободную память под
+  декодированное аудио;
+- отклоняет задачу с 503 и Retry-After, если очередь уже длиннее
+  TRANSCRIPTION_MAX_BACKLOG_SECONDS обработки, иначе ставит ее в очередь и
+  возвращает ожидаемое время готовности.
+Одновременно выполняется не больше TRANSCRIPTION_MAX_ACTIVE_JOBS задач,
+остальные ждут своей очереди в порядке поступления.
+"""
+
+import math
+import os
+import statistics
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import metrics
+from audio_probe import probe_audio
+from utils import check_disk_space
+
+# Наибольшая очередь в секундах обработки (оценка по RTF)
+MAX_BACKLOG_SECONDS = float(os.environ.get("TRANSCRIPTION_MAX_BACKLOG_SECONDS", 2 * 3600))
+# Задач, транскрибируемых одновременно
+MAX_ACTIVE_JOBS = int(os.environ.get("TRANSCRIPTION_MAX_ACTIVE_JOBS", 2))
+# RTF, пока нет истории транскрибаций
+DEFAULT_RTF = float(os.environ.get("TRANSCRIPTION_DEFAULT_RTF", 1.0))
+# Запас свободного места на диске и свободной памяти
+MIN_FREE_DISK_MB = int(os.environ.get("TRANSCRIPTION_MIN_FREE_DISK_MB", 500))
+MIN_FREE_MEMORY_MB = int(os.environ.get("TRANSCRIPTION_MIN_FREE_MEMORY_MB", 512))
+
+# Память на секунду аудио при декодировании через pydub: исходный PCM
+# (до 44.1 кГц стерео), его копия в массиве, float32 и окно 16 кГц
+MEMORY_PER_AUDIO_SECOND = 700 * 1024
+# Байт в секунду для оценки длительности по размеру файла: WAV 16 кГц
+# моно, сжатые форматы - 128 кбит/с
+BYTES_PER_SECOND = {".wav": 32000}
+DEFAULT_BYTES_PER_SECOND = 16000
+# Сколько последних транскрибаций учитывать в RTF
+RTF_HISTORY = 100
+
+
+def estimate_duration(path: Optional[Path] = None, size: Optional[int] = None,
+                      filename: str = "") -> float:
+    """
+    Длительность файла в секундах без декодирования
+
+    Args:
+        path: Файл на диске (может быть загружен не до конца)
+        size: Заявленный размер файла в байтах
+        filename: Имя файла (расширение для оценки по размеру)
+
+    Returns:
+        float: Длительность по заголовкам или оценка по размеру (0, если
+        неизвестно ни то, ни другое)
+    """
+    if path is not None and Path(path).exists() and Path(path).stat().st_size:
+        info = probe_audio(Path(path))
+        if info is not None and info.get("duration_seconds"):
+            return info["duration_seconds"]
+        size = size or Path(path).stat().st_size
+    if not size:
+        return 0.0
+    suffix = Path(filename or str(path or "")).suffix.lower()
+    return size / BYTES_PER_SECOND.get(suffix, DEFAULT_BYTES_PER_SECOND)
+
+
+def available_memory() -> Optional[int]:
+    """Доступная память (MemAvailable из /proc/meminfo) или None"""
+    try:
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def historical_rtf(values: List[float], default: float = DEFAULT_RTF) -> float:
+    """Медианный RTF последних транскрибаций"""
+    values = [value for value in values if value]
+    return statistics.median(values) if values else default
+
+
+class AdmissionTicket:
+    """Принятая задача: оставшиеся файлы и очередь на выполнение"""
+
+    def __init__(self, job_id: str, durations: List[float], memory_bytes: int):
+        self.job_id = job_id
+        self.durations = durations
+        self.memory_bytes = memory_bytes
+        self.done: Set[int] = set()
+        self.started = False
+        self.admitted = time.time()
+
+    def remaining_audio(self) -> float:
+        """Секунды аудио в еще не обработанных файлах"""
+        return sum(seconds for i, seconds in enumerate(self.durations) if i not in self.done)
+
+
+class AdmissionController:
+    """Прием задач с оценкой стоимости и ограничением очереди"""
+
+    def __init__(self, rtf: Callable[[], float] = lambda: DEFAULT_RTF,
+                 job_progress: Optional[Callable[[str], Optional[Set[int]]]] = None,
+                 disk_path: Path = Path("."), max_backlog: float = MAX_BACKLOG_SECONDS,
+                 max_active: int = MAX_ACTIVE_JOBS, files_in_memory: int = 2,
+                 memory: Callable[[], Optional[int]] = available_memory):
+        """
+        Args:
+            rtf: Функция, возвращающая текущую оценку RTF
+            job_progress: Функция job_id -> номера готовых файлов задачи
+                или None, если задача завершена (для задач, выполняемых
+                в другом процессе)
+            disk_path: Папка загрузок для проверки свободного места
+            max_backlog: Наибольшая очередь в секундах обработки
+            max_active: Задач, выполняемых одновременно
+            files_in_memory: Сколько файлов задачи декодировано одновременно
+            memory: Функция, возвращающая доступную память в байтах
+        """
+        self.rtf = rtf
+        self.job_progress = job_progress
+        self.disk_path = Path(disk_path)
+        self.max_backlog = max_backlog
+        self.max_active = max(1, max_active)
+        self.files_in_memory = max(1, files_in_memory)
+        self.memory = memory
+        self._tickets: "OrderedDict[str, AdmissionTicket]" = OrderedDict()
+        self._condition = threading.Condition()
+
+    def _refresh(self):
+        """Учет файлов, обработанных с прошлой проверки"""
+        if self.job_progress is None:
+            return
+        for job_id, ticket in list(self._tickets.items()):
+            done = self.job_progress(job_id)
+            if done is None:
+                self._tickets.pop(job_id, None)
+            else:
+                ticket.done |= done
+
+    def backlog_seconds(self) -> float:
+        """Оценка времени обработки принятых, но еще не готовых файлов"""
+        with self._condition:
+            self._refresh()
+            audio = sum(ticket.remaining_audio() for ticket in self._tickets.values())
+        return audio * self.rtf()
+
+    def _reject(self, status: int, reason: str, error: str, retry_after: Optional[float] = None) -> Dict:
+        metrics.admission_rejections.inc(reason=reason)
+        decision = {"admitted": False, "status": status, "reason": reason, "error": error}
+        if retry_after is not None:
+            decision["retry_after"] = max(1, math.ceil(retry_after))
+        return decision
+
+    def _memory_bytes(self, durations: List[float]) -> int:
+        """Память под самые длинные файлы задачи, декодированные одновременно"""
+        longest = sorted(durations, reverse=True)[:self.files_in_memory]
+        return int(sum(longest) * MEMORY_PER_AUDIO_SECOND)
+
+    def check_disk(self, incoming_bytes: int = 0) -> Optional[Dict]:
+        """
+        Проверка места под новый файл
+
+        Args:
+            incoming_bytes: Размер файла, который еще будет записан
+
+        Returns:
+            Optional[Dict]: Решение об отказе или None, если места достаточно
+        """
+        required_mb = MIN_FREE_DISK_MB + incoming_bytes / 1024 ** 2
+        if check_disk_space(str(self.disk_path), required_mb):
+            return None
+        # Место освободится, когда обработаются файлы в очереди
+        return self._reject(
+            503, "disk", "Недостаточно места на диске, попробуйте позже",
+            max(60.0, self.backlog_seconds()),
+        )
+
+    def check(self, durations: List[float], incoming_bytes: int = 0) -> Dict:
+        """
+        Решение о приеме задачи
+
+        Args:
+            durations: Длительность каждого файла задачи, секунды
+            incoming_bytes: Объем данных, которые еще будут загружены
+
+        Returns:
+            Dict: admitted, status (HTTP), а также eta_seconds и
+            queue_position для принятой задачи или error и retry_after
+            для отклоненной
+        """
+        rejected = self.check_disk(incoming_bytes)
+        if rejected is not None:
+            return rejected
+
+        rtf = self.rtf()
+        cost = sum(durations) * rtf
+        with self._condition:
+            self._refresh()
+            backlog = sum(ticket.remaining_audio() for ticket in self._tickets.values()) * rtf
+            queued = len(self._tickets)
+            reserved = sum(ticket.memory_bytes for ticket in self._tickets.values() if not ticket.started)
+
+        # Память под декодированное аудио самых длинных одновременно открытых файлов
+        needed = self._memory_bytes(durations)
+        available = self.memory()
+        if available is not None and available - reserved - MIN_FREE_MEMORY_MB * 1024 ** 2 < needed:
+            if not queued:
+                return self._reject(
+                    413, "memory",
+                    f"Для декодирования нужно около {needed / 1024 ** 3:.1f} ГБ памяти, "
+                    f"доступно {available / 1024 ** 3:.1f} ГБ: разделите запись на части",
+                )
+            return self._reject(
+                503, "memory", "Недостаточно памяти, пока выполняются другие задачи", backlog,
+            )
+
+        # Одну задачу на простаивающем сервере принимаем при любой длине
+        if queued and backlog + cost > self.max_backlog:
+            return self._reject(
+                503, "backlog",
+                f"Сервер занят: очередь на {backlog / 60:.0f} мин обработки",
+                backlog + cost - self.max_backlog,
+            )
+        return {
+            "admitted": True,
+            "status": 202,
+            "audio_seconds": round(sum(durations), 1),
+            "eta_seconds": round(backlog + cost),
+            "queue_position": queued,
+        }
+
+    def admit_if_allowed(self, job_id: str, durations: List[float], incoming_bytes: int = 0,
+                         started: bool = False) -> Tuple[Dict, Optional[AdmissionTicket]]:
+        """
+        Проверка и регистрация задачи как одно действие
+
+        Между check() и admit() другой запрос мог бы пройти ту же проверку,
+        и обе задачи вместе превысили бы очередь или память.
+
+        Args:
+            job_id: Идентификатор задачи
+            durations: Длительность каждого файла задачи, секунды
+            incoming_bytes: Объем данных, которые еще будут загружены
+            started: Задача выполняется в другом процессе и очереди здесь не ждет
+
+        Returns:
+            Tuple[Dict, Optional[AdmissionTicket]]: Решение (как у check())
+            и билет принятой задачи или None
+        """
+        # Условие построено на RLock: check() и admit() берут его повторно
+        with self._condition:
+            decision = self.check(durations, incoming_bytes)
+            if not decision["admitted"]:
+                return decision, None
+            return decision, self.admit(job_id, durations, started=started)
+
+    def admit(self, job_id: str, durations: List[float], started: bool = False) -> AdmissionTicket:
+        """
+        Регистрация принятой задачи
+
+        Args:
+            job_id: Идентификатор задачи
+            durations: Длительность каждого файла задачи, секунды
+            started: Задача выполняется в другом процессе и очереди здесь не ждет
+
+        Returns:
+            AdmissionTicket
+        """
+        ticket = AdmissionTicket(job_id, list(durations), self._memory_bytes(durations))
+        ticket.started = started
+        with self._condition:
+            self._tickets[job_id] = ticket
+        return ticket
+
+    def wait_turn(self, ticket: AdmissionTicket):
+        """Ожидание, пока задача не окажется среди первых max_active"""
+        with self._condition:
+            while True:
+                ahead = [t for t in self._tickets.values() if t.started or t.admitted < ticket.admitted]
+                if len(ahead) < self.max_active or ticket.job_id not in self._tickets:
+                    ticket.started = True
+                    return
+                self._condition.wait(1.0)
+                self._refresh()
+
+    def release(self, ticket: AdmissionTicket):
+        """Задача завершена (успешно или с ошибкой)"""
+        with self._condition:
+            self._tickets.pop(ticket.job_id, None)
+            self._condition.notify_all()
+
+    def status(self) -> Dict:
+        """Очередь и оценки для мониторинга"""
+        with self._condition:
+            self._refresh()
+            tickets = list(self._tickets.values())
+        rtf = self.rtf()
+        return {
+            "rtf": round(rtf, 4),
+            "backlog_seconds": round(sum(t.remaining_audio() for t in tickets) * rtf, 1),
+            "max_backlog_seconds": self.max_backlog,
+            "active_jobs": sum(1 for t in tickets if t.started),
+            "queued_jobs": sum(1 for t in tickets if not t.started),
+        }
@@ -0,0 +1,96 @@
+"""
+Подготовка данных для модели в фоновых потоках
+
+Пока модель генерирует текст текущего чанка (или файла), следующие
+элементы декодируются, ресэмплируются и превращаются в лог-мел признаки
+в фоновых потоках. Число подготовленных заранее элементов ограничено,
+поэтому память не растет, даже если подготовка быстрее модели.
+Декодирование (ffmpeg), NumPy и PyTorch отпускают GIL, так что потоков
+для этого достаточно.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Tuple
+
+# Сколько элементов готовить заранее (0 - без фоновой подготовки)
+DEFAULT_DEPTH = int(os.environ.get("TRANSCRIPTION_PREFETCH", 2))
+
+
+class Prefetcher:
+    """
+    Упорядоченная подготовка элементов заранее
+
+    Элементы выдаются в исходном порядке вместе с результатом prepare;
+    ошибка подготовки выбрасывается при получении элемента. Время, которое
+    потребитель ждал готового элемента, копится в wait_seconds: если оно
+    заметно, подготовка не успевает за моделью.
+    """
+
+    def __init__(self, items: Iterable, prepare: Callable[[Any], Any],
+                 depth: int = DEFAULT_DEPTH, workers: int = 1):
+        """
+        Args:
+            items: Элементы (чанки, файлы)
+            prepare: Функция подготовки элемента, выполняется в фоновом потоке
+            depth: Сколько элементов готовить заранее
+            workers: Количество фоновых потоков
+        """
+        self.items = items
+        self.prepare = prepare
+        self.depth = depth
+        self.workers = workers
+        self.wait_seconds = 0.0
+        self.last_wait = 0.0
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any]]:
+        if self.depth <= 0:
+            for item in self.items:
+                yield item, self.prepare(item)
+            return
+
+        items = iter(self.items)
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch")
+        pending = deque(
+            (item, executor.submit(self.prepare, item)) for item in islice(items, self.depth)
+        )
+        try:
+            while pending:
+                item, future = pending.popleft()
+                # Следующий элемент ставится в работу до ожидания текущего
+                for following in islice(items, 1):
+                    pending.append((following, executor.submit(self.prepare, following)))
+                started = time.perf_counter()
+                try:
+                    result = future.result()
+                finally:
+                    self.last_wait = time.perf_counter() - started
+                    self.wait_seconds += self.last_wait
+                yield item, result
+        finally:
+            # Потребитель прервал обход: подготовленное заранее не нужно
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+def timed(function: Callable) -> Callable:
+    """
+    Обертка, возвращающая вместе с результатом время выполнения
+
+    Время процессора считается по текущему потоку, чтобы фоновая
+    подготовка не смешивалась с работой модели.
+
+    Returns:
+        Callable: Функция, возвращающая (результат, время по часам, время процессора)
+    """
+    def wrapper(*args, **kwargs):
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        result = function(*args, **kwargs)
+        return result, time.perf_counter() - wall_start, time.thread_time() - cpu_start
+
+    return wrapper
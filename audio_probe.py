@@ -0,0 +1,280 @@
+"""
+Параметры аудиофайла по заголовкам, без декодирования сэмплов
+
+WAV, FLAC и OGG (Vorbis, Opus) разбираются по заголовкам контейнера,
+MP3 - по заголовку первого кадра и заголовку Xing/Info/VBRI (для файлов
+с переменным битрейтом), остальные форматы - через ffprobe, если он
+установлен. Результаты кэшируются по пути, размеру и времени изменения,
+поэтому повторный просмотр папки не читает файлы вовсе.
+"""
+
+import json
+import os
+import shutil
+import struct
+import subprocess
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from wav_io import parse_wav_header
+
+CACHE_SIZE = 4096
+
+_cache: "OrderedDict[tuple, Optional[Dict]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Битрейты MP3 в кбит/с: [MPEG-1 / MPEG-2 и 2.5][слой 1, 2, 3][индекс]
+MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 25: [11025, 12000, 8000]}
+
+
+def _info(duration: float, sample_rate: int, channels: int, codec: str) -> Dict:
+    return {
+        "duration_seconds": duration,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "codec": codec,
+    }
+
+
+def probe_wav(file_path: Path) -> Optional[Dict]:
+    """Параметры WAV из заголовка RIFF"""
+    info = parse_wav_header(file_path)
+    if info is None:
+        return None
+    return _info(info.duration_seconds, info.sample_rate, info.channels, "pcm")
+
+
+def probe_flac(file_path: Path) -> Optional[Dict]:
+    """Параметры FLAC из блока STREAMINFO"""
+    with open(file_path, "rb") as f:
+        # Тег ID3 перед FLAC встречается, хотя и не по стандарту
+        f.seek(_id3v2_size(f.read(10)))
+        if f.read(4) != b"fLaC":
+            return None
+        block = f.read(4 + 34)
+        if len(block) < 38 or block[0] & 0x7F != 0:
+            return None
+        streaminfo = block[4:]
+    packed = int.from_bytes(streaminfo[10:18], "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    if not sample_rate:
+        return None
+    return _info(total_samples / sample_rate, sample_rate, channels, "flac")
+
+
+def probe_ogg(file_path: Path) -> Optional[Dict]:
+    """Параметры OGG Vorbis/Opus: заголовок первой страницы и позиция последней"""
+    with open(file_path, "rb") as f:
+        first = f.read(27 + 255 + 64)
+        if first[:4] != b"OggS":
+            return None
+        segments = first[26]
+        packet = first[27 + segments:]
+        if packet[:7] == b"\x01vorbis":
+            channels = packet[11]
+            sample_rate = struct.unpack("<I", packet[12:16])[0]
+            granule_rate, pre_skip, codec = sample_rate, 0, "vorbis"
+        elif packet[:8] == b"OpusHead":
+            channels = packet[9]
+            pre_skip = struct.unpack("<H", packet[10:12])[0]
+            sample_rate = struct.unpack("<I", packet[12:16])[0] or 48000
+            # Позиция в Opus всегда считается в сэмплах 48 кГц
+            granule_rate, codec = 48000, "opus"
+        else:
+            return None
+
+        # Длительность - позиция (granule) последней страницы
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+    position = tail.rfind(b"OggS")
+    if position < 0 or position + 14 > len(tail):
+        return None
+    granule = struct.unpack("<q", tail[position + 6:position + 14])[0]
+    duration = max(0, granule - pre_skip) / granule_rate if granule_rate else 0.0
+    return _info(duration, sample_rate, channels, codec)
+
+
+def _id3v2_size(header: bytes) -> int:
+    """Размер тега ID3v2 вместе с заголовком (0, если тега нет)"""
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _parse_mp3_frame_header(header: bytes) -> Optional[Dict]:
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version_bits = (header[1] >> 3) & 0x3
+    layer_bits = (header[1] >> 1) & 0x3
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x3
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    version = {3: 1, 2: 2, 0: 25}[version_bits]
+    layer = 4 - layer_bits
+    bitrate = MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 0x1
+    channels = 1 if header[3] >> 6 == 3 else 2
+    if layer == 1:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples_per_frame = 1152 if layer == 2 or version == 1 else 576
+        frame_length = samples_per_frame // 8 * bitrate // sample_rate + padding
+    return {
+        "version": version,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "samples_per_frame": samples_per_frame,
+        "frame_length": frame_length,
+    }
+
+
+def probe_mp3(file_path: Path) -> Optional[Dict]:
+    """
+    Параметры MP3 по заголовку первого кадра
+
+    Для файлов с заголовком Xing/Info или VBRI длительность точная,
+    для остальных - по битрейту первого кадра (точна для CBR).
+    """
+    file_size = Path(file_path).stat().st_size
+    with open(file_path, "rb") as f:
+        start = _id3v2_size(f.read(10))
+        f.seek(start)
+        data = f.read(64 * 1024)
+        # Тег ID3v1 в конце файла
+        f.seek(max(0, file_size - 128))
+        id3v1 = 128 if f.read(3) == b"TAG" else 0
+
+    # Первый кадр, за которым следует еще один корректный кадр
+    frame = None
+    offset = 0
+    while offset < len(data) - 4:
+        offset = data.find(b"\xff", offset)
+        if offset < 0:
+            break
+        frame = _parse_mp3_frame_header(data[offset:offset + 4])
+        if frame and frame["frame_length"]:
+            following = data[offset + frame["frame_length"]:offset + frame["frame_length"] + 4]
+            if len(following) < 4 or _parse_mp3_frame_header(following):
+                break
+        frame = None
+        offset += 1
+    if frame is None:
+        return None
+
+    # Заголовок Xing/Info лежит сразу после side information первого кадра,
+    # VBRI - всегда через 32 байта после заголовка кадра
+    body = data[offset:offset + max(frame["frame_length"], 64)]
+    if frame["version"] == 1:
+        side_info = 17 if frame["channels"] == 1 else 32
+    else:
+        side_info = 9 if frame["channels"] == 1 else 17
+    xing = body[4 + side_info:4 + side_info + 12]
+    vbri = body[36:54]
+    frames = None
+    if xing[:4] in (b"Xing", b"Info") and len(xing) == 12:
+        flags = struct.unpack(">I", xing[4:8])[0]
+        if flags & 0x1:
+            frames = struct.unpack(">I", xing[8:12])[0]
+    elif vbri[:4] == b"VBRI" and len(vbri) == 18:
+        frames = struct.unpack(">I", vbri[14:18])[0]
+
+    if frames is not None:
+        duration = frames * frame["samples_per_frame"] / frame["sample_rate"]
+    else:
+        audio_bytes = file_size - start - offset - id3v1
+        duration = max(0, audio_bytes) * 8 / frame["bitrate"]
+    return _info(duration, frame["sample_rate"], frame["channels"], "mp3")
+
+
+def probe_ffprobe(file_path: Path) -> Optional[Dict]:
+    """Параметры через ffprobe (M4A, AAC, WMA и все остальное)"""
+    if shutil.which("ffprobe") is None:
+        return None
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "a:0", "-show_entries",
+             "stream=sample_rate,channels,codec_name:format=duration",
+             "-of", "json", str(file_path)],
+            capture_output=True, text=True, timeout=30, check=True,
+        )
+        data = json.loads(result.stdout)
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+    streams = data.get("streams") or []
+    if not streams:
+        return None
+    stream = streams[0]
+    return _info(
+        float(data.get("format", {}).get("duration") or 0.0),
+        int(stream.get("sample_rate") or 0),
+        int(stream.get("channels") or 0),
+        stream.get("codec_name", ""),
+    )
+
+
+PROBES = {
+    ".wav": probe_wav,
+    ".wave": probe_wav,
+    ".flac": probe_flac,
+    ".ogg": probe_ogg,
+    ".opus": probe_ogg,
+    ".mp3": probe_mp3,
+}
+
+
+def probe_audio(file_path: Path) -> Optional[Dict]:
+    """
+    Параметры аудиофайла без декодирования
+
+    Args:
+        file_path: Путь к аудиофайлу
+
+    Returns:
+        Optional[Dict]: duration_seconds, sample_rate, channels, codec или
+        None, если формат не удалось определить по заголовкам и ffprobe
+    """
+    file_path = Path(file_path)
+    stat = file_path.stat()
+    key = (str(file_path.resolve()), stat.st_size, stat.st_mtime_ns)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    result = None
+    probe = PROBES.get(file_path.suffix.lower())
+    if probe is not None:
+        try:
+            result = probe(file_path)
+        except (OSError, struct.error, IndexError, KeyError, ZeroDivisionError):
+            result = None
+    if result is None:
+        result = probe_ffprobe(file_path)
+
+    with _cache_lock:
+        _cache[key] = result
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
@@ -0,0 +1,475 @@
+"""
+Движки вывода Whisper
+
+TranscriptionProcessor загружает модель transformers, а генерацию текста
+выполняет движок с общим интерфейсом:
+- encode(input_features) - состояние кодировщика для окна;
+- decode_step(input_ids, encoder_state, past) - логиты последнего токена
+  и кэш ключей/значений декодера;
+- generate(input_features=..., max_new_tokens=..., ...) - токены окна,
+  как у model.generate().
+
+torch - модель transformers (по умолчанию). С TRANSCRIPTION_ACCELERATE=1
+включается ускоренный режим: внимание через scaled_dot_product_attention,
+статический кэш ключей/значений (один на размер батча, без выделения
+памяти на каждый чанк) и torch.compile шага декодера. Скомпилированные
+графы сохраняются в models/torch_compile/ (TRANSCRIPTION_COMPILE_CACHE) и
+переиспользуются после перезапуска; компиляция под фиксированное
+30-секундное окно выполняется сразу при создании движка.
+
+onnx - ONNX Runtime на CPU: кодировщик (вместе с ключами и значениями
+cross-attention всех слоев декодера) и шаг декодера с кэшем
+экспортируются один раз в models/onnx/ и дальше загружаются оттуда.
+Движок выбирается переменной TRANSCRIPTION_BACKEND.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BACKEND = os.environ.get("TRANSCRIPTION_BACKEND", "torch")
+ACCELERATE = os.environ.get("TRANSCRIPTION_ACCELERATE", "0").lower() in ("1", "true", "yes")
+COMPILE_CACHE_DIR = Path(os.environ.get("TRANSCRIPTION_COMPILE_CACHE", Path("models") / "torch_compile"))
+ONNX_DIR = Path("models") / "onnx"
+ONNX_OPSET = 17
+
+try:
+    import onnxruntime
+
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+
+class TorchBackend:
+    """Модель transformers в PyTorch"""
+
+    name = "torch"
+    uses_torch_weights = True
+
+    def __init__(self, model, accelerate: bool = ACCELERATE):
+        """
+        Args:
+            model: WhisperForConditionalGeneration
+            accelerate: SDPA, статический кэш и torch.compile шага декодера
+                (по умолчанию TRANSCRIPTION_ACCELERATE)
+        """
+        self.model = model
+        self.generation_config = model.generation_config
+        self.accelerate = accelerate
+        self._caches: Dict = {}
+        # Статический кэш один на размер батча, а модель общая для потоков
+        # задач и слотов обработчика: generate() с кэшем выполняется по одному
+        self._cache_lock = threading.Lock()
+        if accelerate:
+            self._enable_acceleration()
+
+    def _enable_acceleration(self):
+        import torch
+        from transformers import CompileConfig
+
+        # Графы inductor сохраняются рядом с моделями, а не во временной папке
+        # (transformers при импорте уже записывает в переменную путь по умолчанию)
+        os.environ["TORCHINDUCTOR_CACHE_DIR"] = str(COMPILE_CACHE_DIR.resolve())
+        self.model.set_attn_implementation("sdpa")
+        on_cpu = self.model.device.type == "cpu"
+        compile_config = CompileConfig(fullgraph=True, dynamic=False, mode="default" if on_cpu else "reduce-overhead")
+        # transformers компилирует шаг декодера только на GPU, если не разрешить явно
+        compile_config._compile_all_devices = True
+        self.generation_config.compile_config = compile_config
+
+        started = time.perf_counter()
+        config = self.model.config
+        features = torch.zeros(
+            1, config.num_mel_bins, 2 * config.max_source_positions,
+            dtype=self.model.dtype, device=self.model.device,
+        )
+        self.generate(input_features=features, max_new_tokens=8, num_beams=1)
+        print(f"✅ Шаг декодера скомпилирован за {time.perf_counter() - started:.1f} с")
+
+    def _static_cache(self, batch_size: int):
+        """Статический кэш на все 448 позиций декодера, общий для чанков"""
+        from transformers import EncoderDecoderCache, StaticCache
+
+        cache = self._caches.get(batch_size)
+        if cache is None:
+            config = self.model.config
+            cache = EncoderDecoderCache(
+                StaticCache(config=config, max_cache_len=config.max_target_positions),
+                StaticCache(config=config, max_cache_len=config.max_source_positions),
+            )
+            self._caches[batch_size] = cache
+        else:
+            cache.reset()
+        return cache
+
+    def encode(self, input_features):
+        import torch
+
+        with torch.no_grad():
+            return self.model.get_encoder()(input_features).last_hidden_state
+
+    def decode_step(self, input_ids, encoder_state, past=None):
+        import torch
+
+        with torch.no_grad():
+            output = self.model(
+                encoder_outputs=(encoder_state,),
+                decoder_input_ids=input_ids,
+                past_key_values=past,
+                use_cache=True,
+            )
+        return output.logits[:, -1], output.past_key_values
+
+    def generate(self, **kwargs):
+        import torch
+
+        if self.accelerate:
+            # Размер кэша не зависит от лимита токенов чанка, поэтому
+            # скомпилированный шаг не перекомпилируется
+            beams = kwargs.get("num_beams") or self.generation_config.num_beams or 1
+            batch_size = kwargs["input_features"].shape[0] * beams
+            with self._cache_lock, torch.no_grad():
+                kwargs["past_key_values"] = self._static_cache(batch_size)
+                return self.model.generate(**kwargs)
+        with torch.no_grad():
+            return self.model.generate(**kwargs)
+
+
+def _whisper_export_modules(model):
+    """Модули PyTorch для экспорта: кодировщик с cross-KV и шаг декодера"""
+    import torch
+    from torch import nn
+
+    decoder = model.model.decoder
+    heads = model.config.decoder_attention_heads
+
+    def split_heads(x):
+        batch, length, _ = x.shape
+        return x.view(batch, length, heads, -1).transpose(1, 2)
+
+    def attention(q, k, v, scaling, mask=None):
+        scores = torch.matmul(q, k.transpose(-1, -2)) * scaling
+        if mask is not None:
+            scores = scores + mask
+        output = torch.matmul(scores.softmax(dim=-1), v)
+        batch, _, length, _ = output.shape
+        return output.transpose(1, 2).reshape(batch, length, -1)
+
+    class Encoder(nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.encoder = model.model.encoder
+            self.layers = decoder.layers
+
+        def forward(self, input_features):
+            hidden = self.encoder(input_features).last_hidden_state
+            outputs = []
+            for layer in self.layers:
+                outputs.append(split_heads(layer.encoder_attn.k_proj(hidden)))
+                outputs.append(split_heads(layer.encoder_attn.v_proj(hidden)))
+            return tuple(outputs)
+
+    class DecoderStep(nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.decoder = decoder
+            self.proj_out = model.proj_out
+
+        def forward(self, input_ids, *cache):
+            layers = len(self.decoder.layers)
+            past, cross = cache[:2 * layers], cache[2 * layers:]
+            past_length = past[0].shape[2]
+            length = input_ids.shape[1]
+            positions = torch.arange(length, device=input_ids.device) + past_length
+            hidden = self.decoder.embed_tokens(input_ids) + self.decoder.embed_positions.weight[positions]
+
+            # Причинная маска для новых токенов с учетом кэша
+            keys = torch.arange(past_length + length, device=input_ids.device)
+            mask = torch.where(
+                keys.unsqueeze(0) <= positions.unsqueeze(1),
+                torch.zeros((), dtype=hidden.dtype),
+                torch.full((), float("-inf"), dtype=hidden.dtype),
+            )
+
+            present = []
+            for index, layer in enumerate(self.decoder.layers):
+                attn = layer.self_attn
+                x = layer.self_attn_layer_norm(hidden)
+                k = torch.cat([past[2 * index], split_heads(attn.k_proj(x))], dim=2)
+                v = torch.cat([past[2 * index + 1], split_heads(attn.v_proj(x))], dim=2)
+                present += [k, v]
+                hidden = hidden + attn.out_proj(attention(split_heads(attn.q_proj(x)), k, v, attn.scaling, mask))
+
+                attn = layer.encoder_attn
+                x = layer.encoder_attn_layer_norm(hidden)
+                hidden = hidden + attn.out_proj(
+                    attention(split_heads(attn.q_proj(x)), cross[2 * index], cross[2 * index + 1], attn.scaling)
+                )
+
+                x = layer.final_layer_norm(hidden)
+                hidden = hidden + layer.fc2(layer.activation_fn(layer.fc1(x)))
+
+            logits = self.proj_out(self.decoder.layer_norm(hidden[:, -1:]))[:, 0]
+            return (logits, *present)
+
+    return Encoder().eval(), DecoderStep().eval()
+
+
+def onnx_export_dir(model, root: Path = ONNX_DIR) -> Path:
+    """Папка экспорта: имя модели и хэш конфигурации и начала весов"""
+    hasher = hashlib.sha256(model.config.to_json_string().encode("utf-8"))
+    parameters = list(model.parameters())
+    for parameter in (parameters[0], parameters[-1]):
+        hasher.update(parameter.detach().flatten()[:4096].float().cpu().numpy().tobytes())
+    digest = hasher.hexdigest()[:12]
+    name = (model.name_or_path or "model").strip("/").replace("/", "--")
+    return Path(root) / f"{name}-{digest}"
+
+
+def export_whisper_onnx(model, export_dir: Path) -> Path:
+    """
+    Экспорт кодировщика и шага декодера Whisper в ONNX
+
+    Args:
+        model: WhisperForConditionalGeneration
+        export_dir: Папка для encoder.onnx и decoder.onnx
+
+    Returns:
+        Path: Папка экспорта
+    """
+    import torch
+
+    export_dir = Path(export_dir)
+    export_dir.mkdir(parents=True, exist_ok=True)
+    encoder, decoder = _whisper_export_modules(model)
+    config = model.config
+    layers = config.decoder_layers
+    heads = config.decoder_attention_heads
+    head_dim = config.d_model // heads
+    dtype = next(model.parameters()).dtype
+    features = torch.zeros(1, config.num_mel_bins, 2 * config.max_source_positions, dtype=dtype)
+
+    cross_names = [f"cross_{kind}_{i}" for i in range(layers) for kind in ("key", "value")]
+    past_names = [f"past_{kind}_{i}" for i in range(layers) for kind in ("key", "value")]
+    present_names = [f"present_{kind}_{i}" for i in range(layers) for kind in ("key", "value")]
+
+    started = time.perf_counter()
+    with torch.no_grad():
+        torch.onnx.export(
+            encoder,
+            (features,),
+            str(export_dir / "encoder.onnx.tmp"),
+            input_names=["input_features"],
+            output_names=cross_names,
+            dynamic_axes={name: {0: "batch"} for name in ["input_features"] + cross_names},
+            opset_version=ONNX_OPSET,
+            dynamo=False,
+        )
+        cross = encoder(features)
+        past = [torch.zeros(1, heads, 0, head_dim, dtype=dtype) for _ in past_names]
+        input_ids = torch.full((1, 3), config.decoder_start_token_id, dtype=torch.long)
+        axes = {"input_ids": {0: "batch", 1: "tokens"}, "logits": {0: "batch"}}
+        axes.update({name: {0: "batch", 2: "past"} for name in past_names + present_names})
+        axes.update({name: {0: "batch"} for name in cross_names})
+        torch.onnx.export(
+            decoder,
+            (input_ids, *past, *cross),
+            str(export_dir / "decoder.onnx.tmp"),
+            input_names=["input_ids"] + past_names + cross_names,
+            output_names=["logits"] + present_names,
+            dynamic_axes=axes,
+            opset_version=ONNX_OPSET,
+            dynamo=False,
+        )
+    for name in ("encoder.onnx", "decoder.onnx"):
+        os.replace(export_dir / f"{name}.tmp", export_dir / name)
+    with open(export_dir / "export.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "model": model.name_or_path,
+            "opset": ONNX_OPSET,
+            "export_seconds": round(time.perf_counter() - started, 1),
+        }, f, ensure_ascii=False, indent=2)
+    return export_dir
+
+
+class OnnxBackend:
+    """
+    Whisper в ONNX Runtime на CPU
+
+    Декодирование жадное или с сэмплированием (num_beams не
+    поддерживается и игнорируется); подавление токенов и начальные
+    токены языка и задачи - как в generate() transformers.
+    """
+
+    name = "onnx"
+    # Веса хранятся в сессиях ONNX Runtime, модели PyTorch нужна только конфигурация
+    uses_torch_weights = False
+
+    def __init__(self, model, export_root: Path = ONNX_DIR, threads: Optional[int] = None):
+        """
+        Args:
+            model: WhisperForConditionalGeneration (веса для экспорта и конфигурация)
+            export_root: Папка экспортов
+            threads: Потоков ONNX Runtime (по умолчанию как у PyTorch)
+        """
+        if not ONNXRUNTIME_AVAILABLE:
+            raise ImportError("ONNX Runtime не установлен. Установите: pip install onnxruntime onnx")
+        import torch
+
+        self.config = model.config
+        self.generation_config = model.generation_config
+        self.export_dir = onnx_export_dir(model, export_root)
+        if not (self.export_dir / "export.json").exists():
+            print(f"🔄 Экспорт модели в ONNX: {self.export_dir}")
+            export_whisper_onnx(model, self.export_dir)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads or torch.get_num_threads()
+        providers = ["CPUExecutionProvider"]
+        self.encoder = onnxruntime.InferenceSession(str(self.export_dir / "encoder.onnx"), options, providers=providers)
+        self.decoder = onnxruntime.InferenceSession(str(self.export_dir / "decoder.onnx"), options, providers=providers)
+        self._dtype = {"tensor(float16)": "float16"}.get(self.encoder.get_inputs()[0].type, "float32")
+        self._past_names = [i.name for i in self.decoder.get_inputs() if i.name.startswith("past_")]
+        self._cross_names = [i.name for i in self.decoder.get_inputs() if i.name.startswith("cross_")]
+
+    def memory_bytes(self) -> int:
+        """Память весов в сессиях: размер файлов экспорта"""
+        return sum(
+            path.stat().st_size for path in self.export_dir.iterdir()
+            if path.is_file() and path.name != "export.json"
+        )
+
+    def encode(self, input_features) -> List:
+        features = input_features.detach().cpu().numpy().astype(self._dtype)
+        return self.encoder.run(None, {"input_features": features})
+
+    def decode_step(self, input_ids, encoder_state, past=None):
+        import numpy as np
+        import torch
+
+        if past is None:
+            heads = self.config.decoder_attention_heads
+            shape = (input_ids.shape[0], heads, 0, self.config.d_model // heads)
+            past = [np.zeros(shape, dtype=self._dtype) for _ in self._past_names]
+        feed = {"input_ids": input_ids.detach().cpu().numpy().astype(np.int64)}
+        feed.update(zip(self._past_names, past))
+        feed.update(zip(self._cross_names, encoder_state))
+        logits, *present = self.decoder.run(None, feed)
+        return torch.from_numpy(logits).float(), present
+
+    def _prompt(self, language: Optional[str], task: Optional[str]) -> List[int]:
+        """Начальные токены: начало расшифровки, язык, задача, без меток времени"""
+        config = self.generation_config
+        prompt = [config.decoder_start_token_id]
+        lang_to_id: Dict = getattr(config, "lang_to_id", None) or {}
+        if lang_to_id and language:
+            if f"<|{language}|>" not in lang_to_id:
+                from transformers.models.whisper.tokenization_whisper import TO_LANGUAGE_CODE
+
+                language = TO_LANGUAGE_CODE.get(language.lower(), language.strip("<|>"))
+            prompt.append(lang_to_id[f"<|{language}|>"])
+        task_to_id = getattr(config, "task_to_id", None) or {}
+        if task_to_id and lang_to_id:
+            prompt.append(task_to_id[task or "transcribe"])
+        if getattr(config, "no_timestamps_token_id", None) is not None:
+            prompt.append(config.no_timestamps_token_id)
+        return prompt
+
+    def generate(self, input_features, max_new_tokens: int = 440, stopping_criteria=None,
+                 language: Optional[str] = None, task: Optional[str] = None,
+                 do_sample: bool = False, temperature: float = 1.0,
+                 max_time: Optional[float] = None, **kwargs):
+        """
+        Генерация токенов окон батча
+
+        Args:
+            input_features: Признаки окон
+            max_new_tokens: Лимит новых токенов
+            stopping_criteria: Критерии остановки transformers
+            language: Язык (None - определяется по каждому окну, как в Whisper)
+            task: transcribe или translate
+            do_sample: Сэмплирование вместо жадного выбора
+            temperature: Температура сэмплирования
+            max_time: Ограничение времени генерации в секундах
+            **kwargs: Параметры generate(), не применимые здесь
+                (num_beams, early_stopping, attention_mask)
+
+        Returns:
+            torch.LongTensor: Новые токены (без начальных), как у
+            generate() Whisper в transformers; закончившиеся строки
+            дополнены pad_token_id
+        """
+        import torch
+
+        started = time.perf_counter()
+        config = self.generation_config
+        batch_size = input_features.shape[0]
+        cross = self.encode(input_features)
+        prompt = self._prompt(language, task)
+        sequence = torch.tensor([prompt] * batch_size)
+        lang_to_id = getattr(config, "lang_to_id", None) or {}
+        past = None
+        if lang_to_id and not language:
+            # Язык по первому шагу декодера, как в WhisperForConditionalGeneration.detect_language
+            logits, _ = self.decode_step(sequence[:, :1], cross)
+            lang_ids = torch.tensor(list(lang_to_id.values()))
+            detected = lang_ids[logits[:, lang_ids].argmax(-1)]
+            sequence = torch.cat([sequence[:, :1], detected.unsqueeze(1), sequence[:, 1:]], dim=1)
+
+        suppress = list(getattr(config, "suppress_tokens", None) or [])
+        begin_suppress = list(getattr(config, "begin_suppress_tokens", None) or [])
+        eos = config.eos_token_id
+        pad = config.pad_token_id if config.pad_token_id is not None else eos
+        prompt_length = sequence.shape[1]
+        finished = torch.zeros(batch_size, dtype=torch.bool)
+        step_ids = sequence
+        for step in range(max_new_tokens):
+            logits, past = self.decode_step(step_ids, cross, past)
+            logits[:, suppress] = float("-inf")
+            if step == 0:
+                logits[:, begin_suppress] = float("-inf")
+            if do_sample and temperature > 0:
+                token = torch.multinomial((logits / temperature).softmax(-1), 1)
+            else:
+                token = logits.argmax(-1, keepdim=True)
+            token[finished] = pad
+            sequence = torch.cat([sequence, token], dim=1)
+            step_ids = token
+            finished |= token[:, 0] == eos
+            if stopping_criteria is not None:
+                finished |= stopping_criteria(sequence, None)
+            if bool(finished.all()):
+                break
+            if max_time is not None and time.perf_counter() - started > max_time:
+                break
+        return sequence[:, prompt_length:]
+
+
+BACKENDS = {"torch": TorchBackend, "onnx": OnnxBackend}
+
+
+def create_backend(model, name: str = BACKEND):
+    """
+    Движок вывода для загруженной модели
+
+    Args:
+        model: WhisperForConditionalGeneration
+        name: torch или onnx (по умолчанию TRANSCRIPTION_BACKEND)
+
+    Returns:
+        Движок с методами encode, decode_step и generate; если движку веса
+        PyTorch не нужны, они освобождаются (модель переносится на meta и
+        сохраняет только конфигурацию)
+    """
+    if name not in BACKENDS:
+        raise Exception(f"Неизвестный движок транскрибации: {name} (доступны: {', '.join(BACKENDS)})")
+    backend = BACKENDS[name](model)
+    if not backend.uses_torch_weights:
+        model.to("meta")
+    return backend
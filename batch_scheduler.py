@@ -0,0 +1,138 @@
+"""
+Сборка чанков разных файлов в батчи
+
+Короткий файл (голосовое сообщение до 30 секунд) - это один чанк, и без
+батчей каждый такой файл получает отдельный вызов generate() с батчем из
+одного окна. BatchScheduler собирает готовые чанки всех файлов и задач,
+которые транскрибируются одновременно, в батчи: батч уходит в модель,
+как только набралось TRANSCRIPTION_BATCH_SIZE чанков или первый из них
+прождал TRANSCRIPTION_BATCH_WAIT_MS. Результат каждого чанка
+возвращается вызвавшему потоку через Future, поэтому файл и номер чанка
+остаются у того, кто его отправил.
+
+Батчи имеют смысл, когда файлы транскрибируются параллельно: с
+TRANSCRIPTION_BATCH_SIZE больше 1 сервер и обработчики очереди берут в
+работу столько файлов одновременно.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+import metrics
+
+# Наибольший размер батча (1 - без батчей, каждый чанк генерируется сразу)
+BATCH_SIZE = int(os.environ.get("TRANSCRIPTION_BATCH_SIZE", 1))
+# Сколько первый чанк батча ждет остальных, миллисекунды
+BATCH_WAIT = float(os.environ.get("TRANSCRIPTION_BATCH_WAIT_MS", 50)) / 1000
+
+
+class BatchScheduler:
+    """Динамические батчи из элементов, отправленных разными потоками"""
+
+    def __init__(self, run_batch: Callable[[Hashable, List[Any]], List[Any]],
+                 max_batch_size: int = BATCH_SIZE, max_wait: float = BATCH_WAIT):
+        """
+        Args:
+            run_batch: Функция (ключ, элементы) -> результаты в том же
+                порядке; выполняется в потоке планировщика
+            max_batch_size: Наибольший размер батча
+            max_wait: Сколько первый элемент батча ждет остальных, секунды
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self._pending: List[Tuple[Hashable, Any, Future, float]] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any, key: Hashable = None) -> Future:
+        """
+        Постановка элемента в очередь
+
+        Args:
+            item: Элемент (для чанков - входы модели, сэмплы и StageTimer)
+            key: В один батч попадают только элементы с равным ключом
+
+        Returns:
+            Future: Результат элемента
+        """
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise Exception("Планировщик батчей остановлен")
+            self._pending.append((key, item, future, time.perf_counter()))
+            self._condition.notify()
+        return future
+
+    def close(self):
+        """Остановка после обработки уже отправленных элементов"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _next_batch(self) -> Optional[Tuple[Hashable, List]]:
+        """Ожидание батча: полного или с истекшим временем ожидания"""
+        with self._condition:
+            while True:
+                if not self._pending:
+                    if self._closed:
+                        return None
+                    self._condition.wait()
+                    continue
+                key, _, _, submitted = self._pending[0]
+                batch = [entry for entry in self._pending if entry[0] == key][:self.max_batch_size]
+                remaining = submitted + self.max_wait - time.perf_counter()
+                if len(batch) >= self.max_batch_size or remaining <= 0 or self._closed:
+                    for entry in batch:
+                        self._pending.remove(entry)
+                    return key, batch
+                self._condition.wait(remaining)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            key, entries = batch
+            futures = [future for _, _, future, _ in entries]
+            metrics.batch_size.observe(len(entries))
+            try:
+                results = self.run_batch(key, [item for _, item, _, _ in entries])
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+
+def chunk_scheduler(backend, decode: Callable, max_batch_size: int = BATCH_SIZE,
+                    max_wait: float = BATCH_WAIT) -> Optional[BatchScheduler]:
+    """
+    Планировщик чанков для decoding.generate_chunk(scheduler=...)
+
+    Args:
+        backend: Движок вывода (backends.create_backend)
+        decode: Функция, переводящая результат generate() в список текстов
+        max_batch_size: Наибольший размер батча (по умолчанию
+            TRANSCRIPTION_BATCH_SIZE)
+        max_wait: Ожидание батча, секунды (по умолчанию TRANSCRIPTION_BATCH_WAIT_MS)
+
+    Returns:
+        Optional[BatchScheduler]: Планировщик или None, если батчи выключены
+    """
+    from decoding import generate_batch
+
+    if max_batch_size <= 1:
+        return None
+
+    def run_batch(key, chunks):
+        return generate_batch(backend, decode, chunks, **dict(key))
+
+    return BatchScheduler(run_batch, max_batch_size, max_wait)
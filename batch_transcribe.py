@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Пакетная транскрибация папок и масок файлов без веб-интерфейса
+
+Файлы отбираются по get_supported_audio_formats() и распределяются между
+процессами-обработчиками, каждый из которых загружает модель один раз.
+Тексты записываются атомарно, а журнал FileIndex позволяет пропускать уже
+транскрибированные файлы (по времени изменения и хэшу) и продолжать работу
+после прерывания.
+
+Запуск:
+    python batch_transcribe.py archive/ --workers 2
+    python batch_transcribe.py "records/**/*.mp3" --output-dir transcripts
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from audio_probe import probe_audio
+from file_index import DEFAULT_INDEX, FileIndex
+from result_store import file_sha256
+from stage_timer import StageTimer
+from utils import format_duration, get_supported_audio_formats, write_text_atomic
+
+# Модель процесса-обработчика
+_processor = None
+
+
+def collect_files(inputs: Iterable[str], formats: Optional[List[str]] = None) -> List[Tuple[Path, Path]]:
+    """
+    Поиск аудиофайлов
+
+    Args:
+        inputs: Папки (обходятся рекурсивно), маски glob или отдельные файлы
+        formats: Допустимые расширения (по умолчанию поддерживаемые форматы)
+
+    Returns:
+        List[Tuple[Path, Path]]: Пары (файл, корень), корень нужен для
+        повторения структуры папок в --output-dir
+    """
+    formats = {ext.lower() for ext in (formats or get_supported_audio_formats())}
+    found = {}
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            candidates = (p for p in path.rglob("*") if p.is_file())
+            root = path
+        elif glob.has_magic(item):
+            candidates = (Path(p) for p in glob.iglob(item, recursive=True))
+            # Корень - часть маски до первого шаблона
+            parts = []
+            for part in Path(item).parts:
+                if glob.has_magic(part):
+                    break
+                parts.append(part)
+            root = Path(*parts) if parts else Path(".")
+        else:
+            candidates = [path]
+            root = path.parent
+
+        for candidate in candidates:
+            if candidate.is_file() and candidate.suffix.lower() in formats:
+                found.setdefault(candidate.resolve(), root.resolve())
+    return sorted(found.items())
+
+
+def output_path(path: Path, root: Path, output_dir: Optional[Path]) -> Path:
+    """Путь к тексту: рядом с аудио или с той же структурой в output_dir"""
+    if output_dir is None:
+        return path.with_suffix(".txt")
+    return (output_dir / path.relative_to(root)).with_suffix(".txt")
+
+
+def init_worker(threads: int = 0, overlap: Optional[float] = None):
+    """Загрузка модели в процессе-обработчике"""
+    global _processor
+    if threads:
+        import torch
+
+        torch.set_num_threads(threads)
+    from transcription_simple import TranscriptionProcessor
+
+    _processor = TranscriptionProcessor(chunk_overlap=overlap)
+
+
+def transcribe_one(path: str, output: str) -> Dict:
+    """
+    Транскрибация одного файла в процессе-обработчике
+
+    Returns:
+        Dict: Хэш исходного файла, длительность аудио и сводка замеров
+    """
+    timer = StageTimer(Path(path).name)
+    sha256 = file_sha256(Path(path))
+    samples = _processor.load_audio(path, timer=timer)
+    try:
+        text = _processor.transcribe_samples(samples, timer=timer)
+        audio_seconds = len(samples) / 16000
+    finally:
+        # Отображенный в память WAV освобождается до следующего файла
+        if hasattr(samples, "close"):
+            samples.close()
+    write_text_atomic(Path(output), text)
+    return {
+        "sha256": sha256,
+        "audio_seconds": audio_seconds,
+        "chars": len(text),
+        "timings": timer.finish(audio_seconds),
+    }
+
+
+class BatchStats:
+    """Итоги пакетной обработки"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        speed = self.audio_seconds / elapsed if elapsed else 0
+        per_minute = self.done / elapsed * 60 if elapsed else 0
+        return (
+            f"Готово: {self.done}, пропущено: {self.skipped}, ошибок: {self.failed} "
+            f"из {self.total} за {format_duration(elapsed)}\n"
+            f"Аудио: {format_duration(self.audio_seconds)}, скорость {speed:.2f}x "
+            f"реального времени, {per_minute:.1f} файлов/мин"
+        )
+
+
+def run_batch(files: List[Tuple[Path, Path]], index: FileIndex,
+              output_dir: Optional[Path] = None, workers: int = 1,
+              threads: int = 0, force: bool = False,
+              overlap: Optional[float] = None) -> BatchStats:
+    """
+    Транскрибация списка файлов пулом процессов
+
+    Args:
+        files: Результат collect_files
+        index: Журнал обработанных файлов
+        output_dir: Папка для текстов (None - рядом с аудио)
+        workers: Количество процессов с моделью
+        threads: Потоков PyTorch на процесс (0 - по умолчанию)
+        force: Транскрибировать даже актуальные файлы
+        overlap: Перекрытие 30-секундных окон в секундах
+
+    Returns:
+        BatchStats: Итоги
+    """
+    stats = BatchStats(len(files))
+    queue = []
+    for path, root in files:
+        output = output_path(path, root, output_dir)
+        if not force and index.is_current(path, output):
+            stats.skipped += 1
+            continue
+        queue.append((path, output))
+
+    if stats.skipped:
+        print(f"⏭️ Пропущено актуальных файлов: {stats.skipped}")
+    if not queue:
+        return stats
+
+    def start_pool():
+        return ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker, initargs=(threads, overlap)
+        )
+
+    executor = start_pool()
+    pending = {}
+    position = 0
+    broken = False
+    try:
+        while queue or pending:
+            # Ограниченное число задач в полете: прерывание не теряет работу
+            # и не держит в памяти тысячи ожидающих задач
+            while queue and not broken and len(pending) < workers * 2:
+                path, output = queue.pop(0)
+                stat = os.stat(path)
+                future = executor.submit(transcribe_one, str(path), str(output))
+                pending[future] = (path, output, stat)
+
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path, output, stat = pending.pop(future)
+                position += 1
+                prefix = f"[{position + stats.skipped}/{stats.total}]"
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    # Обработчик упал (например, из-за нехватки памяти):
+                    # файлы пула помечаются ошибкой, пул перезапускается
+                    broken = True
+                    stats.failed += 1
+                    index.mark_failed(path, stat, "Процесс обработки завершился аварийно")
+                    print(f"❌ {prefix} {path}: процесс обработки завершился аварийно")
+                    continue
+                except Exception as e:
+                    stats.failed += 1
+                    index.mark_failed(path, stat, str(e))
+                    print(f"❌ {prefix} {path}: {e}")
+                    continue
+                stats.done += 1
+                stats.audio_seconds += result["audio_seconds"]
+                index.mark_done(path, stat, result["sha256"], output, result["audio_seconds"])
+                print(f"✅ {prefix} {path} -> {output} (RTF {result['timings']['rtf']})")
+            if broken and not pending:
+                executor.shutdown(wait=False)
+                executor = start_pool()
+                broken = False
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        print("\n⏹️ Прервано: запустите команду снова, чтобы продолжить")
+        print(stats.report())
+        raise
+    executor.shutdown()
+    return stats
+
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Пакетная транскрибация аудиофайлов")
+    parser.add_argument("inputs", nargs="+", help="Папки, маски (\"**/*.mp3\") или файлы")
+    parser.add_argument("--output-dir", type=Path, help="Папка для текстов (по умолчанию рядом с аудио)")
+    parser.add_argument("--workers", type=int, default=1, help="Процессов с моделью")
+    parser.add_argument("--threads", type=int, default=0, help="Потоков PyTorch на процесс")
+    parser.add_argument("--overlap", type=float, help="Перекрытие 30-секундных окон в секундах")
+    parser.add_argument("--index", type=Path, default=DEFAULT_INDEX, help="Журнал обработанных файлов")
+    parser.add_argument("--force", action="store_true", help="Транскрибировать заново все файлы")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать файлы к обработке")
+    args = parser.parse_args()
+
+    files = collect_files(args.inputs)
+    if not files:
+        print("❌ Аудиофайлы не найдены")
+        sys.exit(1)
+
+    index = FileIndex(args.index)
+    output_dir = args.output_dir.resolve() if args.output_dir else None
+    if args.dry_run:
+        # Длительность берется из заголовков, файлы не декодируются
+        total = 0.0
+        for path, root in files:
+            output = output_path(path, root, output_dir)
+            if args.force or not index.is_current(path, output):
+                info = probe_audio(path)
+                duration = format_duration(info["duration_seconds"]) if info else "?"
+                total += info["duration_seconds"] if info else 0.0
+                print(f"{path} -> {output} ({duration})")
+        print(f"Аудио к обработке: {format_duration(total)}")
+        return
+
+    print(f"🎤 Найдено файлов: {len(files)}, процессов: {args.workers}")
+    try:
+        stats = run_batch(files, index, output_dir, max(1, args.workers),
+                          args.threads, args.force, args.overlap)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    finally:
+        index.close()
+    print(stats.report())
+    sys.exit(1 if stats.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Замеры производительности горячих путей
+
+Группы замеров:
+    audio        - декодирование и ресэмплинг синтетического аудио,
+                   лог-мел признаки
+    text         - разбивка больших текстов на чанки
+    translation  - пропускная способность TranslationProcessor против
+                   локальной имитации API (mock_openai_server.py)
+    e2e          - транскрибация целиком на крошечной модели Whisper со
+                   случайными весами (работает без сети), для каждого
+                   движка вывода (PyTorch, по запросу PyTorch с
+                   torch.compile, ONNX Runtime - если установлен), а также
+                   пачка коротких файлов без батчей и с батчами чанков
+
+Результаты выводятся в JSON; с --compare они сравниваются с прошлым
+запуском, и регрессии больше порога завершают скрипт с кодом 1.
+
+Запуск:
+    python benchmark.py --output bench.json
+    python benchmark.py --quick --only audio text --compare bench.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+GROUPS = ("audio", "text", "translation", "e2e")
+
+# Слова для синтетического текста (русский с латиницей, как в транскрипциях)
+WORDS = (
+    "модель речь аудио перевод текст файл запись голос система данные время "
+    "результат обработка сервер задача чанк model speech audio transcription"
+).split()
+
+
+def measure(fn: Callable, repeat: int) -> Dict:
+    """
+    Многократный запуск функции
+
+    Args:
+        fn: Замеряемая функция без аргументов
+        repeat: Количество запусков
+
+    Returns:
+        Dict: Минимальное, медианное и среднее время в секундах
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {
+        "min": round(min(times), 6),
+        "median": round(statistics.median(times), 6),
+        "mean": round(statistics.mean(times), 6),
+        "repeat": repeat,
+    }
+
+
+def synthetic_audio(seconds: float, sample_rate: int, channels: int = 1) -> np.ndarray:
+    """Тон с шумом, int16, форма (samples, channels)"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(len(t))
+    samples = (signal * 32767).astype(np.int16)
+    return np.repeat(samples[:, None], channels, axis=1)
+
+
+def write_audio(path: Path, seconds: float, sample_rate: int, channels: int, fmt: str):
+    """Запись синтетического аудио в файл нужного формата"""
+    from pydub import AudioSegment
+
+    samples = synthetic_audio(seconds, sample_rate, channels)
+    segment = AudioSegment(
+        samples.tobytes(), frame_rate=sample_rate, sample_width=2, channels=channels
+    )
+    segment.export(path, format=fmt)
+
+
+def synthetic_corpus(size: int) -> str:
+    """Текст из предложений и абзацев примерно заданного размера в символах"""
+    rng = random.Random(0)
+    parts = []
+    length = 0
+    while length < size:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(5, 20))]
+        sentence = " ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"])
+        if rng.random() < 0.05:
+            sentence += "\n\n"
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(parts)
+
+
+def offline_transcriber(model=None, processor=None, backend=None):
+    """
+    TranscriptionProcessor без загрузки модели из сети
+
+    Args:
+        model: Модель Whisper (None - только декодирование аудио)
+        processor: Объект с __call__ для признаков и batch_decode
+        backend: Движок вывода (по умолчанию PyTorch)
+    """
+    from backends import TorchBackend
+    from transcription_simple import TranscriptionProcessor
+
+    transcriber = TranscriptionProcessor.__new__(TranscriptionProcessor)
+    transcriber.device = "cpu"
+    transcriber.torch_dtype = None
+    transcriber.model = model
+    transcriber.processor = processor
+    transcriber.backend = backend or (TorchBackend(model) if model is not None else None)
+    transcriber.scheduler = None
+    return transcriber
+
+
+class TinyWhisperProcessor:
+    """Признаки Whisper и декодирование токенов без словаря из сети"""
+
+    def __init__(self, num_mel_bins: int):
+        from transformers import WhisperFeatureExtractor
+
+        self.feature_extractor = WhisperFeatureExtractor(feature_size=num_mel_bins)
+
+    def __call__(self, audio, sampling_rate, return_tensors):
+        return self.feature_extractor(
+            audio, sampling_rate=sampling_rate, return_tensors=return_tensors
+        )
+
+    def batch_decode(self, sequences, skip_special_tokens=True):
+        return [" ".join(str(int(token)) for token in row) for row in sequences]
+
+
+def tiny_whisper():
+    """Модель Whisper из нескольких слоев со случайными весами"""
+    import torch
+    from transformers import WhisperConfig, WhisperForConditionalGeneration
+
+    config = WhisperConfig(
+        vocab_size=64,
+        num_mel_bins=80,
+        d_model=32,
+        encoder_layers=1,
+        decoder_layers=1,
+        encoder_attention_heads=2,
+        decoder_attention_heads=2,
+        encoder_ffn_dim=64,
+        decoder_ffn_dim=64,
+        max_source_positions=1500,
+        max_target_positions=448,
+        bos_token_id=1,
+        decoder_start_token_id=1,
+        eos_token_id=2,
+        pad_token_id=2,
+        begin_suppress_tokens=None,
+    )
+    torch.manual_seed(0)
+    model = WhisperForConditionalGeneration(config).eval()
+    # Как у настоящих чекпойнтов: длину ограничивает max_new_tokens чанка
+    model.generation_config.max_length = config.max_target_positions
+    return model, TinyWhisperProcessor(config.num_mel_bins)
+
+
+def ffmpeg_available() -> bool:
+    from pydub.utils import which
+
+    return which("ffmpeg") is not None
+
+
+def bench_audio(args, workdir: Path) -> List[Dict]:
+    """Декодирование и ресэмплинг через TranscriptionProcessor.load_audio"""
+    from stage_timer import StageTimer
+
+    transcriber = offline_transcriber()
+    durations = [10, 60] if args.quick else [10, 60, 300]
+    variants = [
+        ("wav", 16000, 1),
+        ("wav", 44100, 2),
+        ("wav", 8000, 1),
+        ("mp3", 44100, 2),
+        ("flac", 44100, 1),
+    ]
+    has_ffmpeg = ffmpeg_available()
+    results = []
+    for fmt, rate, channels in variants:
+        for seconds in durations:
+            name = f"load_audio_{fmt}_{rate}hz_{channels}ch_{seconds}s"
+            params = {"format": fmt, "sample_rate": rate, "channels": channels, "seconds": seconds}
+            if fmt != "wav" and not has_ffmpeg:
+                results.append({"group": "audio", "name": name, "params": params,
+                                "skipped": "ffmpeg не найден"})
+                continue
+            path = workdir / f"{name}.{fmt}"
+            write_audio(path, seconds, rate, channels, fmt)
+            timer = StageTimer(path.name)
+            timing = measure(lambda: transcriber.load_audio(path, timer=timer), args.repeat)
+            stages = timer.summary(seconds)["stages"]
+            results.append({
+                "group": "audio",
+                "name": name,
+                "params": params,
+                "seconds": timing,
+                "audio_seconds_per_second": round(seconds / timing["median"], 1),
+                "stages_total": stages,
+            })
+
+    # Лог-мел признаки: WhisperFeatureExtractor на каждый чанк против
+    # LogMelExtractor, нарезающего окна из общей спектрограммы
+    from features import FEATURE_BLOCK_WINDOWS, LogMelExtractor
+    from text_stitching import overlapping_windows
+
+    extractor = TinyWhisperProcessor(80).feature_extractor
+    mel = LogMelExtractor(extractor)
+    for seconds in ([60] if args.quick else [60, 600]):
+        samples = synthetic_audio(seconds, 16000)[:, 0].astype(np.float32) / 32768
+        windows = overlapping_windows(len(samples), extractor.n_samples)
+        blocks = [windows[i:i + FEATURE_BLOCK_WINDOWS]
+                  for i in range(0, len(windows), FEATURE_BLOCK_WINDOWS)]
+        for method, fn in (
+            ("per_chunk", lambda: [extractor(samples[start:end], sampling_rate=16000,
+                                             return_tensors="pt") for start, end in windows]),
+            ("vectorised", lambda: [mel.windows(samples, block) for block in blocks]),
+        ):
+            timing = measure(fn, args.repeat)
+            results.append({
+                "group": "audio",
+                "name": f"log_mel_{method}_{seconds}s",
+                "params": {"seconds": seconds, "windows": len(windows)},
+                "seconds": timing,
+                "audio_seconds_per_second": round(seconds / timing["median"], 1),
+            })
+    return results
+
+
+def bench_text(args, workdir: Path) -> List[Dict]:
+    """Разбивка больших текстов на чанки"""
+    from text_processor import TextProcessor
+
+    processor = TextProcessor()
+    sizes = [100_000, 1_000_000] if args.quick else [100_000, 1_000_000, 5_000_000]
+    results = []
+    for size in sizes:
+        corpus = synthetic_corpus(size)
+        for method, fn in (
+            ("smart_chunk_split", lambda: processor.smart_chunk_split(corpus)),
+            ("split_into_chunks", lambda: processor.split_into_chunks(corpus)),
+        ):
+            timing = measure(fn, args.repeat)
+            results.append({
+                "group": "text",
+                "name": f"{method}_{size // 1000}k",
+                "params": {"chars": len(corpus)},
+                "seconds": timing,
+                "chunks": len(fn()),
+                "mb_per_second": round(len(corpus) / 1e6 / timing["median"], 2),
+            })
+    return results
+
+
+def bench_translation(args, workdir: Path) -> List[Dict]:
+    """Пропускная способность перевода против локальной имитации API"""
+    from mock_openai_server import MockOpenAIServer
+    from translation_loadtest import run_load
+
+    corpus = synthetic_corpus(200_000)
+    chunk_count = 20 if args.quick else 100
+    chunk_size = len(corpus) // chunk_count
+    chunks = [corpus[i * chunk_size:(i + 1) * chunk_size] for i in range(chunk_count)]
+
+    results = []
+    with MockOpenAIServer(latency=args.mock_latency) as server:
+        for concurrency in (1, 4, 16):
+            load = run_load(server.url, chunks, concurrency)
+            results.append({
+                "group": "translation",
+                "name": f"translate_text_concurrency_{concurrency}",
+                "params": {"chunks": chunk_count, "chunk_chars": chunk_size,
+                           "concurrency": concurrency, "mock_latency": args.mock_latency},
+                "seconds": {"total": load["seconds"]},
+                "requests_per_second": load["throughput_rps"],
+                "latency": load["latency"],
+            })
+    return results
+
+
+def bench_e2e(args, workdir: Path) -> List[Dict]:
+    """Транскрибация целиком на крошечной модели со случайными весами"""
+    from backends import ONNXRUNTIME_AVAILABLE, OnnxBackend, TorchBackend
+
+    model, processor = tiny_whisper()
+    engines = {
+        "torch": lambda: TorchBackend(model, accelerate=False),
+        "torch-compile": lambda: TorchBackend(model, accelerate=True),
+    }
+    if ONNXRUNTIME_AVAILABLE:
+        engines["onnx"] = lambda: OnnxBackend(model, export_root=workdir / "onnx")
+    # Третий вариант показывает накладные расходы перекрывающихся окон
+    cases = [(10, 0)] if args.quick else [(10, 0), (60, 0), (60, 2)]
+    results = []
+    for engine in args.backends:
+        if engine not in engines:
+            print(f"⚠️ Движок {engine} недоступен, пропуск", file=sys.stderr)
+            continue
+        started = time.perf_counter()
+        transcriber = offline_transcriber(model, processor, engines[engine]())
+        load_seconds = time.perf_counter() - started
+        for seconds, overlap in cases:
+            path = workdir / f"e2e_{seconds}s.wav"
+            write_audio(path, seconds, 16000, 1, "wav")
+            transcriber.chunk_overlap = overlap
+            summaries = []
+
+            def run():
+                result = transcriber.transcribe_file(path)
+                if not result["success"]:
+                    raise Exception(result["error"])
+                summaries.append(result["timings"])
+
+            timing = measure(run, args.repeat)
+            last = summaries[-1]
+            name = f"transcribe_file_tiny_whisper_{seconds}s"
+            if overlap:
+                name += f"_overlap{overlap}s"
+            # Имена замеров PyTorch не меняются, чтобы сравнение с прошлыми запусками работало
+            if engine != "torch":
+                name += f"_{engine}"
+            results.append({
+                "group": "e2e",
+                "name": name,
+                "params": {"seconds": seconds, "overlap": overlap, "model": "tiny-random",
+                           "backend": engine},
+                "seconds": timing,
+                "load_seconds": round(load_seconds, 3),
+                "rtf": last["rtf"],
+                "overlap_overhead": last.get("overlap_overhead"),
+                "stages": last["stages"],
+            })
+
+        # Короткие файлы (по одному чанку): без батчей и с батчами
+        clip = synthetic_audio(5, 16000)[:, 0].astype(np.float32) / 32767
+        clips = [clip] * (4 if args.quick else 16)
+        audio_seconds = 5 * len(clips)
+        for batch_size in (1, 8):
+            timing = measure(lambda: transcribe_clips(transcriber, clips, batch_size), args.repeat)
+            name = f"transcribe_short_files_tiny_whisper_{len(clips)}x5s_batch{batch_size}"
+            if engine != "torch":
+                name += f"_{engine}"
+            results.append({
+                "group": "e2e",
+                "name": name,
+                "params": {"files": len(clips), "seconds": 5, "batch_size": batch_size,
+                           "model": "tiny-random", "backend": engine},
+                "seconds": timing,
+                "audio_seconds_per_second": round(audio_seconds / timing["median"], 2),
+            })
+    return results
+
+
+def transcribe_clips(transcriber, clips: List[np.ndarray], batch_size: int):
+    """Одновременная транскрибация файлов с общим планировщиком батчей"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from batch_scheduler import chunk_scheduler
+
+    transcriber.scheduler = chunk_scheduler(transcriber.backend, transcriber._decode, batch_size)
+    try:
+        with ThreadPoolExecutor(max_workers=batch_size) as executor:
+            list(executor.map(transcriber.transcribe_samples, clips))
+    finally:
+        if transcriber.scheduler is not None:
+            transcriber.scheduler.close()
+        transcriber.scheduler = None
+
+
+BENCHMARKS = {
+    "audio": bench_audio,
+    "text": bench_text,
+    "translation": bench_translation,
+    "e2e": bench_e2e,
+}
+
+
+def environment() -> Dict:
+    """Версии окружения для сравнения запусков"""
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "numpy": np.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    for module in ("torch", "transformers", "onnxruntime"):
+        try:
+            info[module] = __import__(module).__version__
+        except ImportError:
+            info[module] = None
+    try:
+        info["commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=Path(__file__).parent, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info["commit"] = None
+    return info
+
+
+def primary_time(result: Dict) -> Optional[float]:
+    """Основное время замера для сравнения"""
+    seconds = result.get("seconds") or {}
+    return seconds.get("median", seconds.get("total"))
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[Dict]:
+    """
+    Сравнение с прошлым запуском
+
+    Args:
+        baseline: JSON прошлого запуска
+        current: JSON текущего запуска
+        threshold: Допустимое замедление (0.1 = 10%)
+
+    Returns:
+        List[Dict]: Замеры, замедлившиеся больше порога
+    """
+    previous = {result["name"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in current["results"]:
+        old = previous.get(result["name"])
+        new_time, old_time = primary_time(result), old and primary_time(old)
+        if not new_time or not old_time:
+            continue
+        change = new_time / old_time - 1
+        result["change"] = round(change, 4)
+        if change > threshold:
+            regressions.append({"name": result["name"], "before": old_time,
+                                "after": new_time, "change": round(change, 4)})
+    return regressions
+
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Замеры производительности")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=list(GROUPS),
+                        help="Группы замеров")
+    parser.add_argument("--quick", action="store_true", help="Меньшие объемы данных")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов каждого замера")
+    parser.add_argument("--backends", nargs="+", choices=("torch", "torch-compile", "onnx"),
+                        default=["torch", "onnx"],
+                        help="Движки вывода для e2e (недоступные пропускаются; "
+                             "torch-compile - TRANSCRIPTION_ACCELERATE, компиляция занимает время)")
+    parser.add_argument("--mock-latency", type=float, default=0.01,
+                        help="Задержка имитации API, секунды")
+    parser.add_argument("--output", help="Файл для JSON (по умолчанию stdout)")
+    parser.add_argument("--compare", help="JSON прошлого запуска")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Допустимое замедление при сравнении")
+    args = parser.parse_args()
+
+    report = {"environment": environment(), "results": []}
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        for group in args.only:
+            print(f"⏱️ {group}...", file=sys.stderr)
+            report["results"].extend(BENCHMARKS[group](args, Path(tmp)))
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        report["regressions"] = regressions
+        for item in regressions:
+            print(f"❌ {item['name']}: {item['before']:.4f} -> {item['after']:.4f} "
+                  f"(+{item['change'] * 100:.1f}%)", file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"✅ Результаты сохранены: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
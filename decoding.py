@@ -0,0 +1,397 @@
+"""
+Ограничение генерации Whisper на чанк
+
+На тихих и шумных чанках Whisper часто зацикливается и повторяет одну
+фразу, пока не исчерпает все 448 позиций декодера. Здесь:
+- лимит новых токенов считается по длительности речи в чанке (кадры
+  тише TRANSCRIPTION_SILENCE_DB не считаются), а чанк без речи вовсе
+  не отправляется в модель;
+- генерация останавливается, как только хвост последовательности
+  становится периодическим (фраза повторилась несколько раз подряд);
+- текст с зацикливанием или слишком высокой степенью сжатия (как в
+  эталонной реализации Whisper, порог 2.4) один раз декодируется заново
+  с сэмплированием, а оставшийся повтор в конце текста обрезается.
+Худший случай на чанк - два прохода по лимиту токенов; дополнительно
+время генерации можно ограничить TRANSCRIPTION_CHUNK_MAX_SECONDS.
+
+Без явного языка Whisper определяет его заново на каждом чанке (лишний
+проход кодировщика) и может сменить язык посреди файла. FileLanguage
+определяет язык один раз по первым чанкам с речью и передает его в
+generate() для остальных.
+
+generate_batch() генерирует текст нескольких чанков (в том числе разных
+файлов) одним вызовом generate(); такие батчи собирает
+batch_scheduler.BatchScheduler.
+"""
+
+import math
+import os
+import zlib
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from stage_timer import StageTimer
+
+# Порог тишины для оценки длительности речи, дБ относительно полной шкалы
+SILENCE_DB = float(os.environ.get("TRANSCRIPTION_SILENCE_DB", -50))
+# Токенов на секунду речи с запасом (быстрая русская речь - около 6)
+TOKENS_PER_SECOND = float(os.environ.get("TRANSCRIPTION_TOKENS_PER_SECOND", 10))
+MIN_NEW_TOKENS = 24
+# 448 позиций декодера минус стартовые токены (язык, задача, без меток времени)
+MAX_NEW_TOKENS = 440
+# Температура повторного декодирования зациклившегося чанка (0 - без повтора)
+FALLBACK_TEMPERATURE = float(os.environ.get("TRANSCRIPTION_FALLBACK_TEMPERATURE", 0.4))
+# Ограничение времени одной генерации в секундах (не задано - без ограничения)
+CHUNK_MAX_SECONDS = float(os.environ.get("TRANSCRIPTION_CHUNK_MAX_SECONDS", 0)) or None
+COMPRESSION_RATIO_THRESHOLD = 2.4
+
+# Язык: file - определить один раз на файл, chunk - на каждом чанке
+# (поведение Whisper по умолчанию) или код языка (ru, en, ...)
+LANGUAGE = os.environ.get("TRANSCRIPTION_LANGUAGE", "file")
+# Язык фиксируется, когда средняя вероятность по чанкам с речью выше
+# порога, или после DETECT_CHUNKS таких чанков
+LANGUAGE_CONFIDENCE = 0.8
+DETECT_CHUNKS = 3
+
+# Зацикливание: хвост с периодом до MAX_PERIOD токенов, повторенный не
+# меньше MIN_REPEATS раз и не короче MIN_LOOP_TOKENS токенов
+MAX_PERIOD = 16
+MIN_REPEATS = 4
+MIN_LOOP_TOKENS = 16
+# То же для слов готового текста
+MAX_PERIOD_WORDS = 8
+MIN_REPEATS_WORDS = 3
+MIN_LOOP_WORDS = 8
+
+FRAME = 320  # 20 мс при 16 кГц
+
+
+def speech_seconds(samples: np.ndarray, sample_rate: int = 16000, silence_db: float = SILENCE_DB) -> float:
+    """
+    Длительность кадров громче порога тишины
+
+    Args:
+        samples: Сэмплы в диапазоне [-1, 1]
+        sample_rate: Частота дискретизации
+        silence_db: Порог тишины, дБ
+
+    Returns:
+        float: Секунды речи (точнее, не-тишины) в сэмплах
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    frames = len(samples) // FRAME
+    if not frames:
+        return 0.0
+    energy = np.square(samples[:frames * FRAME].reshape(frames, FRAME)).mean(axis=1)
+    threshold = 10 ** (silence_db / 10)
+    return int(np.count_nonzero(energy > threshold)) * FRAME / sample_rate
+
+
+def token_budget(speech: float) -> int:
+    """
+    Лимит новых токенов для чанка
+
+    Args:
+        speech: Секунды речи в чанке
+
+    Returns:
+        int: Лимит токенов (0 - чанк без речи, генерация не нужна)
+    """
+    if speech <= 0:
+        return 0
+    return min(MAX_NEW_TOKENS, MIN_NEW_TOKENS + math.ceil(speech * TOKENS_PER_SECOND))
+
+
+def compression_ratio(text: str) -> float:
+    """Степень сжатия текста zlib: у зациклившегося текста она высокая"""
+    data = text.encode("utf-8")
+    if not data:
+        return 0.0
+    return len(data) / len(zlib.compress(data))
+
+
+def _loop_start(items: List, max_period: int, min_repeats: int, min_length: int) -> Optional[int]:
+    """Позиция после первой копии повторяющегося хвоста или None"""
+    for period in range(1, max_period + 1):
+        repeats = 1
+        end = len(items)
+        while end - period * (repeats + 1) >= 0 and (
+            items[end - period * (repeats + 1):end - period * repeats] == items[end - period:end]
+        ):
+            repeats += 1
+        if repeats >= min_repeats and repeats * period >= min_length:
+            return end - period * (repeats - 1)
+    return None
+
+
+def trim_repetition(text: str) -> str:
+    """
+    Обрезка повтора в конце текста до одной копии
+
+    Args:
+        text: Распознанный текст
+
+    Returns:
+        str: Текст без зациклившегося хвоста
+    """
+    words = text.split()
+    start = _loop_start(words, MAX_PERIOD_WORDS, MIN_REPEATS_WORDS, MIN_LOOP_WORDS)
+    if start is None:
+        return text
+    return " ".join(words[:start])
+
+
+def finished_token_ids(generation_config) -> List[int]:
+    """Токены конца текста и дополнения (ими заполняются завершенные строки батча)"""
+    ids = []
+    for name in ("eos_token_id", "pad_token_id"):
+        value = getattr(generation_config, name, None)
+        if value is None:
+            continue
+        ids.extend(value if isinstance(value, (list, tuple)) else [value])
+    return sorted(set(ids))
+
+
+def make_repetition_stop(finished_tokens: Sequence[int] = ()):
+    """
+    Критерий остановки generate() при зацикливании хвоста
+
+    Args:
+        finished_tokens: Токены конца текста и дополнения; строка, в хвосте
+            которой они есть, уже завершена, и ее дополнение не считается
+            повтором
+
+    Returns:
+        StoppingCriteria с атрибутами triggered (сработал ли хотя бы раз)
+        и hits (сработал ли для каждой строки батча)
+    """
+    import torch
+    from transformers import StoppingCriteria
+
+    class RepetitionStop(StoppingCriteria):
+        def __init__(self):
+            self.triggered = False
+            self.hits = None
+
+        def __call__(self, input_ids, scores, **kwargs):
+            hits = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+            finished = torch.tensor(list(finished_tokens), dtype=input_ids.dtype, device=input_ids.device)
+            for period in range(1, MAX_PERIOD + 1):
+                span = max(period * MIN_REPEATS, MIN_LOOP_TOKENS)
+                if input_ids.shape[1] < span:
+                    break
+                tail = input_ids[:, -span:]
+                looped = (tail[:, period:] == tail[:, :-period]).all(dim=1)
+                if len(finished_tokens):
+                    looped &= ~torch.isin(tail, finished).any(dim=1)
+                hits |= looped
+            if bool(hits.any()):
+                self.triggered = True
+            # Строки батча не переставляются (лучи одного окна идут подряд)
+            self.hits = hits if self.hits is None else self.hits | hits.to(self.hits.device)
+            return hits
+
+    return RepetitionStop()
+
+
+def language_probabilities(backend, input_features) -> Dict[str, float]:
+    """
+    Вероятности языков для окна (один шаг декодера после кодировщика)
+
+    Args:
+        backend: Движок вывода (backends.create_backend)
+        input_features: Признаки одного окна
+
+    Returns:
+        Dict[str, float]: Код языка -> вероятность (пусто для
+        одноязычной модели)
+    """
+    import torch
+
+    config = backend.generation_config
+    lang_to_id = getattr(config, "lang_to_id", None)
+    if not lang_to_id:
+        return {}
+    decoder_input_ids = torch.full(
+        (input_features.shape[0], 1), config.decoder_start_token_id,
+        dtype=torch.long, device=input_features.device,
+    )
+    logits, _ = backend.decode_step(decoder_input_ids, backend.encode(input_features))
+    probabilities = logits[0, list(lang_to_id.values())].float().softmax(-1).tolist()
+    return {token.strip("<|>"): p for token, p in zip(lang_to_id, probabilities)}
+
+
+class FileLanguage:
+    """Язык файла, общий для всех его чанков"""
+
+    def __init__(self, backend, mode: str = LANGUAGE):
+        """
+        Args:
+            backend: Движок вывода (backends.create_backend)
+            mode: file, chunk или код языка (по умолчанию TRANSCRIPTION_LANGUAGE)
+        """
+        self.backend = backend
+        self.mode = mode
+        self.language: Optional[str] = None
+        self.locked = False
+        self._totals: Dict[str, float] = {}
+        self._chunks = 0
+        if mode not in ("file", "chunk"):
+            self.language, self.locked = mode, True
+        elif mode == "file" and getattr(backend.generation_config, "language", None):
+            # Язык уже задан в конфигурации генерации модели
+            self.language, self.locked = backend.generation_config.language, True
+
+    def generate_kwargs(self, input_features, timer: Optional[StageTimer] = None) -> Dict:
+        """
+        Параметры generate() для чанка с речью
+
+        Args:
+            input_features: Признаки чанка (для определения языка, пока он
+                не зафиксирован)
+            timer: StageTimer (этап language и поле language сводки)
+
+        Returns:
+            Dict: language и task или пустой словарь (язык определяет Whisper)
+        """
+        if not self.locked and self.mode == "file":
+            timer = timer or StageTimer()
+            with timer.stage("language"):
+                probabilities = language_probabilities(self.backend, input_features)
+            if not probabilities:
+                self.locked = True
+            else:
+                self._chunks += 1
+                for code, p in probabilities.items():
+                    self._totals[code] = self._totals.get(code, 0.0) + p
+                self.language = max(self._totals, key=self._totals.get)
+                confidence = self._totals[self.language] / self._chunks
+                self.locked = confidence >= LANGUAGE_CONFIDENCE or self._chunks >= DETECT_CHUNKS
+            if self.language:
+                timer.info["language"] = self.language
+        if self.language is None:
+            return {}
+        return {"language": self.language, "task": "transcribe"}
+
+
+def generate_chunk(
+    backend,
+    decode: Callable,
+    inputs: Dict,
+    samples: np.ndarray,
+    timer: Optional[StageTimer] = None,
+    language: Optional[FileLanguage] = None,
+    scheduler=None,
+    **generate_kwargs,
+) -> str:
+    """
+    Генерация текста одного чанка с ограничением длины и повторов
+
+    Args:
+        backend: Движок вывода (backends.create_backend)
+        decode: Функция, переводящая результат generate() в список текстов
+        inputs: Входы модели (input_features и, при наличии, attention_mask)
+        samples: Сэмплы чанка для оценки длительности речи
+        timer: StageTimer (этапы generate, batch_decode и счетчики
+            silent_chunks, repetition_stops, decode_fallbacks)
+        language: Язык файла (None - определяет Whisper на каждом чанке)
+        scheduler: BatchScheduler (batch_scheduler.chunk_scheduler), через
+            который чанк генерируется вместе с чанками других файлов;
+            None - отдельный вызов generate()
+        **generate_kwargs: Параметры generate() (num_beams и т.п.)
+
+    Returns:
+        str: Распознанный текст
+    """
+    timer = timer or StageTimer()
+    if not token_budget(speech_seconds(samples)):
+        timer.count("silent_chunks")
+        return ""
+    if language is not None:
+        generate_kwargs.update(language.generate_kwargs(inputs["input_features"], timer))
+
+    if scheduler is not None:
+        # В один батч попадают чанки с одинаковыми параметрами (язык, лучи)
+        key = tuple(sorted(generate_kwargs.items()))
+        return scheduler.submit((inputs, samples, timer), key).result()
+    return generate_batch(backend, decode, [(inputs, samples, timer)], **generate_kwargs)[0]
+
+
+def generate_batch(
+    backend,
+    decode: Callable,
+    chunks: Sequence[Tuple[Dict, np.ndarray, StageTimer]],
+    **generate_kwargs,
+) -> List[str]:
+    """
+    Генерация текста нескольких чанков с речью одним вызовом generate()
+
+    Лимит токенов батча - наибольший из лимитов его чанков; зациклившиеся
+    строки останавливаются раньше, а их чанки один раз декодируются
+    заново с сэмплированием (тоже одним батчем). Время этапов делится
+    между чанками поровну.
+
+    Args:
+        backend: Движок вывода (backends.create_backend)
+        decode: Функция, переводящая результат generate() в список текстов
+        chunks: Входы модели, сэмплы и StageTimer каждого чанка
+        **generate_kwargs: Параметры generate() (язык, num_beams и т.п.)
+
+    Returns:
+        List[str]: Тексты в порядке чанков
+    """
+    import torch
+    from transformers import StoppingCriteriaList
+
+    def run(stage, indices, **kwargs):
+        inputs = {
+            name: torch.cat([chunks[i][0][name] for i in indices])
+            for name in chunks[indices[0]][0]
+        }
+        budget = max(token_budget(speech_seconds(chunks[i][1])) for i in indices)
+        stop = make_repetition_stop(finished_token_ids(backend.generation_config))
+        batch_timer = StageTimer()
+        with batch_timer.stage(stage):
+            output = backend.generate(
+                **inputs,
+                max_new_tokens=budget,
+                max_time=CHUNK_MAX_SECONDS,
+                stopping_criteria=StoppingCriteriaList([stop]),
+                **kwargs,
+            )
+        with batch_timer.stage("batch_decode"):
+            texts = [text.strip() for text in decode(output)]
+
+        stopped = [False] * len(indices)
+        if stop.hits is not None:
+            stopped = stop.hits.view(len(indices), -1).any(dim=1).tolist()
+        for i, row_stopped in zip(indices, stopped):
+            timer = chunks[i][2]
+            for name, entry in batch_timer.stages.items():
+                timer.record(name, entry["wall"] / len(indices), entry["cpu"] / len(indices))
+            if len(indices) > 1:
+                timer.count("batched_chunks")
+            if row_stopped:
+                timer.count("repetition_stops")
+        return texts
+
+    texts = run("generate", list(range(len(chunks))), **generate_kwargs)
+    results = []
+    looped = []
+    for i, text in enumerate(texts):
+        trimmed = trim_repetition(text)
+        results.append(trimmed)
+        if trimmed != text or compression_ratio(text) > COMPRESSION_RATIO_THRESHOLD:
+            looped.append(i)
+
+    if looped and FALLBACK_TEMPERATURE > 0:
+        for i in looped:
+            chunks[i][2].count("decode_fallbacks")
+        fallback_kwargs = dict(generate_kwargs, do_sample=True, temperature=FALLBACK_TEMPERATURE, num_beams=1)
+        fallback_kwargs.pop("early_stopping", None)
+        retries = run("generate_fallback", looped, **fallback_kwargs)
+        for i, retry in zip(looped, retries):
+            if trim_repetition(retry) == retry and compression_ratio(retry) <= COMPRESSION_RATIO_THRESHOLD:
+                results[i] = retry
+    return results
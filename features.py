@@ -0,0 +1,103 @@
+"""
+Лог-мел признаки Whisper без WhisperFeatureExtractor на каждый чанк
+
+WhisperFeatureExtractor, вызванный для каждого 30-секундного чанка,
+каждый раз дополняет чанк нулями, заново создает окно Ханна и фильтры,
+проходит через Python-обвязку и считает модуль спектра через abs().
+Здесь окно и фильтры создаются один раз, STFT и мел-фильтры считаются
+одним вызовом PyTorch для блока подряд идущих окон, а признаки окон
+нарезаются из общей спектрограммы по 3000 кадров (перекрытие окон
+не считается дважды). Результат совпадает с WhisperFeatureExtractor,
+кроме крайних кадров окна, где вместо отражения на краю чанка
+используются соседние сэмплы.
+
+На одном ядре CPU быстрее всего блок из одного окна: спектрограмма
+нескольких окон не помещается в кэш процессора. Блок больше имеет
+смысл при многопоточном PyTorch или GPU.
+"""
+
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Сколько 30-секундных окон считать за один проход (память - около 5 МБ на окно)
+FEATURE_BLOCK_WINDOWS = int(os.environ.get("TRANSCRIPTION_FEATURE_BLOCK", 1))
+
+
+class LogMelExtractor:
+    """Признаки окон аудио с параметрами WhisperFeatureExtractor"""
+
+    def __init__(self, feature_extractor):
+        """
+        Args:
+            feature_extractor: WhisperFeatureExtractor модели
+        """
+        import torch
+
+        self.feature_extractor = feature_extractor
+        self.n_fft = feature_extractor.n_fft
+        self.hop_length = feature_extractor.hop_length
+        self.n_samples = feature_extractor.n_samples
+        self.frames = feature_extractor.nb_max_frames
+        self.sampling_rate = feature_extractor.sampling_rate
+        self._window = torch.hann_window(self.n_fft)
+        self._mel_filters = torch.from_numpy(feature_extractor.mel_filters).float().T.contiguous()
+
+    def supports(self, bounds: List[Tuple[int, int]]) -> bool:
+        """Окна можно нарезать из общей спектрограммы"""
+        if getattr(self.feature_extractor, "dither", 0.0):
+            return False
+        return all(start % self.hop_length == 0 and end - start <= self.n_samples
+                   for start, end in bounds)
+
+    def windows(self, samples: np.ndarray, bounds: List[Tuple[int, int]],
+                return_attention_mask: bool = False):
+        """
+        Признаки окон аудио
+
+        Args:
+            samples: Сэмплы всего файла
+            bounds: Границы окон (подряд идущие, из overlapping_windows)
+            return_attention_mask: Вернуть маску кадров с аудио
+
+        Returns:
+            tuple: (признаки [окна, мел-полосы, кадры], маска [окна, кадры] или None)
+        """
+        import torch
+
+        if not self.supports(bounds):
+            inputs = self.feature_extractor(
+                [samples[start:end] for start, end in bounds],
+                sampling_rate=self.sampling_rate,
+                return_tensors="pt",
+                return_attention_mask=return_attention_mask,
+            )
+            return inputs.input_features, inputs.get("attention_mask")
+
+        first = bounds[0][0]
+        last = bounds[-1][0] + self.n_samples
+        span = np.zeros(last - first, dtype=np.float32)
+        available = samples[first:last]
+        span[:len(available)] = available
+
+        waveform = torch.from_numpy(span)
+        stft = torch.stft(waveform, self.n_fft, self.hop_length,
+                          window=self._window, return_complex=True)
+        # Квадрат модуля без извлечения корня в abs() - заметно быстрее на CPU;
+        # лишний последний кадр отбрасывается при нарезке окон
+        power = stft.real.square() + stft.imag.square()
+        log_spec = torch.clamp(self._mel_filters @ power, min=1e-10).log10()
+
+        offsets = [(start - first) // self.hop_length for start, _ in bounds]
+        features = torch.stack([log_spec[:, offset:offset + self.frames] for offset in offsets])
+        # Нормализация по максимуму каждого окна, как у WhisperFeatureExtractor
+        max_val = features.amax(dim=(1, 2), keepdim=True)
+        features = (torch.maximum(features, max_val - 8.0) + 4.0) / 4.0
+
+        attention_mask: Optional[torch.Tensor] = None
+        if return_attention_mask:
+            positions = torch.arange(self.frames) * self.hop_length
+            lengths = torch.tensor([end - start for start, end in bounds])
+            attention_mask = (positions[None, :] < lengths[:, None]).long()
+        return features, attention_mask
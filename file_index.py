@@ -0,0 +1,164 @@
+"""
+Журнал транскрибированных файлов для пакетной обработки
+
+Для каждого аудиофайла хранится размер, время изменения и хэш содержимого,
+путь к тексту и статус. По нему пакетная транскрибация и наблюдение за
+папкой пропускают файлы, текст которых актуален, и продолжают работу после
+прерывания с того места, где остановились.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from result_store import DATA_DIR, file_sha256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    output TEXT,
+    status TEXT NOT NULL,
+    error TEXT NOT NULL DEFAULT '',
+    audio_seconds REAL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+"""
+
+DEFAULT_INDEX = DATA_DIR / "batch_index.db"
+
+
+class FileIndex:
+    """Состояние транскрибации файлов на диске"""
+
+    def __init__(self, path: Path = DEFAULT_INDEX):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self._ensure_column("files", "translation", "TEXT")
+
+    def _ensure_column(self, table: str, column: str, declaration: str):
+        """Добавление колонки в журнал, созданный старой версией"""
+        columns = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    @staticmethod
+    def key(path: Path) -> str:
+        return str(Path(path).resolve())
+
+    def get(self, path: Path) -> Optional[Dict]:
+        """Запись о файле"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM files WHERE path = ?", (self.key(path),)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def is_current(self, path: Path, output: Path) -> bool:
+        """
+        Проверка, что текст файла актуален
+
+        Сначала сравниваются размер и время изменения; если они
+        изменились, но хэш содержимого прежний (файл скопировали или
+        коснулись), запись обновляется без повторной транскрибации.
+
+        Args:
+            path: Аудиофайл
+            output: Ожидаемый путь к тексту
+
+        Returns:
+            bool: True, если транскрибировать заново не нужно
+        """
+        entry = self.get(path)
+        if not entry or entry["status"] != "done" or entry["output"] != str(output):
+            return False
+        if not Path(output).exists():
+            return False
+
+        stat = os.stat(path)
+        if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return True
+        if entry["size"] != stat.st_size or not entry["sha256"]:
+            return False
+        if file_sha256(path) != entry["sha256"]:
+            return False
+        self._update_stat(path, stat)
+        return True
+
+    def _update_stat(self, path: Path, stat: os.stat_result):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE files SET size = ?, mtime_ns = ?, updated = ? WHERE path = ?",
+                (stat.st_size, stat.st_mtime_ns, time.time(), self.key(path)),
+            )
+
+    def _save(self, path: Path, stat: os.stat_result, **fields):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files "
+                "(path, size, mtime_ns, sha256, output, status, error, audio_seconds, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.key(path),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    fields.get("sha256"),
+                    fields.get("output"),
+                    fields["status"],
+                    fields.get("error", ""),
+                    fields.get("audio_seconds"),
+                    time.time(),
+                ),
+            )
+
+    def mark_done(self, path: Path, stat: os.stat_result, sha256: str,
+                  output: Path, audio_seconds: Optional[float] = None):
+        """
+        Отметка успешной транскрибации
+
+        Args:
+            stat: Состояние файла до начала обработки (если файл изменился
+                во время транскрибации, он будет обработан снова)
+        """
+        self._save(path, stat, sha256=sha256, output=str(output), status="done",
+                   audio_seconds=audio_seconds)
+
+    def mark_failed(self, path: Path, stat: os.stat_result, error: str):
+        """Отметка ошибки (файл будет обработан при следующем запуске)"""
+        self._save(path, stat, status="failed", error=error)
+
+    def mark_translated(self, path: Path, translation: Path):
+        """Отметка готового перевода текста файла"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE files SET translation = ?, updated = ? WHERE path = ?",
+                (str(translation), time.time(), self.key(path)),
+            )
+
+    def find_done_by_sha(self, sha256: str) -> Optional[Dict]:
+        """Готовый текст для файла с таким же содержимым"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM files WHERE sha256 = ? AND status = 'done' ORDER BY updated DESC",
+                (sha256,),
+            ).fetchall()
+        for row in rows:
+            if row["output"] and Path(row["output"]).exists():
+                return dict(row)
+        return None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Отдельный процесс для транскрибации
+
+Веб-сервер кладет задачи в локальную очередь (multiprocessing.managers),
+а долгоживущие процессы-обработчики держат модель Whisper в памяти, берут
+задачи из очереди и записывают результаты в общее хранилище ResultStore.
+Падение или нехватка памяти в обработчике не роняет веб-приложение:
+супервизор помечает задачу ошибкой и перезапускает процесс.
+
+Запуск:
+    python inference_worker.py --workers 1
+
+Веб-сервер переключается в этот режим переменной окружения
+INFERENCE_WORKER_ADDRESS (например, 127.0.0.1:50055).
+"""
+
+import argparse
+import os
+import queue
+import secrets
+import threading
+import time
+from multiprocessing import Process
+from multiprocessing.managers import BaseManager, DictProxy
+from typing import Callable, Dict, Optional, Tuple, Union
+
+import metrics
+from batch_scheduler import BATCH_SIZE
+from decoding import CHUNK_MAX_SECONDS, LANGUAGE
+from result_store import DATA_DIR, ResultStore
+from text_stitching import CHUNK_OVERLAP
+
+DEFAULT_ADDRESS = "127.0.0.1:50055"
+
+# Общий ключ для подключения к очереди; создается сервером обработчиков
+AUTHKEY_FILE = DATA_DIR / "worker_authkey"
+
+# Как часто обработчик записывает прогресс файла в хранилище (в процентах)
+PROGRESS_STEP = 5
+
+
+class WorkerQueueManager(BaseManager):
+    """Менеджер очереди задач транскрибации"""
+
+
+def parse_address(address: str) -> Union[Tuple[str, int], str]:
+    """
+    Разбор адреса очереди
+
+    Args:
+        address: "host:port" или путь к Unix-сокету
+
+    Returns:
+        Адрес в формате multiprocessing.connection
+    """
+    if address.startswith("/") or address.startswith("."):
+        return address
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def load_authkey(create: bool = False) -> bytes:
+    """Чтение общего ключа (сервер при необходимости создает его)"""
+    env_key = os.environ.get("INFERENCE_WORKER_AUTHKEY")
+    if env_key:
+        return env_key.encode("utf-8")
+    if not AUTHKEY_FILE.exists():
+        if not create:
+            raise Exception("Ключ очереди не найден, запустите inference_worker.py")
+        AUTHKEY_FILE.parent.mkdir(parents=True, exist_ok=True)
+        AUTHKEY_FILE.write_text(secrets.token_hex(32), encoding="utf-8")
+        AUTHKEY_FILE.chmod(0o600)
+    return AUTHKEY_FILE.read_text(encoding="utf-8").strip().encode("utf-8")
+
+
+def transcription_settings(model_name: str) -> Dict:
+    """
+    Параметры, от которых зависит текст транскрипции
+
+    Args:
+        model_name: Имя модели задачи (model_manager.DEFAULT_MODEL - модель
+            по умолчанию)
+
+    Returns:
+        Dict: Модель, перекрытие окон, режим языка и длина чанка
+    """
+    return {
+        "model": model_name,
+        "overlap": CHUNK_OVERLAP,
+        "language": LANGUAGE,
+        "chunk_max_seconds": CHUNK_MAX_SECONDS,
+    }
+
+
+def transcribe_to_store(store: ResultStore, get_processor: Callable, job_id: str,
+                        index: int, filename: str, path: str,
+                        source_sha256: Optional[str] = None, samples=None,
+                        progress_callback: Optional[Callable] = None,
+                        decode_timer=None, settings: Optional[Dict] = None) -> Dict:
+    """
+    Транскрибация одного файла с сохранением результата в хранилище
+
+    Если аудио с таким же хэшем уже распознавалось с теми же параметрами,
+    берется готовый текст.
+
+    Args:
+        store: Хранилище результатов
+        get_processor: Функция, возвращающая TranscriptionProcessor
+            (модель загружается только если она действительно нужна)
+        job_id: Идентификатор задачи
+        index: Номер файла в задаче
+        filename: Исходное имя файла
+        path: Путь к аудиофайлу
+        source_sha256: Хэш содержимого аудио
+        samples: Уже декодированное аудио
+        progress_callback: Функция, принимающая прогресс файла в процентах
+        decode_timer: Замер декодирования samples (TranscriptionProcessor.prepare_file)
+        settings: Параметры транскрибации (transcription_settings)
+
+    Returns:
+        Dict: Метаданные сохраненного результата
+    """
+    cached = store.find_by_source(source_sha256, settings)
+    if source_sha256:
+        metrics.cache_requests.inc(cache="transcription", result="hit" if cached else "miss")
+    if cached:
+        text = store.read_text(cached["job_id"], cached["index"])
+        metrics.transcribed_files.inc(status="cached")
+        return store.add_result(job_id, index, filename, text, True,
+                                source_sha256=source_sha256, settings=settings, cached=True)
+
+    result = get_processor().transcribe_file(
+        path, progress_callback=progress_callback, samples=samples,
+        decode_timer=decode_timer,
+    )
+
+    # Текст хранится в хранилище, файл рядом с аудио не нужен
+    if result.get("output_file"):
+        try:
+            os.remove(result["output_file"])
+        except OSError:
+            pass
+
+    metrics.transcribed_files.inc(status="success" if result["success"] else "error")
+    return store.add_result(
+        job_id,
+        index,
+        filename,
+        result["text"],
+        result["success"],
+        result.get("error", ""),
+        source_sha256,
+        result.get("timings"),
+        settings,
+    )
+
+
+def finish_job_if_done(store: ResultStore, job_id: str, total: int):
+    """Отметка задачи завершенной, когда готовы все ее файлы"""
+    done = len(store.list_results(job_id))
+    if done >= total:
+        store.update_job(job_id, status="completed", progress=100)
+    else:
+        store.update_job(job_id, progress=round(done / total * 100, 1))
+
+
+def worker_main(address, authkey: bytes):
+    """Цикл процесса-обработчика: модель загружается один раз"""
+    from model_manager import DEFAULT_MODEL, ModelManager
+    from transcription_simple import TranscriptionProcessor
+    from warmup import warm_up
+
+    WorkerQueueManager.register("jobs")
+    WorkerQueueManager.register("active", proxytype=DictProxy)
+    manager = WorkerQueueManager(address=address, authkey=authkey)
+    manager.connect()
+    jobs = manager.jobs()
+    active = manager.active()
+
+    store = ResultStore()
+    # Модели загружаются и выгружаются по бюджету памяти; модель по
+    # умолчанию загружается и прогревается заранее
+    models = ModelManager(
+        lambda name: TranscriptionProcessor(model_name=None if name == DEFAULT_MODEL else name)
+    )
+    with models.use(DEFAULT_MODEL) as processor:
+        warm_up(processor)
+    print(f"✅ Обработчик {os.getpid()} готов")
+
+    def run_slot(slot: int):
+        # Файлы, которые обрабатываются одновременно, делят модель, а их
+        # чанки генерируются общими батчами
+        key = (os.getpid(), slot)
+        while True:
+            task = jobs.get()
+            if task is None:
+                break
+
+            active[key] = task
+            job_id, total = task["job_id"], task["total"]
+            last_reported = [0.0]
+
+            def file_progress(pct):
+                # Прогресс задачи с учетом уже готовых файлов
+                if pct - last_reported[0] < PROGRESS_STEP and pct < 100:
+                    return
+                last_reported[0] = pct
+                done = len(store.list_results(job_id))
+                store.update_job(job_id, progress=round((done + pct / 100) / total * 100, 1))
+
+            model_name = task.get("model") or DEFAULT_MODEL
+            try:
+                with models.lazy(model_name) as get_processor:
+                    transcribe_to_store(
+                        store,
+                        get_processor,
+                        job_id,
+                        task["index"],
+                        task["original"],
+                        task["path"],
+                        source_sha256=task.get("sha256"),
+                        progress_callback=file_progress,
+                        settings=transcription_settings(model_name),
+                    )
+            except Exception as e:
+                store.add_result(job_id, task["index"], task["original"], "", False, str(e))
+            finally:
+                active.pop(key, None)
+                if task.get("cleanup"):
+                    try:
+                        os.remove(task["path"])
+                    except OSError:
+                        pass
+
+            finish_job_if_done(store, job_id, total)
+
+    slots = [
+        threading.Thread(target=run_slot, args=(slot,), name=f"worker-slot-{slot}")
+        for slot in range(BATCH_SIZE)
+    ]
+    for thread in slots:
+        thread.start()
+    for thread in slots:
+        thread.join()
+
+
+class WorkerClient:
+    """Подключение веб-сервера к очереди обработчиков"""
+
+    def __init__(self, address: str, authkey: Optional[bytes] = None):
+        WorkerQueueManager.register("jobs")
+        WorkerQueueManager.register("active", proxytype=DictProxy)
+        self.address = address
+        self._manager = WorkerQueueManager(
+            address=parse_address(address), authkey=authkey or load_authkey()
+        )
+        self._manager.connect()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["WorkerClient"]:
+        """Клиент по INFERENCE_WORKER_ADDRESS или None, если режим выключен"""
+        address = os.environ.get("INFERENCE_WORKER_ADDRESS")
+        if not address:
+            return None
+        return cls(address)
+
+    def submit(self, task: Dict):
+        """
+        Постановка файла в очередь
+
+        Args:
+            task: Словарь с ключами job_id, index, total, original, path,
+                sha256, model (имя модели или default) и cleanup (удалить
+                файл после обработки)
+        """
+        with self._lock:
+            self._manager.jobs().put(task)
+
+    def queue_depth(self) -> int:
+        """Количество файлов, ожидающих обработки"""
+        with self._lock:
+            return self._manager.jobs().qsize()
+
+    def active_jobs(self) -> int:
+        """Количество файлов, обрабатываемых прямо сейчас"""
+        with self._lock:
+            return len(self._manager.active())
+
+
+def serve(address: str, workers: int):
+    """Запуск очереди и супервизора процессов-обработчиков"""
+    jobs = queue.Queue()
+    active = {}
+
+    class QueueServer(WorkerQueueManager):
+        """Серверная сторона очереди (регистрация не затрагивает клиентов)"""
+
+    QueueServer.register("jobs", callable=lambda: jobs)
+    QueueServer.register("active", callable=lambda: active, proxytype=DictProxy)
+
+    parsed = parse_address(address)
+    authkey = load_authkey(create=True)
+    server = QueueServer(address=parsed, authkey=authkey).get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"🚀 Очередь транскрибации слушает {address}")
+
+    def start_worker():
+        process = Process(target=worker_main, args=(parsed, authkey), daemon=True)
+        process.start()
+        return process
+
+    processes = [start_worker() for _ in range(workers)]
+    store = ResultStore()
+
+    try:
+        while True:
+            time.sleep(1)
+            for i, process in enumerate(processes):
+                if process.is_alive():
+                    continue
+
+                # Обработчик упал (например, из-за нехватки памяти):
+                # его файлы помечаем ошибкой, процесс перезапускаем
+                for key in [key for key in active if key[0] == process.pid]:
+                    task = active.pop(key)
+                    store.add_result(
+                        task["job_id"],
+                        task["index"],
+                        task["original"],
+                        "",
+                        False,
+                        f"Процесс обработки завершился аварийно (код {process.exitcode})",
+                    )
+                    finish_job_if_done(store, task["job_id"], task["total"])
+                print(f"⚠️ Обработчик {process.pid} завершился, перезапуск...")
+                processes[i] = start_worker()
+    except KeyboardInterrupt:
+        # По одному сигналу остановки на каждый поток каждого обработчика
+        for _ in range(len(processes) * BATCH_SIZE):
+            jobs.put(None)
+        for process in processes:
+            process.join(timeout=5)
+
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Процессы транскрибации для PWA сервера")
+    parser.add_argument(
+        "--address",
+        default=os.environ.get("INFERENCE_WORKER_ADDRESS", DEFAULT_ADDRESS),
+        help="host:port или путь к Unix-сокету",
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Количество процессов с моделью")
+    args = parser.parse_args()
+    serve(args.address, max(1, args.workers))
+
+
+if __name__ == "__main__":
+    main()
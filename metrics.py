@@ -0,0 +1,302 @@
+"""
+Метрики сервера в текстовом формате Prometheus
+
+Счетчики, значения и гистограммы заполняются из TranscriptionProcessor
+(через сводки StageTimer), TranslationProcessor и хранилища результатов,
+а отдаются эндпоинтом /metrics. Внешние зависимости не нужны: формат
+экспозиции Prometheus простой, и модуль реализует его сам.
+"""
+
+import os
+import sys
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from stage_timer import register_timing_hook
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """Базовый класс метрики с метками"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise Exception(
+                f"Метрика {self.name} ожидает метки {self.labelnames}, получено {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def value(self, **labels) -> float:
+        """Текущее значение (для тестов и отладки)"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterable[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self.labelnames, key, value
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for name, labelnames, labelvalues, value in self.samples():
+            lines.append(f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise Exception("Счетчик не может уменьшаться")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """Значение, которое может как расти, так и уменьшаться"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Optional[Callable[[], float]]):
+        """Вычисление значения при каждом чтении метрик (только без меток)"""
+        self._function = function
+
+    def samples(self):
+        if self._function is None:
+            yield from super().samples()
+            return
+        try:
+            value = self._function()
+        except Exception:
+            return
+        if value is not None:
+            yield self.name, (), (), value
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def count(self, **labels) -> int:
+        """Количество наблюдений"""
+        with self._lock:
+            return sum(self._counts.get(self._key(labels), []))
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    self.labelnames + ("le",),
+                    key + (_format_value(bound),),
+                    cumulative,
+                )
+            yield f"{self.name}_sum", self.labelnames, key, total
+            yield f"{self.name}_count", self.labelnames, key, cumulative
+
+
+class MetricsRegistry:
+    """Набор метрик, отдаваемых одним эндпоинтом"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise Exception(f"Метрика {metric.name} уже зарегистрирована")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def process_rss_bytes() -> Optional[float]:
+    """Резидентная память текущего процесса"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    # Не Linux: доступен только пик использования памяти
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+REGISTRY = MetricsRegistry()
+
+queue_depth = REGISTRY.gauge(
+    "transcription_queue_depth", "Файлы, ожидающие транскрибации"
+)
+active_jobs = REGISTRY.gauge(
+    "transcription_active_jobs", "Файлы, транскрибируемые прямо сейчас"
+)
+transcribed_files = REGISTRY.counter(
+    "transcription_files_total", "Обработанные файлы по результату", ("status",)
+)
+audio_seconds = REGISTRY.counter(
+    "transcription_audio_seconds_total", "Длительность транскрибированного аудио, секунды"
+)
+processing_seconds = REGISTRY.counter(
+    "transcription_processing_seconds_total", "Время транскрибации по часам, секунды"
+)
+stage_seconds = REGISTRY.counter(
+    "transcription_stage_seconds_total", "Время этапов транскрибации, секунды", ("stage",)
+)
+real_time_factor = REGISTRY.histogram(
+    "transcription_real_time_factor",
+    "Время обработки файла, деленное на длительность аудио",
+    buckets=RTF_BUCKETS,
+)
+translation_latency = REGISTRY.histogram(
+    "translation_request_seconds", "Длительность запросов к API перевода", ("status",)
+)
+translation_retries = REGISTRY.counter(
+    "translation_retries_total", "Повторные запросы к API перевода по причине", ("status",)
+)
+cache_requests = REGISTRY.counter(
+    "cache_requests_total", "Обращения к кэшам по результату", ("cache", "result")
+)
+batch_size = REGISTRY.histogram(
+    "transcription_batch_size", "Чанки в одном вызове generate()", buckets=BATCH_BUCKETS
+)
+model_load_seconds = REGISTRY.gauge(
+    "model_load_seconds", "Время последней загрузки модели", ("model",)
+)
+model_memory = REGISTRY.gauge(
+    "transcription_model_memory_bytes", "Память загруженных моделей", ("model",)
+)
+model_evictions = REGISTRY.counter(
+    "transcription_model_evictions_total", "Выгрузки моделей из памяти", ("model",)
+)
+model_ready = REGISTRY.gauge(
+    "transcription_model_ready", "Модель транскрибации загружена и прогрета"
+)
+admission_rejections = REGISTRY.counter(
+    "transcription_admission_rejections_total", "Отклоненные задачи и загрузки по причине", ("reason",)
+)
+backlog_seconds = REGISTRY.gauge(
+    "transcription_backlog_seconds", "Оценка времени обработки принятых задач, секунды"
+)
+process_rss = REGISTRY.gauge(
+    "process_resident_memory_bytes", "Резидентная память процесса"
+)
+process_rss.set_function(process_rss_bytes)
+
+
+def observe_transcription(summary: Dict):
+    """Учет сводки StageTimer по транскрибированному файлу"""
+    audio = summary.get("audio_seconds") or 0
+    audio_seconds.inc(audio)
+    processing_seconds.inc(summary.get("wall_seconds") or 0)
+    for stage, entry in (summary.get("stages") or {}).items():
+        stage_seconds.inc(entry["wall"], stage=stage)
+    if summary.get("rtf") is not None:
+        real_time_factor.observe(summary["rtf"])
+
+
+register_timing_hook(observe_transcription)
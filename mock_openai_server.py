@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальный сервер, имитирующий OpenAI-совместимый API чата
+
+Нужен для нагрузочных замеров TranslationProcessor и /api/translate без
+расхода квоты настоящего API. Поддерживает POST /v1/chat/completions
+(в том числе потоковый ответ при "stream": true), GET /v1/models и
+GET /stats со счетчиками ответов.
+
+Задержка ответа выбирается из распределения (fixed, uniform, exponential,
+lognormal), а часть запросов можно превратить в сбои: 429 с заголовком
+Retry-After, 500, зависание дольше таймаута клиента и некорректный ответ.
+
+Запуск:
+    python mock_openai_server.py --port 8089 --latency 0.2 --distribution lognormal \\
+        --rate-limit 0.05 --retry-after 1 --timeout-rate 0.01 --malformed 0.01
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+def sample_latency(settings: Dict, rng: random.Random) -> float:
+    """
+    Задержка ответа по настройкам сервера
+
+    Args:
+        settings: latency (среднее/базовое значение, секунды), jitter
+            (разброс) и distribution
+        rng: Генератор случайных чисел
+
+    Returns:
+        float: Задержка в секундах
+    """
+    latency, jitter = settings["latency"], settings["jitter"]
+    distribution = settings["distribution"]
+    if distribution == "uniform":
+        value = rng.uniform(latency - jitter, latency + jitter)
+    elif distribution == "exponential":
+        value = rng.expovariate(1 / latency) if latency > 0 else 0.0
+    elif distribution == "lognormal":
+        # Параметры подобраны так, чтобы медиана равнялась latency,
+        # а jitter задавал ширину хвоста
+        sigma = jitter if jitter > 0 else 0.5
+        value = rng.lognormvariate(math.log(latency), sigma) if latency > 0 else 0.0
+    else:
+        value = latency + (rng.uniform(0, jitter) if jitter else 0.0)
+    return max(value, 0.0)
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов к имитации API"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Журнал каждого запроса мешает замерам
+        pass
+
+    def _send_json(self, status: int, payload: Dict, headers: Dict = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send_body(status, body, "application/json; charset=utf-8", headers)
+
+    def _send_body(self, status: int, body: bytes, content_type: str, headers: Dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        elif self.path.rstrip("/") == "/stats":
+            self._send_json(200, self.server.stats())
+        else:
+            self._send_json(404, {"error": f"Неизвестный путь: {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self.server.count("bad_request")
+            self._send_json(400, {"error": "Некорректный JSON"})
+            return
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": f"Неизвестный путь: {self.path}"})
+            return
+
+        settings = self.server.settings
+        outcome = self.server.choose_outcome()
+        self.server.count(outcome)
+
+        if outcome == "rate_limited":
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                {"Retry-After": f"{settings['retry_after']:g}"},
+            )
+            return
+        if outcome == "timeout":
+            # Ответ приходит позже, чем клиент готов ждать
+            time.sleep(settings["hang_seconds"])
+            self._send_json(504, {"error": "Превышено время ожидания"})
+            return
+
+        time.sleep(self.server.next_latency())
+
+        if outcome == "server_error":
+            self._send_json(500, {"error": {"message": "Internal error", "type": "server_error"}})
+            return
+        if outcome == "malformed":
+            self._send_malformed()
+            return
+
+        messages = request.get("messages") or []
+        text = messages[-1].get("content", "") if messages else ""
+        translation = f"[перевод] {text}"
+        if request.get("stream"):
+            self._send_stream(request, translation)
+        else:
+            self._send_json(200, self.server.completion(request, translation))
+
+    def _send_malformed(self):
+        """Ответ 200, который нельзя разобрать как ответ API"""
+        variant = self.server.rng_choice(("truncated", "no_choices", "html"))
+        if variant == "truncated":
+            self._send_body(200, b'{"choices": [{"message": {"content": "', "application/json")
+        elif variant == "no_choices":
+            self._send_json(200, {"id": "chatcmpl-mock", "object": "chat.completion"})
+        else:
+            self._send_body(200, b"<html>Bad Gateway</html>", "text/html")
+
+    def _send_stream(self, request: Dict, translation: str):
+        """Потоковый ответ в формате server-sent events"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        base = {
+            "id": f"chatcmpl-mock-{self.server.requests}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+        }
+        words = translation.split(" ")
+        pieces = [{"role": "assistant", "content": ""}] + [
+            {"content": word if i == 0 else " " + word} for i, word in enumerate(words)
+        ]
+        delay = self.server.settings["token_delay"]
+        for piece in pieces:
+            event = dict(base, choices=[{"index": 0, "delta": piece, "finish_reason": None}])
+            self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            if delay:
+                time.sleep(delay)
+        event = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """Имитация API в фоновом потоке"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 distribution: str = "fixed", rate_limit: float = 0.0,
+                 retry_after: float = 1.0, server_errors: float = 0.0,
+                 timeouts: float = 0.0, hang_seconds: float = 65.0,
+                 malformed: float = 0.0, token_delay: float = 0.0,
+                 seed: int = None):
+        """
+        Args:
+            latency: Базовая (для lognormal - медианная) задержка, секунды
+            jitter: Разброс задержки
+            distribution: Распределение задержки (DISTRIBUTIONS)
+            rate_limit: Доля ответов 429
+            retry_after: Значение заголовка Retry-After, секунды
+            server_errors: Доля ответов 500
+            timeouts: Доля запросов, зависающих на hang_seconds
+            hang_seconds: Длительность зависания
+            malformed: Доля некорректных ответов 200
+            token_delay: Пауза между частями потокового ответа
+            seed: Зерно генератора для воспроизводимых прогонов
+        """
+        if distribution not in DISTRIBUTIONS:
+            raise Exception(f"Неизвестное распределение задержки: {distribution}")
+        super().__init__((host, port), MockOpenAIHandler)
+        self.settings = {
+            "latency": latency,
+            "jitter": jitter,
+            "distribution": distribution,
+            "rate_limit": rate_limit,
+            "retry_after": retry_after,
+            "server_errors": server_errors,
+            "timeouts": timeouts,
+            "hang_seconds": hang_seconds,
+            "malformed": malformed,
+            "token_delay": token_delay,
+        }
+        self.requests = 0
+        self._outcomes = Counter()
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Адрес эндпоинта для TranslationProcessor"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def handle_error(self, request, client_address):
+        # Клиент не дождался ответа (имитация таймаута) - это ожидаемо
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    def count(self, outcome: str):
+        with self._lock:
+            self.requests += 1
+            self._outcomes[outcome] += 1
+
+    def stats(self) -> Dict:
+        """Количество запросов по исходам"""
+        with self._lock:
+            return {"requests": self.requests, "outcomes": dict(self._outcomes)}
+
+    def choose_outcome(self) -> str:
+        """Исход запроса с учетом долей сбоев"""
+        with self._lock:
+            roll = self._rng.random()
+        for outcome, key in (
+            ("rate_limited", "rate_limit"),
+            ("server_error", "server_errors"),
+            ("timeout", "timeouts"),
+            ("malformed", "malformed"),
+        ):
+            share = self.settings[key]
+            if roll < share:
+                return outcome
+            roll -= share
+        return "ok"
+
+    def next_latency(self) -> float:
+        with self._lock:
+            return sample_latency(self.settings, self._rng)
+
+    def rng_choice(self, options):
+        with self._lock:
+            return self._rng.choice(options)
+
+    def completion(self, request: Dict, translation: str) -> Dict:
+        """Обычный (не потоковый) ответ chat.completion"""
+        prompt = sum(len(m.get("content", "")) for m in request.get("messages") or []) // 3
+        return {
+            "id": f"chatcmpl-mock-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": translation},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt,
+                "completion_tokens": len(translation) // 3,
+                "total_tokens": prompt + len(translation) // 3,
+            },
+        }
+
+    def start(self) -> "MockOpenAIServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """Параметры имитации (общие для сервера и нагрузочного теста)"""
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа, секунды")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Разброс задержки")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="fixed",
+                        help="Распределение задержки")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--retry-after", type=float, default=1.0,
+                        help="Заголовок Retry-After для 429, секунды")
+    parser.add_argument("--server-errors", type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0,
+                        help="Доля запросов, зависающих дольше таймаута клиента")
+    parser.add_argument("--hang-seconds", type=float, default=65.0,
+                        help="Длительность зависания")
+    parser.add_argument("--malformed", type=float, default=0.0,
+                        help="Доля некорректных ответов")
+    parser.add_argument("--token-delay", type=float, default=0.0,
+                        help="Пауза между частями потокового ответа")
+    parser.add_argument("--seed", type=int, default=None, help="Зерно генератора")
+
+
+def server_from_args(args, host: str = "127.0.0.1", port: int = 0) -> MockOpenAIServer:
+    """Создание сервера по разобранным параметрам"""
+    return MockOpenAIServer(
+        host,
+        port,
+        latency=args.latency,
+        jitter=args.jitter,
+        distribution=args.distribution,
+        rate_limit=args.rate_limit,
+        retry_after=args.retry_after,
+        server_errors=args.server_errors,
+        timeouts=args.timeout_rate,
+        hang_seconds=args.hang_seconds,
+        malformed=args.malformed,
+        token_delay=args.token_delay,
+        seed=args.seed,
+    )
+
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Имитация OpenAI-совместимого API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, args.host, args.port)
+    print(f"🚀 Имитация API: {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Загруженные модели транскрибации с бюджетом памяти
+
+Полная large-v3 в float32 занимает около 6 ГБ, и каждая дополнительная
+модель (запасная, маленькая для быстрых задач) держит в памяти столько
+же, сколько весит. ModelManager хранит загруженные модели в порядке
+последнего использования (LRU) и следит, чтобы их сумма не превышала
+TRANSCRIPTION_MODEL_MEMORY_GB:
+- перед загрузкой память модели оценивается по заголовкам safetensors
+  локального снимка (или по прошлой загрузке), и давно не нужные модели
+  выгружаются, пока новая не поместится;
+- модели, которыми пользуются задачи, не выгружаются: задача ждет их
+  освобождения до TRANSCRIPTION_MODEL_WAIT_SECONDS;
+- модель больше всего бюджета не загружается вовсе.
+После загрузки записывается фактический размер параметров и буферов
+модели (метрика transcription_model_memory_bytes).
+"""
+
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+import metrics
+from model_manifest import MODEL_CANDIDATES, MODELS_DIR, estimate_model_bytes, find_local_model
+
+# Бюджет памяти моделей в ГБ (0 - без ограничения)
+MEMORY_BUDGET = int(float(os.environ.get("TRANSCRIPTION_MODEL_MEMORY_GB", 0)) * 1024 ** 3)
+# Сколько задача ждет памяти под модель, секунды
+MODEL_WAIT_SECONDS = float(os.environ.get("TRANSCRIPTION_MODEL_WAIT_SECONDS", 600))
+# Модели, доступные задачам (через запятую); первая - модель по умолчанию
+AVAILABLE_MODELS = [
+    name.strip()
+    for name in os.environ.get("TRANSCRIPTION_MODELS", ",".join(MODEL_CANDIDATES)).split(",")
+    if name.strip()
+]
+# Модель по умолчанию: русская large-v3 с запасной базовой
+DEFAULT_MODEL = "default"
+
+
+def model_bytes(model) -> int:
+    """Память параметров и буферов модели PyTorch (общие тензоры - один раз)"""
+    seen = set()
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        if tensor.data_ptr() in seen:
+            continue
+        seen.add(tensor.data_ptr())
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def processor_bytes(processor) -> int:
+    """Память модели процессора: по движку вывода (ONNX), иначе по весам PyTorch"""
+    memory_bytes = getattr(getattr(processor, "backend", None), "memory_bytes", None)
+    if memory_bytes is not None:
+        return memory_bytes()
+    return model_bytes(processor.model)
+
+
+def estimate_bytes(name: str) -> Optional[int]:
+    """Оценка памяти модели по локальному снимку (None - снимка нет)"""
+    if name == DEFAULT_MODEL:
+        local = find_local_model(MODELS_DIR)
+        if local is None:
+            return None
+        name = local[0]
+    return estimate_model_bytes(name, MODELS_DIR)
+
+
+class ModelManager:
+    """LRU загруженных моделей с бюджетом памяти"""
+
+    def __init__(self, factory: Callable[[str], object], budget: int = MEMORY_BUDGET,
+                 wait_seconds: float = MODEL_WAIT_SECONDS,
+                 estimate: Callable[[str], Optional[int]] = estimate_bytes):
+        """
+        Args:
+            factory: Функция, создающая TranscriptionProcessor по имени модели
+                (DEFAULT_MODEL - модель по умолчанию)
+            budget: Бюджет памяти в байтах (0 - без ограничения)
+            wait_seconds: Сколько ждать памяти под модель
+            estimate: Оценка памяти модели до загрузки (None - неизвестна)
+        """
+        self.factory = factory
+        self.budget = budget
+        self.wait_seconds = wait_seconds
+        self.estimate = estimate
+        # Имя -> processor, bytes, in_use, last_used; None в processor - модель загружается
+        self._models: "OrderedDict[str, Dict]" = OrderedDict()
+        # Фактические размеры уже загружавшихся моделей
+        self._sizes: Dict[str, int] = {}
+        self._condition = threading.Condition()
+
+    def _expected_bytes(self, name: str) -> int:
+        if name in self._sizes:
+            return self._sizes[name]
+        return self.estimate(name) or 0
+
+    def _used_bytes(self) -> int:
+        return sum(entry["bytes"] for entry in self._models.values())
+
+    def can_fit(self, name: str) -> bool:
+        """Поместится ли модель в бюджет, если выгрузить все остальные"""
+        return not self.budget or self._expected_bytes(name) <= self.budget
+
+    def acquire(self, name: str = DEFAULT_MODEL):
+        """
+        Модель для задачи; до release() она не выгружается
+
+        Args:
+            name: Имя модели на хабе или DEFAULT_MODEL
+
+        Returns:
+            TranscriptionProcessor
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        with self._condition:
+            while True:
+                entry = self._models.get(name)
+                if entry is not None:
+                    if entry["processor"] is not None:
+                        entry["in_use"] += 1
+                        entry["last_used"] = time.time()
+                        self._models.move_to_end(name)
+                        return entry["processor"]
+                    # Модель уже загружает другая задача
+                    self._condition.wait()
+                    continue
+
+                needed = self._expected_bytes(name)
+                if self.budget and needed > self.budget:
+                    raise Exception(
+                        f"Модель {name} требует {needed / 1024 ** 3:.1f} ГБ, "
+                        f"бюджет памяти моделей {self.budget / 1024 ** 3:.1f} ГБ"
+                    )
+                self._evict_for(needed)
+                if not self.budget or self._used_bytes() + needed <= self.budget:
+                    break
+                # Память заняли модели, которыми пользуются другие задачи
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Exception(f"Нет памяти для модели {name}: все загруженные модели заняты, попробуйте позже")
+                self._condition.wait(remaining)
+
+            self._models[name] = {"processor": None, "bytes": needed, "in_use": 1, "last_used": time.time()}
+
+        try:
+            started = time.perf_counter()
+            processor = self.factory(name)
+        except Exception:
+            with self._condition:
+                del self._models[name]
+                self._condition.notify_all()
+            raise
+
+        size = processor_bytes(processor)
+        with self._condition:
+            self._sizes[name] = size
+            entry = self._models[name]
+            entry.update(processor=processor, bytes=size)
+            # Оценка могла оказаться меньше фактического размера
+            self._evict_for(0)
+            self._condition.notify_all()
+        metrics.model_memory.set(size, model=name)
+        print(f"✅ Модель {name}: {size / 1024 ** 3:.2f} ГБ, загрузка {time.perf_counter() - started:.1f} с")
+        return processor
+
+    def release(self, name: str = DEFAULT_MODEL):
+        """Модель больше не нужна задаче"""
+        with self._condition:
+            entry = self._models.get(name)
+            if entry is not None and entry["in_use"] > 0:
+                entry["in_use"] -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def use(self, name: str = DEFAULT_MODEL) -> Iterator:
+        """Модель на время блока with"""
+        processor = self.acquire(name)
+        try:
+            yield processor
+        finally:
+            self.release(name)
+
+    @contextmanager
+    def lazy(self, name: str = DEFAULT_MODEL) -> Iterator[Callable]:
+        """
+        Функция, возвращающая модель, на время блока with
+
+        Модель загружается при первом вызове функции (например, только
+        если результата нет в кэше) и освобождается в конце блока.
+        """
+        acquired = []
+
+        def get_processor():
+            if not acquired:
+                acquired.append(self.acquire(name))
+            return acquired[0]
+
+        try:
+            yield get_processor
+        finally:
+            if acquired:
+                self.release(name)
+
+    def _evict_for(self, needed: int):
+        """Выгрузка давно не нужных моделей, пока needed байт не поместится"""
+        if not self.budget:
+            return
+        for name in list(self._models):
+            if self._used_bytes() + needed <= self.budget:
+                return
+            entry = self._models[name]
+            if entry["in_use"] or entry["processor"] is None:
+                continue
+            self._unload(name)
+
+    def _unload(self, name: str):
+        entry = self._models.pop(name)
+        processor = entry["processor"]
+        # Поток планировщика батчей держит ссылку на модель
+        close = getattr(processor, "close", None)
+        if close is not None:
+            close()
+        del processor, entry
+        gc.collect()
+        try:
+            import torch
+
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+        metrics.model_memory.set(0, model=name)
+        metrics.model_evictions.inc(model=name)
+        print(f"♻️ Модель {name} выгружена из памяти")
+
+    def evict(self, name: str) -> bool:
+        """Выгрузка модели, если она не занята задачами"""
+        with self._condition:
+            entry = self._models.get(name)
+            if entry is None or entry["in_use"] or entry["processor"] is None:
+                return False
+            self._unload(name)
+            self._condition.notify_all()
+            return True
+
+    def status(self) -> Dict:
+        """Загруженные модели (от давно не нужной к последней) и память"""
+        with self._condition:
+            models = [
+                {
+                    "name": name,
+                    "model": getattr(getattr(entry["processor"], "model", None), "name_or_path", None),
+                    "state": "loading" if entry["processor"] is None else "loaded",
+                    "memory_bytes": entry["bytes"],
+                    "in_use": entry["in_use"],
+                    "last_used": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(entry["last_used"])),
+                }
+                for name, entry in self._models.items()
+            ]
+            used = self._used_bytes()
+        return {
+            "budget_bytes": self.budget or None,
+            "used_bytes": used,
+            "process_rss_bytes": metrics.process_rss_bytes(),
+            "models": models,
+        }
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Манифест локальных моделей Whisper
+
+`python model_manifest.py prefetch` один раз скачивает снимки моделей в
+models/ и записывает в models/manifest.json путь к снимку, ревизию и
+размер и SHA-256 каждого файла. Обработчики транскрибации загружают
+модель прямо из записанного снимка (local_files_only, веса safetensors
+отображаются в память), не обращаясь к хабу и не дожидаясь отказа
+первой модели перед загрузкой запасной.
+
+Запуск:
+    python model_manifest.py prefetch
+    python model_manifest.py verify
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from result_store import file_sha256
+
+MODELS_DIR = Path("models")
+MANIFEST_NAME = "manifest.json"
+
+# Модели в порядке предпочтения: русская и запасная базовая
+MODEL_CANDIDATES = ["antony66/whisper-large-v3-russian", "openai/whisper-large-v3"]
+
+# Файлы, нужные для загрузки: конфигурации, токенизатор и веса safetensors
+# (веса PyTorch, Flax и TF из репозиториев не скачиваются)
+ALLOW_PATTERNS = ["*.json", "*.txt", "*.safetensors"]
+
+
+def load_manifest(models_dir: Path = MODELS_DIR) -> Dict:
+    """
+    Чтение манифеста
+
+    Args:
+        models_dir: Папка моделей
+
+    Returns:
+        Dict: Манифест ({"models": {}} если его нет или он поврежден)
+    """
+    try:
+        with open(Path(models_dir) / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"models": {}}
+    manifest.setdefault("models", {})
+    return manifest
+
+
+def save_manifest(manifest: Dict, models_dir: Path = MODELS_DIR) -> None:
+    """Атомарная запись манифеста"""
+    path = Path(models_dir) / MANIFEST_NAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def record_snapshot(repo_id: str, snapshot_path: Path, models_dir: Path = MODELS_DIR) -> Dict:
+    """
+    Запись снимка модели в манифест
+
+    Args:
+        repo_id: Имя модели на хабе
+        snapshot_path: Папка снимка с файлами модели
+        models_dir: Папка моделей
+
+    Returns:
+        Dict: Запись манифеста
+    """
+    models_dir = Path(models_dir)
+    snapshot_path = Path(snapshot_path)
+    files = {}
+    for path in sorted(snapshot_path.rglob("*")):
+        if path.is_file():
+            files[path.relative_to(snapshot_path).as_posix()] = {
+                "size": path.stat().st_size,
+                "sha256": file_sha256(path),
+            }
+    if not any(name.endswith(".safetensors") for name in files):
+        raise Exception(f"В снимке {snapshot_path} нет весов safetensors")
+
+    try:
+        stored_path = snapshot_path.resolve().relative_to(models_dir.resolve()).as_posix()
+    except ValueError:
+        stored_path = str(snapshot_path.resolve())
+    entry = {
+        "revision": snapshot_path.name,
+        "path": stored_path,
+        "files": files,
+        "prefetched_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    manifest = load_manifest(models_dir)
+    manifest["models"][repo_id] = entry
+    save_manifest(manifest, models_dir)
+    return entry
+
+
+def prefetch_model(repo_id: str, models_dir: Path = MODELS_DIR, revision: Optional[str] = None) -> Dict:
+    """
+    Скачивание снимка модели и запись в манифест
+
+    Args:
+        repo_id: Имя модели на хабе
+        models_dir: Папка моделей (кэш хаба)
+        revision: Ветка, тег или коммит (по умолчанию main)
+
+    Returns:
+        Dict: Запись манифеста
+    """
+    from huggingface_hub import snapshot_download
+
+    snapshot_path = snapshot_download(
+        repo_id,
+        revision=revision,
+        cache_dir=models_dir,
+        allow_patterns=ALLOW_PATTERNS,
+    )
+    return record_snapshot(repo_id, Path(snapshot_path), models_dir)
+
+
+def check_entry(entry: Dict, models_dir: Path = MODELS_DIR, full: bool = False) -> List[str]:
+    """
+    Проверка файлов снимка по манифесту
+
+    Args:
+        entry: Запись манифеста
+        models_dir: Папка моделей
+        full: Сверять SHA-256 (читает все веса), иначе только размеры
+
+    Returns:
+        List[str]: Описания расхождений (пустой список - снимок цел)
+    """
+    snapshot_path = Path(models_dir) / entry["path"]
+    problems = []
+    for name, expected in entry.get("files", {}).items():
+        path = snapshot_path / name
+        try:
+            size = path.stat().st_size
+        except OSError:
+            problems.append(f"{name}: файл отсутствует")
+            continue
+        if size != expected["size"]:
+            problems.append(f"{name}: размер {size}, ожидался {expected['size']}")
+        elif full and file_sha256(path) != expected["sha256"]:
+            problems.append(f"{name}: не совпадает SHA-256")
+    return problems
+
+
+def find_local_model(
+    models_dir: Path = MODELS_DIR, candidates: Iterable[str] = MODEL_CANDIDATES
+) -> Optional[Tuple[str, Path]]:
+    """
+    Первая модель из списка с целым локальным снимком
+
+    Args:
+        models_dir: Папка моделей
+        candidates: Модели в порядке предпочтения
+
+    Returns:
+        Optional[Tuple[str, Path]]: Имя модели и папка снимка или None,
+        если манифеста нет (тогда модель загружается через хаб)
+    """
+    models = load_manifest(models_dir)["models"]
+    for repo_id in candidates:
+        entry = models.get(repo_id)
+        if entry is None:
+            continue
+        problems = check_entry(entry, models_dir)
+        if problems:
+            print(f"⚠️ Снимок {repo_id} поврежден: {problems[0]}")
+            continue
+        return repo_id, Path(models_dir) / entry["path"]
+    return None
+
+
+def estimate_model_bytes(repo_id: str, models_dir: Path = MODELS_DIR, element_size: int = 4) -> Optional[int]:
+    """
+    Память весов модели из локального снимка без загрузки
+
+    Размеры тензоров читаются из заголовков safetensors; на диске веса
+    обычно в float16, а на CPU модель загружается в float32.
+
+    Args:
+        repo_id: Имя модели на хабе
+        models_dir: Папка моделей
+        element_size: Байт на элемент после загрузки (4 - float32)
+
+    Returns:
+        Optional[int]: Байты или None, если снимка нет в манифесте
+    """
+    entry = load_manifest(models_dir)["models"].get(repo_id)
+    if entry is None:
+        return None
+    snapshot_path = Path(models_dir) / entry["path"]
+    total = 0
+    for name in entry.get("files", {}):
+        if not name.endswith(".safetensors"):
+            continue
+        with open(snapshot_path / name, "rb") as f:
+            header_size = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(header_size))
+        for key, tensor in header.items():
+            if key != "__metadata__":
+                total += math.prod(tensor["shape"]) * element_size
+    return total
+
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Локальные снимки моделей Whisper")
+    parser.add_argument("--models-dir", type=Path, default=MODELS_DIR, help="Папка моделей")
+    commands = parser.add_subparsers(dest="command", required=True)
+    prefetch = commands.add_parser("prefetch", help="Скачать модели и записать манифест")
+    prefetch.add_argument("models", nargs="*", default=MODEL_CANDIDATES, help="Имена моделей на хабе")
+    prefetch.add_argument("--revision", help="Ветка, тег или коммит")
+    verify = commands.add_parser("verify", help="Проверить снимки по SHA-256")
+    verify.add_argument("--quick", action="store_true", help="Проверять только размеры файлов")
+    args = parser.parse_args()
+
+    if args.command == "prefetch":
+        for repo_id in args.models:
+            print(f"🔄 Загрузка {repo_id}...")
+            try:
+                entry = prefetch_model(repo_id, args.models_dir, args.revision)
+            except Exception as e:
+                print(f"❌ {repo_id}: {e}")
+                sys.exit(1)
+            size = sum(f["size"] for f in entry["files"].values()) / 1024 ** 3
+            print(f"✅ {repo_id}@{entry['revision'][:12]}: {len(entry['files'])} файлов, {size:.2f} ГБ")
+        return
+
+    models = load_manifest(args.models_dir)["models"]
+    if not models:
+        print("❌ Манифест пуст: запустите python model_manifest.py prefetch")
+        sys.exit(1)
+    failed = False
+    for repo_id, entry in models.items():
+        problems = check_entry(entry, args.models_dir, full=not args.quick)
+        if problems:
+            failed = True
+            print(f"❌ {repo_id}: " + "; ".join(problems))
+        else:
+            print(f"✅ {repo_id}@{entry['revision'][:12]}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
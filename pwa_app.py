@@ -4,7 +4,8 @@
 Progressive Web App версия приложения для транскрибации и перевода
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory
+import importlib.util
 import os
 import json
 from pathlib import Path
@@ -12,7 +13,7 @@ import threading
 import time
 
 # Импорт наших модулей
-from transcription import TranscriptionProcessor, TRANSFORMERS_AVAILABLE
+import metrics
 from translation import TranslationProcessor
 from text_processor import TextProcessor
 from utils import (
@@ -20,6 +21,13 @@ from utils import (
     load_settings,
     save_settings as save_settings_to_file,
 )
+from warmup import WARMUP_ON_START, ModelWarmup
+
+# PyTorch и transformers импортируются в фоне вместе с моделью,
+# здесь только проверяется, что они установлены
+TRANSFORMERS_AVAILABLE = all(
+    importlib.util.find_spec(module) is not None for module in ("torch", "transformers")
+)
 
 app = Flask(__name__)
 app.config["MAX_CONTENT_LENGTH"] = 500 * 1024 * 1024  # 500MB максимум
@@ -29,6 +37,20 @@ transcription_status = {"progress": 0, "status": "idle", "results": []}
 translation_status = {"progress": 0, "status": "idle", "chunks": [], "translations": {}}
 
 
+def create_transcription_processor():
+    """Создание модели транскрибации (PyTorch импортируется только здесь)"""
+    from transcription import TranscriptionProcessor
+
+    return TranscriptionProcessor()
+
+
+# transcription.TranscriptionProcessor принимает только файлы, поэтому
+# в фоне выполняется загрузка без прогона тишины
+model_warmup = ModelWarmup(create_transcription_processor, warm=False)
+if WARMUP_ON_START and TRANSFORMERS_AVAILABLE:
+    model_warmup.start()
+
+
 @app.route("/")
 def index():
     """Главная страница"""
@@ -80,7 +102,7 @@ def api_transcribe():
         global transcription_status
 
         try:
-            processor = TranscriptionProcessor()
+            processor = model_warmup.get()
             transcription_status = {
                 "progress": 0,
                 "status": "processing",
@@ -101,6 +123,7 @@ def api_transcribe():
                             "filename": file.filename,
                             "text": result["text"],
                             "success": True,
+                            "timings": result.get("timings"),
                         }
                     )
                 except Exception as e:
@@ -305,6 +328,19 @@ def api_export_translation():
     )
 
 
+@app.route("/metrics")
+def metrics_endpoint():
+    """Метрики в текстовом формате Prometheus"""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/api/ready")
+def api_ready():
+    """Готовность модели транскрибации (503, пока идет загрузка и прогрев)"""
+    status = model_warmup.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
 @app.route("/api/system-info")
 def api_system_info():
     """Информация о системе"""
@@ -5,14 +5,27 @@
 """
 
 import os
+import gzip
 import json
 from pathlib import Path
 import time
 import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 # Минимальные зависимости
 try:
-    from flask import Flask, render_template, request, jsonify, send_from_directory
+    from flask import (
+        Flask,
+        Response,
+        jsonify,
+        render_template,
+        request,
+        send_file,
+        send_from_directory,
+        stream_with_context,
+    )
 
     FLASK_AVAILABLE = True
 except ImportError:
@@ -23,8 +36,18 @@ if not FLASK_AVAILABLE:
     exit(1)
 
 # Импорт только доступных модулей
+import metrics
+from admission import RTF_HISTORY, AdmissionController, estimate_duration, historical_rtf
+from audio_pipeline import Prefetcher
+from batch_scheduler import BATCH_SIZE
 from translation import TranslationProcessor
+from inference_worker import WorkerClient, finish_job_if_done, transcribe_to_store, transcription_settings
+from result_store import ResultStore, file_sha256
+from status_tracker import StatusTracker
 from text_processor import TextProcessor
+from uploads import ChunkedUploadManager, UploadError
+from model_manager import AVAILABLE_MODELS, DEFAULT_MODEL, ModelManager
+from warmup import WARMUP_ON_START, ModelWarmup
 from utils import (
     get_supported_audio_formats,
     load_settings,
@@ -34,14 +57,280 @@ from utils import (
 app = Flask(__name__)
 app.config["MAX_CONTENT_LENGTH"] = 500 * 1024 * 1024  # 500MB
 
-# Глобальные переменные для состояния
-transcription_status = {
-    "progress": 0,
-    "status": "disabled",
-    "results": [],
-    "error": "PyTorch не установлен",
-}
-translation_status = {"progress": 0, "status": "idle", "chunks": [], "translations": {}}
+# Размер части при загрузке файлов через /api/uploads
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# В режиме отдельного обработчика аудио декодирует он сам
+upload_manager = ChunkedUploadManager(
+    decode_early=not os.environ.get("INFERENCE_WORKER_ADDRESS")
+)
+
+# Ответы статуса больше этого размера сжимаются gzip
+GZIP_MIN_SIZE = 1024
+
+# Глобальные переменные для состояния. Каждое изменение получает версию,
+# чтобы клиенты могли запрашивать только изменения (?since=<version>)
+idle_transcription_status = StatusTracker(
+    progress=0,
+    status="disabled",
+    results=[],
+    error="PyTorch не установлен",
+)
+# Статусы задач транскрибации по job_id: несколько задач выполняются и
+# ждут в очереди одновременно, и у каждой свое состояние
+transcription_jobs: "OrderedDict[str, StatusTracker]" = OrderedDict()
+transcription_jobs_lock = threading.Lock()
+# Сколько статусов завершенных задач держать в памяти (остальные
+# читаются из хранилища)
+TRANSCRIPTION_JOBS_KEPT = 20
+translation_status = StatusTracker(progress=0, status="idle", chunks=[], translations={})
+
+# Тексты транскрипций и переводов хранятся на диске и читаются по требованию
+result_store = ResultStore()
+
+# Очередь отдельного процесса транскрибации (INFERENCE_WORKER_ADDRESS);
+# без нее модель загружается в потоке веб-сервера
+worker_client = WorkerClient.from_env()
+if worker_client is not None:
+    metrics.queue_depth.set_function(worker_client.queue_depth)
+    metrics.active_jobs.set_function(worker_client.active_jobs)
+
+
+def create_transcription_processor(model_name=DEFAULT_MODEL):
+    """Создание модели транскрибации (PyTorch импортируется только здесь)"""
+    from transcription_simple import TranscriptionProcessor
+
+    return TranscriptionProcessor(model_name=None if model_name == DEFAULT_MODEL else model_name)
+
+
+# Модели процесса с бюджетом памяти (TRANSCRIPTION_MODEL_MEMORY_GB)
+model_manager = ModelManager(create_transcription_processor)
+
+# Модель по умолчанию загружается в фоне при запуске (TRANSCRIPTION_WARMUP=1)
+# или с первой задачей транскрибации; после прогрева она возвращается
+# менеджеру и выгружается по бюджету памяти, как остальные модели
+model_warmup = ModelWarmup(
+    lambda: model_manager.acquire(DEFAULT_MODEL),
+    release=lambda processor: model_manager.release(DEFAULT_MODEL),
+)
+if WARMUP_ON_START and worker_client is None:
+    model_warmup.start()
+
+
+def transcription_job_progress(job_id):
+    """Готовые файлы задачи или None, если задача завершена"""
+    job = result_store.get_job(job_id)
+    if job is None:
+        # Задача принята, но еще не записана в хранилище
+        return set()
+    if job["status"] in ("completed", "error"):
+        return None
+    return {entry["index"] for entry in result_store.list_results(job_id)}
+
+
+# Прием задач по длительности аудио, памяти и месту на диске
+admission = AdmissionController(
+    rtf=lambda: historical_rtf(result_store.recent_rtf(RTF_HISTORY)),
+    job_progress=transcription_job_progress,
+    disk_path=upload_manager.uploads_dir,
+    files_in_memory=BATCH_SIZE + 1,
+)
+metrics.backlog_seconds.set_function(admission.backlog_seconds)
+
+
+def rejection_response(decision):
+    """Ответ на отклоненную задачу или загрузку (503 - с Retry-After)"""
+    body = {"success": False, "error": decision["error"], "reason": decision["reason"]}
+    if "retry_after" in decision:
+        body["retry_after"] = decision["retry_after"]
+    response = jsonify(body)
+    response.status_code = decision["status"]
+    if "retry_after" in decision:
+        response.headers["Retry-After"] = str(decision["retry_after"])
+    return response
+
+
+def register_transcription_job(job_id, **fields):
+    """
+    Статус новой задачи транскрибации
+
+    Returns:
+        StatusTracker: Статус задачи, доступный по job_id
+    """
+    status = StatusTracker(job_id=job_id, **fields)
+    with transcription_jobs_lock:
+        transcription_jobs[job_id] = status
+        transcription_jobs.move_to_end(job_id)
+        # Вытесняются только завершенные задачи: статус выполняющейся
+        # задачи, прочитанный из хранилища, был бы неполным
+        finished = [
+            key for key, tracker in transcription_jobs.items()
+            if tracker.get("status") in ("completed", "error")
+        ]
+        for key in finished[:max(0, len(transcription_jobs) - TRANSCRIPTION_JOBS_KEPT)]:
+            del transcription_jobs[key]
+    return status
+
+
+def load_transcription_job(job):
+    """Загрузка задачи транскрибации из хранилища в статус"""
+    status = job["status"]
+    error = job["error"]
+    if status in ("processing", "queued") and worker_client is None:
+        status, error = "error", "Задача прервана перезапуском сервера"
+    results = result_store.list_results(job["id"])
+    for entry in results:
+        entry["text_file"] = f"{os.path.splitext(entry['filename'])[0]}_transcript.txt"
+    return register_transcription_job(
+        job["id"],
+        progress=job["progress"],
+        status=status,
+        results=results,
+        error=error,
+    )
+
+
+def transcription_job_status(job_id=None):
+    """
+    Статус задачи транскрибации
+
+    Args:
+        job_id: Идентификатор задачи (None - последняя созданная задача)
+
+    Returns:
+        Optional[StatusTracker]: Статус или None, если задачи нет
+    """
+    if job_id is None:
+        job = result_store.latest_job("transcription")
+        if job is None:
+            return None
+        job_id = job["id"]
+    with transcription_jobs_lock:
+        status = transcription_jobs.get(job_id)
+    if status is not None:
+        return status
+    job = result_store.get_job(job_id)
+    if job is None or job["kind"] != "transcription":
+        return None
+    return load_transcription_job(job)
+
+
+def sync_transcription_from_store(status):
+    """
+    Обновление статуса задачи из общего хранилища
+
+    В режиме отдельного обработчика результаты пишет другой процесс, а
+    веб-сервер может быть запущен в нескольких процессах WSGI, поэтому
+    источником истины служит хранилище.
+    """
+    job = result_store.get_job(status.get("job_id"))
+    if job is None:
+        return
+
+    known = {entry["index"] for entry in status.get("results", [])}
+    for entry in result_store.list_results(job["id"]):
+        if entry["index"] not in known:
+            entry["text_file"] = f"{os.path.splitext(entry['filename'])[0]}_transcript.txt"
+            status.set_item("results", entry["index"], entry)
+    status["progress"] = job["progress"]
+    status["error"] = job["error"]
+    status["status"] = job["status"]
+
+
+def observe_worker_result(entry):
+    """Метрики одного результата, записанного обработчиком"""
+    if entry["cached"]:
+        status = "cached"
+    else:
+        status = "success" if entry["success"] else "error"
+    metrics.transcribed_files.inc(status=status)
+    if entry.get("source_sha256"):
+        metrics.cache_requests.inc(cache="transcription", result="hit" if entry["cached"] else "miss")
+    if entry.get("timings"):
+        metrics.observe_transcription(entry["timings"])
+
+
+def follow_worker_results(interval: float = 2.0):
+    """
+    Метрики транскрибаций отдельного обработчика
+
+    Замеры делает процесс обработчика и сохраняет сводку вместе с
+    результатом, а счетчики файлов и обращений к кэшу восстанавливаются по
+    самой записи. Сервер учитывает каждый новый результат один раз, в
+    порядке записи, независимо от того, опрашивает ли кто-нибудь статус
+    задачи.
+    """
+    last_rowid = result_store.last_result_rowid()
+    while True:
+        time.sleep(interval)
+        try:
+            for rowid, entry in result_store.results_after(last_rowid):
+                last_rowid = rowid
+                observe_worker_result(entry)
+        except Exception as e:
+            print(f"⚠️ Ошибка чтения результатов обработчика: {e}")
+
+
+if worker_client is not None:
+    threading.Thread(target=follow_worker_results, name="worker-metrics", daemon=True).start()
+
+
+def restore_state():
+    """Восстановление последней задачи перевода из хранилища после перезапуска"""
+    job = result_store.latest_job("translation")
+    if job:
+        translation_status.reset(
+            progress=job["progress"],
+            status="ready" if job["status"] == "processing" else job["status"],
+            chunks=result_store.load_chunks(job["id"]),
+            translations={
+                str(index): None for index in result_store.translated_indices(job["id"])
+            },
+            current_chunk=0,
+            job_id=job["id"],
+        )
+
+
+def with_texts(data, transcription_job=None):
+    """Подстановка текстов из хранилища в ответ статуса"""
+    translation_job = translation_status.get("job_id")
+
+    def hydrate(entry):
+        entry = dict(entry)
+        entry["text"] = (
+            result_store.read_text(transcription_job, entry["index"])
+            if entry.get("success") else ""
+        )
+        return entry
+
+    changes = data.get("changes", {})
+    if "results" in data:
+        data["results"] = [hydrate(entry) for entry in data["results"]]
+    if "results" in changes:
+        changes["results"] = {
+            key: hydrate(entry) for key, entry in changes["results"].items()
+        }
+
+    for translations in (data.get("translations"), changes.get("translations")):
+        for key in translations or {}:
+            translations[key] = result_store.read_translation(translation_job, int(key))
+    return data
+
+
+restore_state()
+
+
+def json_response(payload, status_code=200):
+    """JSON-ответ со сжатием gzip для больших тел, если клиент его принимает"""
+    response = jsonify(payload)
+    response.status_code = status_code
+    accepts_gzip = "gzip" in request.headers.get("Accept-Encoding", "").lower()
+    if accepts_gzip and response.content_length and response.content_length >= GZIP_MIN_SIZE:
+        response.set_data(gzip.compress(response.get_data(), compresslevel=5))
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "no-store"
+    return response
 
 
 @app.route("/")
@@ -60,11 +349,16 @@ def static_files(filename):
 def api_transcribe():
     """API для транскрибации"""
     try:
-        # Проверяем доступность PyTorch перед импортом
+        # Проверяем доступность PyTorch перед импортом. В режиме отдельного
+        # обработчика модель живет в другом процессе и веб-серверу не нужна
         try:
-            import torch
-            import transformers
-            from transcription_simple import TranscriptionProcessor
+            if worker_client is None:
+                # Проверка без импорта: torch загружается в фоне вместе с моделью
+                import importlib.util
+
+                for module in ("torch", "transformers"):
+                    if importlib.util.find_spec(module) is None:
+                        raise ImportError(f"No module named '{module}'")
         except ImportError as import_error:
             # Предлагаем автоматическую установку
             return (
@@ -79,83 +373,276 @@ def api_transcribe():
                 400,
             )
 
-        files = request.files.getlist("files")
-        if not files:
+        saved_files = []
+        durations = []
+        incoming_bytes = 0
+        data = (request.get_json() or {}) if request.is_json else request.form
+        # Модель задачи (по умолчанию русская large-v3)
+        model_name = data.get("model") or DEFAULT_MODEL
+        if model_name != DEFAULT_MODEL and model_name not in AVAILABLE_MODELS:
+            return (
+                jsonify({"success": False, "error": f"Модель недоступна: {model_name}"}),
+                400,
+            )
+        if worker_client is None and not model_manager.can_fit(model_name):
+            return (
+                jsonify({"success": False, "error": f"Модель {model_name} не помещается в бюджет памяти"}),
+                400,
+            )
+        if request.is_json:
+            # Файлы, загружаемые частями через /api/uploads. Задача может
+            # стартовать до окончания загрузки и дождется данных сама.
+            upload_ids = data.get("upload_ids") or []
+            for upload_id in upload_ids:
+                upload = upload_manager.get(upload_id)
+                if upload is None:
+                    return (
+                        jsonify({"success": False, "error": f"Загрузка не найдена: {upload_id}"}),
+                        404,
+                    )
+                saved_files.append({"original": upload.filename, "upload_id": upload.id})
+                # Данные могут еще не прийти: длительность оценивается по заявленному размеру
+                durations.append(estimate_duration(upload.path, upload.size, upload.filename))
+                incoming_bytes += max(0, upload.size - upload.offset)
+        else:
+            files = request.files.getlist("files")
+
+            # Сохраняем файлы во временную папку до запуска потока,
+            # чтобы избежать ошибки "read of closed file" после завершения запроса
+            import re
+            import tempfile
+
+            for i, file in enumerate(files):
+                if file.filename:
+                    safe_filename = re.sub(r"[^\w\-_\.]", "_", file.filename)
+                    temp_dir = tempfile.gettempdir()
+                    temp_path = os.path.join(temp_dir, f"audio_{i}_{safe_filename}")
+                    temp_path = temp_path.replace("\\", "/")
+                    file.save(temp_path)
+                    saved_files.append({"original": file.filename, "path": temp_path})
+                    durations.append(estimate_duration(Path(temp_path), filename=file.filename))
+
+        if not saved_files:
             return jsonify({"success": False, "message": "Файлы не найдены"})
 
-        # Сохраняем файлы во временную папку до запуска потока,
-        # чтобы избежать ошибки "read of closed file" после завершения запроса
-        import re
-        import tempfile
-
-        saved_files = []
-        for i, file in enumerate(files):
-            if file.filename:
-                safe_filename = re.sub(r"[^\w\-_\.]", "_", file.filename)
-                temp_dir = tempfile.gettempdir()
-                temp_path = os.path.join(temp_dir, f"audio_{i}_{safe_filename}")
-                temp_path = temp_path.replace("\\", "/")
-                file.save(temp_path)
-                saved_files.append({"original": file.filename, "path": temp_path})
+        # Перед приемом задачи: хватит ли памяти и диска, не слишком ли длинна очередь.
+        # Проверка и регистрация в очереди - одно действие, иначе два
+        # одновременных запроса пройдут проверку вместе
+        started = worker_client is not None
+        job_id = uuid.uuid4().hex
+        decision, ticket = admission.admit_if_allowed(job_id, durations, incoming_bytes, started=started)
+        if not decision["admitted"]:
+            for item in saved_files:
+                if "path" in item:
+                    try:
+                        os.remove(item["path"])
+                    except Exception:
+                        pass
+            print(f"⏳ Задача отклонена ({decision['reason']}): {decision['error']}")
+            return rejection_response(decision)
 
-        def transcribe_task(file_list):
-            global transcription_status
-            transcription_status["status"] = "processing"
-            transcription_status["results"] = []
-            transcription_status["progress"] = 0
+        try:
+            result_store.create_job("transcription", status="processing" if started else "queued", job_id=job_id)
+        except Exception:
+            admission.release(ticket)
+            raise
+        job_status = register_transcription_job(
+            job_id,
+            status="processing" if started else "queued",
+            progress=0,
+            results=[],
+            eta_seconds=decision["eta_seconds"],
+            queue_position=decision["queue_position"],
+        )
 
+        def add_result(entry):
+            # Текст лежит на диске, в статусе остаются только метаданные
+            entry["text_file"] = f"{os.path.splitext(entry['filename'])[0]}_transcript.txt"
+            job_status.append("results", entry)
+
+        def wait_for_file(i, item, source_sha256=None):
+            """Путь и хэш файла; для загрузок частями ждет окончания передачи"""
+            if "upload_id" not in item:
+                return item["path"], source_sha256 or file_sha256(Path(item["path"])), None
+
+            upload = upload_manager.wait(item["upload_id"])
+            if upload.error:
+                add_result(
+                    result_store.add_result(job_id, i, item["original"], "", False, upload.error)
+                )
+                upload_manager.discard(upload.id)
+                return None, None, None
+            return str(upload.path), upload.sha256, upload
+
+        def dispatch_task(file_list):
+            # Файлы уходят в очередь отдельного процесса по мере готовности
             try:
-                processor = TranscriptionProcessor()
-
-                total_files = len(file_list)
-
                 for i, item in enumerate(file_list):
-                    temp_path = item["path"]
-                    original_name = item["original"]
-
-                    def chunk_progress(pct, file_index=i):
-                        overall = ((file_index + pct / 100) / total_files) * 100
-                        transcription_status["progress"] = overall
-
-                    # Транскрибация
-                    result = processor.transcribe_file(temp_path, progress_callback=chunk_progress)
-
-                    # Создание текстового файла с результатом
-                    text_filename = (
-                        f"{os.path.splitext(original_name)[0]}_transcript.txt"
-                    )
-
-                    transcription_status["results"].append(
+                    path, source_sha256, upload = wait_for_file(i, item)
+                    if path is None:
+                        finish_job_if_done(result_store, job_id, len(file_list))
+                        continue
+                    if upload is not None:
+                        upload_manager.release(upload.id)
+                    worker_client.submit(
                         {
-                            "filename": original_name,
-                            "text": result["text"],
-                            "success": result["success"],
-                            "error": result.get("error", ""),
-                            "text_file": text_filename,
+                            "job_id": job_id,
+                            "index": i,
+                            "total": len(file_list),
+                            "original": item["original"],
+                            "path": os.path.abspath(path),
+                            "sha256": source_sha256,
+                            "model": model_name,
+                            "cleanup": True,
                         }
                     )
+            except Exception as e:
+                result_store.update_job(job_id, status="error", error=str(e))
+
+        # Кэш результатов учитывает модель и параметры транскрибации
+        settings = transcription_settings(model_name)
 
-                    # Очистка временного файла
+        def transcribe_task(file_list):
+            try:
+                # Задача ждет, пока выполняются задачи, принятые раньше
+                admission.wait_turn(ticket)
+                job_status["status"] = "processing"
+                result_store.update_job(job_id, status="processing")
+                run_transcription(file_list)
+            finally:
+                admission.release(ticket)
+
+        def run_transcription(file_list):
+            if model_name == DEFAULT_MODEL:
+                # Загрузка и прогрев модели по умолчанию, если они еще не начались
+                model_warmup.reset()
+                model_warmup.start()
+
+            def prefetch_audio(item):
+                # Следующий файл декодируется, пока модель занята текущим;
+                # загрузки частями декодируются по мере поступления данных
+                if "path" not in item:
+                    return None, None
+                source_sha256 = file_sha256(Path(item["path"]))
+                if result_store.find_by_source(source_sha256, settings):
+                    return source_sha256, None
+                try:
+                    # Декодированию модель не нужна: ее не загружаем и не занимаем
+                    from transcription_simple import TranscriptionProcessor
+                    return source_sha256, TranscriptionProcessor.prepare_file(item["path"])
+                except Exception:
+                    # Ошибку покажет транскрибация этого файла
+                    return source_sha256, None
+
+            total_files = len(file_list)
+            metrics.queue_depth.inc(total_files)
+            started_files = 0
+            file_progress = {}
+
+            def report_progress():
+                overall = sum(file_progress.values()) / total_files * 100
+                job_status["progress"] = round(overall, 1)
+
+            def transcribe_item(i, item, prefetched_sha256, prepared):
+                path, source_sha256, upload = wait_for_file(i, item, prefetched_sha256)
+                if path is None:
+                    return
+
+                def chunk_progress(pct):
+                    file_progress[i] = pct / 100
+                    report_progress()
+
+                # Транскрибация; аудио из загрузки частями обычно уже
+                # декодировано по мере поступления данных
+                samples = decode_timer = None
+                if prepared is not None:
+                    samples, decode_timer = prepared
+                elif upload is not None and not result_store.find_by_source(source_sha256, settings):
+                    samples = upload.decoded_samples()
+                metrics.active_jobs.inc()
+                try:
+                    # Модель загружается, только если результата нет в кэше
+                    with model_manager.lazy(model_name) as get_processor:
+                        entry = transcribe_to_store(
+                            result_store,
+                            get_processor,
+                            job_id,
+                            i,
+                            item["original"],
+                            path,
+                            source_sha256=source_sha256,
+                            samples=samples,
+                            progress_callback=chunk_progress,
+                            decode_timer=decode_timer,
+                            settings=settings,
+                        )
+                finally:
+                    metrics.active_jobs.dec()
+                add_result(entry)
+                file_progress[i] = 1.0
+                report_progress()
+                result_store.update_job(job_id, progress=job_status["progress"])
+
+                # Очистка временного файла; отображенный в память WAV
+                # нужно освободить до удаления (Windows)
+                if hasattr(samples, "close"):
+                    samples.close()
+                samples = prepared = None
+                if upload is not None:
+                    upload_manager.discard(upload.id)
+                else:
                     try:
-                        os.remove(temp_path)
+                        os.remove(path)
                     except Exception:
                         pass
 
-
-                transcription_status["progress"] = 100
-                transcription_status["status"] = "completed"
+            try:
+                # Заранее декодируется один файл: больше держать в памяти незачем.
+                # С батчами одновременно транскрибируются BATCH_SIZE файлов,
+                # и их чанки генерируются вместе
+                prefetched = Prefetcher(file_list, prefetch_audio, depth=1)
+                with ThreadPoolExecutor(max_workers=BATCH_SIZE, thread_name_prefix="transcribe") as executor:
+                    running = set()
+                    for i, (item, (prefetched_sha256, prepared)) in enumerate(prefetched):
+                        if len(running) >= BATCH_SIZE:
+                            done, running = wait(running, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                future.result()
+                        metrics.queue_depth.dec()
+                        started_files += 1
+                        running.add(executor.submit(transcribe_item, i, item, prefetched_sha256, prepared))
+                        prepared = None
+                    for future in running:
+                        future.result()
+
+                job_status["progress"] = 100
+                job_status["status"] = "completed"
+                result_store.update_job(job_id, status="completed", progress=100)
             except Exception as e:
-                transcription_status["status"] = "error"
-                transcription_status["error"] = f"Ошибка транскрибации: {str(e)}"
+                job_status["status"] = "error"
+                job_status["error"] = f"Ошибка транскрибации: {str(e)}"
+                result_store.update_job(job_id, status="error", error=str(e))
                 print(f"Transcription error: {e}")  # Для отладки
+            finally:
+                metrics.queue_depth.dec(total_files - started_files)
 
         import threading
 
-        thread = threading.Thread(target=transcribe_task, args=(saved_files,))
+        target = dispatch_task if worker_client is not None else transcribe_task
+        thread = threading.Thread(target=target, args=(saved_files,))
         thread.daemon = True
         thread.start()
 
-        return jsonify({"success": True, "message": "Транскрибация запущена"})
+        return jsonify(
+            {
+                "success": True,
+                "message": "Транскрибация запущена" if started else "Задача поставлена в очередь",
+                "job_id": job_id,
+                "audio_seconds": decision["audio_seconds"],
+                "eta_seconds": decision["eta_seconds"],
+                "queue_position": decision["queue_position"],
+            }
+        )
 
     except ImportError as e:
         return (
@@ -176,8 +663,97 @@ def api_transcribe():
 
 @app.route("/api/transcription-status")
 def api_transcription_status():
-    """Получение статуса транскрибации"""
-    return jsonify(transcription_status)
+    """Получение статуса задачи ?job_id= (только изменения после ?since=)"""
+    since = request.args.get("since", type=int)
+    job_id = request.args.get("job_id") or None
+    status = transcription_job_status(job_id)
+    if status is None:
+        if job_id:
+            return jsonify({"error": "Задача не найдена"}), 404
+        return json_response(idle_transcription_status.delta(since))
+    if worker_client is not None:
+        sync_transcription_from_store(status)
+    return json_response(with_texts(status.delta(since), status.get("job_id")))
+
+
+@app.route("/api/uploads", methods=["POST"])
+def api_create_upload():
+    """Создание возобновляемой загрузки файла"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get("filename", "")
+
+    supported_extensions = get_supported_audio_formats()
+    if not any(filename.lower().endswith(ext) for ext in supported_extensions):
+        return jsonify({"success": False, "error": "Неподдерживаемый формат файла"}), 400
+
+    # Размер обязателен: по нему определяется окончание загрузки
+    size = data.get("size")
+    if size is None:
+        return jsonify({"success": False, "error": "Не указан размер файла"}), 400
+    if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+        return jsonify({"success": False, "error": "Некорректный размер файла"}), 400
+    if size > app.config["MAX_CONTENT_LENGTH"]:
+        return jsonify({"success": False, "error": "Файл слишком большой"}), 413
+
+    rejected = admission.check_disk(size)
+    if rejected is not None:
+        return rejection_response(rejected)
+
+    try:
+        upload = upload_manager.create(filename, size=size, sha256=data.get("sha256"))
+    except UploadError as e:
+        return jsonify({"success": False, "error": str(e)}), e.status_code
+
+    response = jsonify({"success": True, **upload.to_dict()})
+    response.status_code = 201
+    response.headers["Location"] = f"/api/uploads/{upload.id}"
+    response.headers["Upload-Offset"] = str(upload.offset)
+    return response
+
+
+@app.route("/api/uploads/<upload_id>", methods=["GET"])
+def api_upload_status(upload_id):
+    """Текущее смещение загрузки (HEAD обрабатывается автоматически)"""
+    upload = upload_manager.get(upload_id)
+    if upload is None:
+        return jsonify({"success": False, "error": "Загрузка не найдена"}), 404
+
+    response = jsonify({"success": True, **upload.to_dict()})
+    response.headers["Upload-Offset"] = str(upload.offset)
+    response.headers["Upload-Length"] = str(upload.size)
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@app.route("/api/uploads/<upload_id>", methods=["PATCH", "PUT"])
+def api_upload_chunk(upload_id):
+    """Дописывание части файла с указанного смещения"""
+    offset = request.headers.get("Upload-Offset", type=int)
+    try:
+        upload = upload_manager.append(
+            upload_id,
+            offset,
+            request.stream,
+            checksum=request.headers.get("Upload-Checksum"),
+        )
+    except UploadError as e:
+        response = jsonify({"success": False, "error": str(e)})
+        response.status_code = e.status_code
+        current = upload_manager.get(upload_id)
+        if current is not None:
+            response.headers["Upload-Offset"] = str(current.offset)
+        return response
+
+    response = jsonify({"success": True, **upload.to_dict()})
+    response.headers["Upload-Offset"] = str(upload.offset)
+    return response
+
+
+@app.route("/api/uploads/<upload_id>", methods=["DELETE"])
+def api_delete_upload(upload_id):
+    """Отмена загрузки"""
+    upload_manager.discard(upload_id)
+    return jsonify({"success": True})
 
 
 @app.route("/api/process-text", methods=["POST"])
@@ -198,13 +774,16 @@ def api_process_text():
             text, sentences_per_chunk=sentences_per_chunk
         )
 
-        translation_status = {
-            "progress": 0,
-            "status": "ready",
-            "chunks": chunks,
-            "translations": {},
-            "current_chunk": 0,
-        }
+        job_id = result_store.create_job("translation", status="ready")
+        result_store.save_chunks(job_id, chunks)
+        translation_status.reset(
+            progress=0,
+            status="ready",
+            chunks=chunks,
+            translations={},
+            current_chunk=0,
+            job_id=job_id,
+        )
 
         return jsonify({"success": True, "chunks": chunks, "total_chunks": len(chunks)})
 
@@ -245,12 +824,20 @@ def api_translate():
             )
 
             chunks = translation_status.get("chunks", [])
+            job_id = translation_status.get("job_id")
+
+            def save_translation(index, text):
+                # Текст перевода хранится на диске, в статусе - только отметка
+                result_store.set_translation(job_id, index, text)
+                translation_status.set_item("translations", str(index), None)
+
             if not chunks:
                 translation_status["status"] = "error"
                 translation_status["error"] = "Нет загруженных чанков"
                 return
 
             translation_status["status"] = "processing"
+            result_store.update_job(job_id, status="processing")
 
             if translate_all:
                 # Переводим все чанки
@@ -259,11 +846,10 @@ def api_translate():
 
                     try:
                         translation = translator.translate_text(chunk)
-                        translation_status["translations"][str(i)] = translation
+                        save_translation(i, translation)
                     except Exception as e:
-                        translation_status["translations"][str(i)] = (
-                            f"[Ошибка перевода: {str(e)}]"
-                        )
+                        save_translation(i, f"[Ошибка перевода: {str(e)}]")
+                    result_store.update_job(job_id, progress=translation_status["progress"])
 
                     # Задержка между запросами для избежания лимитов
                     time.sleep(5)
@@ -273,15 +859,17 @@ def api_translate():
                 if chunk_index is not None and 0 <= chunk_index < len(chunks):
                     chunk = chunks[chunk_index]
                     translation = translator.translate_text(chunk)
-                    translation_status["translations"][str(chunk_index)] = translation
+                    save_translation(chunk_index, translation)
                     translation_status["progress"] = 100
 
             translation_status["progress"] = 100
             translation_status["status"] = "completed"
+            result_store.update_job(job_id, status="completed", progress=100)
 
         except Exception as e:
             translation_status["status"] = "error"
             translation_status["error"] = str(e)
+            result_store.update_job(job_id, status="error", error=str(e))
 
     thread = threading.Thread(target=translate_task)
     thread.daemon = True
@@ -292,8 +880,9 @@ def api_translate():
 
 @app.route("/api/translation-status")
 def api_translation_status():
-    """Получение статуса перевода"""
-    return jsonify(translation_status)
+    """Получение статуса перевода (только изменения после ?since=)"""
+    since = request.args.get("since", type=int)
+    return json_response(with_texts(translation_status.delta(since)))
 
 
 @app.route("/api/settings", methods=["GET", "POST"])
@@ -322,25 +911,38 @@ def api_export_translation():
 
     chunks = translation_status.get("chunks", [])
     translations = translation_status.get("translations", {})
+    job_id = translation_status.get("job_id")
 
     if not translations:
         return jsonify({"success": False, "error": "Нет переводов для экспорта"}), 400
 
-    # Собираем переведенные чанки
-    translated_chunks = []
-    for i in range(len(chunks)):
-        translation = translations.get(str(i), f"[Чанк {i + 1} не переведен]")
-        translated_chunks.append(translation)
+    def iter_translation():
+        """Переведенные чанки по одному, без сборки всего текста в памяти"""
+        for i in range(len(chunks)):
+            if i:
+                yield "\n\n"
+            translation = None
+            if str(i) in translations:
+                translation = result_store.read_translation(job_id, i)
+            yield translation if translation is not None else f"[Чанк {i + 1} не переведен]"
+
+    # ?download=1 отдает текстовый файл, иначе JSON в прежнем формате
+    if request.args.get("download"):
+        response = Response(
+            stream_with_context(iter_translation()),
+            mimetype="text/plain; charset=utf-8",
+        )
+        response.headers["Content-Disposition"] = "attachment; filename=translation.txt"
+        return response
 
-    full_translation = "\n\n".join(translated_chunks)
+    def iter_json():
+        yield '{"success": true, "filename": "translation.txt", "translation": "'
+        for piece in iter_translation():
+            # json.dumps экранирует строку, кавычки по краям отбрасываем
+            yield json.dumps(piece, ensure_ascii=False)[1:-1]
+        yield '"}'
 
-    return jsonify(
-        {
-            "success": True,
-            "translation": full_translation,
-            "filename": "translation.txt",
-        }
-    )
+    return Response(stream_with_context(iter_json()), mimetype="application/json")
 
 
 @app.route("/api/install-pytorch", methods=["POST"])
@@ -401,25 +1003,26 @@ def api_install_pytorch():
 
 @app.route("/api/download-transcription")
 def api_download_transcription():
-    """Скачивание результатов транскрибации"""
-    global transcription_status
-
-    if not transcription_status["results"]:
+    """Скачивание результатов задачи ?job_id= (по умолчанию последней)"""
+    status = transcription_job_status(request.args.get("job_id") or None)
+    results = status.get("results", []) if status is not None else []
+    if not results:
         return jsonify({"error": "Нет результатов для скачивания"}), 400
-
-    # Создание объединенного файла с результатами
-    import io
-    from flask import make_response
-
-    output = io.StringIO()
-    for result in transcription_status["results"]:
-        if result["success"]:
-            output.write(f"Файл: {result['filename']}\n")
-            output.write(f"Транскрипция:\n{result['text']}\n\n")
-            output.write("-" * 50 + "\n\n")
-
-    response = make_response(output.getvalue())
-    response.headers["Content-Type"] = "text/plain; charset=utf-8"
+    job_id = status.get("job_id")
+
+    # Объединенный файл отдается потоком: тексты читаются с диска блоками
+    def generate():
+        for result in results:
+            if result["success"]:
+                yield f"Файл: {result['filename']}\n"
+                yield "Транскрипция:\n"
+                yield from result_store.iter_text(job_id, result["index"])
+                yield "\n\n"
+                yield "-" * 50 + "\n\n"
+
+    response = Response(
+        stream_with_context(generate()), mimetype="text/plain; charset=utf-8"
+    )
     response.headers["Content-Disposition"] = (
         "attachment; filename=transcription_results.txt"
     )
@@ -428,10 +1031,9 @@ def api_download_transcription():
 
 @app.route("/api/download-transcription/<int:index>")
 def api_download_transcription_file(index):
-    """Скачивание отдельного результата транскрибации"""
-    global transcription_status
-
-    results = transcription_status.get("results", [])
+    """Скачивание отдельного результата задачи ?job_id= (по умолчанию последней)"""
+    status = transcription_job_status(request.args.get("job_id") or None)
+    results = status.get("results", []) if status is not None else []
     if index < 0 or index >= len(results):
         return jsonify({"error": "Неверный индекс"}), 400
 
@@ -439,13 +1041,51 @@ def api_download_transcription_file(index):
     if not result.get("success"):
         return jsonify({"error": "Результат недоступен"}), 400
 
-    from flask import make_response
-
     text_filename = f"{Path(result['filename']).stem}.txt"
-    response = make_response(result["text"])
-    response.headers["Content-Type"] = "text/plain; charset=utf-8"
-    response.headers["Content-Disposition"] = f"attachment; filename={text_filename}"
-    return response
+    text_path = result_store.result_path(status.get("job_id"), result["index"])
+    if not text_path.exists():
+        return jsonify({"error": "Результат недоступен"}), 404
+
+    # Файл отдается с диска; ETag и Range позволяют докачивать его
+    # и не скачивать повторно
+    return send_file(
+        text_path.resolve(),
+        mimetype="text/plain; charset=utf-8",
+        as_attachment=True,
+        download_name=text_filename,
+        conditional=True,
+        etag=True,
+    )
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Метрики в текстовом формате Prometheus"""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/api/ready")
+def api_ready():
+    """Готовность модели транскрибации (503, пока идет загрузка и прогрев)"""
+    if worker_client is not None:
+        status = {"state": "worker", "ready": True}
+    else:
+        status = model_warmup.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@app.route("/api/models")
+def api_models():
+    """Загруженные модели и их память"""
+    status = model_manager.status()
+    status["available"] = AVAILABLE_MODELS
+    return jsonify(status)
+
+
+@app.route("/api/admission")
+def api_admission():
+    """Очередь задач транскрибации и оценка ее длительности"""
+    return jsonify(admission.status())
 
 
 @app.route("/api/system-info")
@@ -458,6 +1098,8 @@ def api_system_info():
             "max_file_size": app.config["MAX_CONTENT_LENGTH"],
             "transcription_available": False,
             "translation_available": True,
+            "chunked_uploads": True,
+            "upload_chunk_size": UPLOAD_CHUNK_SIZE,
         }
     )
 
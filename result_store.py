@@ -0,0 +1,353 @@
+"""
+Постоянное хранилище задач и результатов
+
+Метаданные задач, транскрипций и переводов хранятся в SQLite, сами тексты -
+отдельными файлами на диске. В памяти сервера остаются только метаданные,
+тексты читаются по требованию, а после перезапуска результаты не пропадают.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Папка для базы данных и текстов результатов
+DATA_DIR = Path("data")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    error TEXT NOT NULL DEFAULT '',
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_kind_created ON jobs (kind, created);
+
+CREATE TABLE IF NOT EXISTS results (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    error TEXT NOT NULL DEFAULT '',
+    chars INTEGER NOT NULL DEFAULT 0,
+    source_sha256 TEXT,
+    created REAL NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS results_filename ON results (filename);
+CREATE INDEX IF NOT EXISTS results_source_sha256 ON results (source_sha256);
+
+CREATE TABLE IF NOT EXISTS chunks (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    translated INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+
+def file_sha256(path: Path, block_size: int = 1024 * 1024) -> str:
+    """
+    Хэш файла без чтения его целиком в память
+
+    Args:
+        path: Путь к файлу
+        block_size: Размер блока чтения
+
+    Returns:
+        str: SHA-256 в hex
+    """
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def settings_key(settings: Optional[Dict]) -> Optional[str]:
+    """Параметры транскрибации в виде, пригодном для сравнения в SQL"""
+    return json.dumps(settings, sort_keys=True) if settings else None
+
+
+class ResultStore:
+    """Хранилище задач транскрибации и перевода"""
+
+    def __init__(self, root: Path = DATA_DIR):
+        self.root = Path(root)
+        self.blobs_dir = self.root / "blobs"
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.root / "results.db", check_same_thread=False, timeout=30
+        )
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            # WAL позволяет читать базу, пока другой процесс пишет в нее
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self._ensure_column("results", "timings", "TEXT")
+            self._ensure_column("results", "settings", "TEXT")
+            self._ensure_column("results", "cached", "INTEGER NOT NULL DEFAULT 0")
+
+    def _ensure_column(self, table: str, column: str, declaration: str):
+        """Добавление колонки в базу, созданную старой версией"""
+        columns = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    def _execute(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _write_blob(self, path: Path, text: str):
+        """Атомарная запись текста на диск"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    # Задачи
+
+    def create_job(self, kind: str, status: str = "processing", job_id: Optional[str] = None) -> str:
+        """
+        Регистрация новой задачи
+
+        Args:
+            kind: Тип задачи ("transcription" или "translation")
+            status: Начальный статус
+            job_id: Заранее выбранный идентификатор (по умолчанию новый)
+
+        Returns:
+            str: Идентификатор задачи
+        """
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, kind, status, created, updated) VALUES (?, ?, ?, ?, ?)",
+            (job_id, kind, status, now, now),
+        )
+        return job_id
+
+    def update_job(self, job_id: str, status: Optional[str] = None,
+                   progress: Optional[float] = None, error: Optional[str] = None):
+        """Обновление статуса задачи"""
+        fields = {"status": status, "progress": progress, "error": error}
+        updates = {name: value for name, value in fields.items() if value is not None}
+        if not updates:
+            return
+        assignments = ", ".join(f"{name} = ?" for name in updates)
+        self._execute(
+            f"UPDATE jobs SET {assignments}, updated = ? WHERE id = ?",
+            (*updates.values(), time.time(), job_id),
+        )
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Информация о задаче"""
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return dict(rows[0]) if rows else None
+
+    def latest_job(self, kind: str) -> Optional[Dict]:
+        """Последняя задача указанного типа"""
+        rows = self._execute(
+            "SELECT * FROM jobs WHERE kind = ? ORDER BY created DESC LIMIT 1", (kind,)
+        )
+        return dict(rows[0]) if rows else None
+
+    # Транскрипции
+
+    def result_path(self, job_id: str, index: int) -> Path:
+        """Путь к тексту транскрипции"""
+        return self.blobs_dir / job_id / f"{index}.txt"
+
+    def add_result(self, job_id: str, index: int, filename: str, text: str,
+                   success: bool, error: str = "",
+                   source_sha256: Optional[str] = None,
+                   timings: Optional[Dict] = None,
+                   settings: Optional[Dict] = None,
+                   cached: bool = False) -> Dict:
+        """
+        Сохранение результата транскрибации файла
+
+        Args:
+            timings: Сводка StageTimer по этапам обработки
+            settings: Модель и параметры, с которыми получен текст
+                (ключ кэша вместе с хэшем аудио)
+            cached: Текст взят из кэша, а не распознан заново
+
+        Returns:
+            Dict: Метаданные результата без текста
+        """
+        if success:
+            self._write_blob(self.result_path(job_id, index), text)
+        self._execute(
+            "INSERT OR REPLACE INTO results "
+            "(job_id, idx, filename, success, error, chars, source_sha256, timings, settings, cached, created) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, index, filename, int(success), error or "", len(text),
+             source_sha256, json.dumps(timings) if timings else None,
+             settings_key(settings), int(cached), time.time()),
+        )
+        return self.get_result(job_id, index)
+
+    def _result_dict(self, row: sqlite3.Row) -> Dict:
+        return {
+            "job_id": row["job_id"],
+            "index": row["idx"],
+            "filename": row["filename"],
+            "success": bool(row["success"]),
+            "error": row["error"],
+            "chars": row["chars"],
+            "source_sha256": row["source_sha256"],
+            "timings": json.loads(row["timings"]) if row["timings"] else None,
+            "settings": json.loads(row["settings"]) if row["settings"] else None,
+            "cached": bool(row["cached"]),
+        }
+
+    def get_result(self, job_id: str, index: int) -> Optional[Dict]:
+        """Метаданные результата по задаче и номеру файла"""
+        rows = self._execute(
+            "SELECT * FROM results WHERE job_id = ? AND idx = ?", (job_id, index)
+        )
+        return self._result_dict(rows[0]) if rows else None
+
+    def list_results(self, job_id: str) -> List[Dict]:
+        """Метаданные всех результатов задачи по порядку"""
+        rows = self._execute(
+            "SELECT * FROM results WHERE job_id = ? ORDER BY idx", (job_id,)
+        )
+        return [self._result_dict(row) for row in rows]
+
+    def find_by_filename(self, filename: str) -> List[Dict]:
+        """Все результаты для файла с указанным именем, новые первыми"""
+        rows = self._execute(
+            "SELECT * FROM results WHERE filename = ? ORDER BY created DESC", (filename,)
+        )
+        return [self._result_dict(row) for row in rows]
+
+    def find_by_source(self, source_sha256: str,
+                       settings: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Успешный результат для аудио с таким же содержимым
+
+        Args:
+            source_sha256: Хэш содержимого аудио
+            settings: Модель и параметры транскрибации; результаты,
+                полученные с другими параметрами, не подходят (None - любые)
+        """
+        if not source_sha256:
+            return None
+        sql = "SELECT * FROM results WHERE source_sha256 = ? AND success = 1"
+        params = [source_sha256]
+        if settings is not None:
+            sql += " AND settings = ?"
+            params.append(settings_key(settings))
+        rows = self._execute(sql + " ORDER BY created DESC", params)
+        for row in rows:
+            if self.result_path(row["job_id"], row["idx"]).exists():
+                return self._result_dict(row)
+        return None
+
+    def results_after(self, rowid: int) -> List[Tuple[int, Dict]]:
+        """
+        Результаты, записанные после указанного (в порядке записи)
+
+        Args:
+            rowid: Номер последней уже обработанной записи (0 - с начала)
+
+        Returns:
+            List[Tuple[int, Dict]]: Номер записи и метаданные результата
+        """
+        rows = self._execute(
+            "SELECT rowid, * FROM results WHERE rowid > ? ORDER BY rowid", (rowid,)
+        )
+        return [(row["rowid"], self._result_dict(row)) for row in rows]
+
+    def last_result_rowid(self) -> int:
+        """Номер последней записи результата"""
+        rows = self._execute("SELECT COALESCE(MAX(rowid), 0) AS rowid FROM results")
+        return rows[0]["rowid"]
+
+    def recent_rtf(self, limit: int = 100) -> List[float]:
+        """RTF последних транскрибаций, новые первыми"""
+        rows = self._execute(
+            "SELECT timings FROM results WHERE timings IS NOT NULL "
+            "ORDER BY created DESC LIMIT ?",
+            (limit,),
+        )
+        values = []
+        for row in rows:
+            rtf = json.loads(row["timings"]).get("rtf")
+            if rtf is not None:
+                values.append(rtf)
+        return values
+
+    def read_text(self, job_id: str, index: int) -> str:
+        """Текст транскрипции (пустая строка, если его нет)"""
+        try:
+            return self.result_path(job_id, index).read_text(encoding="utf-8")
+        except OSError:
+            return ""
+
+    def iter_text(self, job_id: str, index: int,
+                  block_size: int = 64 * 1024) -> Iterator[str]:
+        """Текст транскрипции блоками для потоковой отдачи"""
+        try:
+            with open(self.result_path(job_id, index), "r", encoding="utf-8") as f:
+                for block in iter(lambda: f.read(block_size), ""):
+                    yield block
+        except OSError:
+            return
+
+    # Переводы
+
+    def translation_path(self, job_id: str, index: int) -> Path:
+        """Путь к тексту перевода чанка"""
+        return self.blobs_dir / job_id / f"translation_{index}.txt"
+
+    def save_chunks(self, job_id: str, chunks: List[str]):
+        """Сохранение исходных чанков задачи перевода"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (job_id, idx, text) VALUES (?, ?, ?)",
+                [(job_id, i, chunk) for i, chunk in enumerate(chunks)],
+            )
+
+    def load_chunks(self, job_id: str) -> List[str]:
+        """Исходные чанки задачи перевода"""
+        rows = self._execute(
+            "SELECT text FROM chunks WHERE job_id = ? ORDER BY idx", (job_id,)
+        )
+        return [row["text"] for row in rows]
+
+    def set_translation(self, job_id: str, index: int, text: str):
+        """Сохранение перевода чанка"""
+        self._write_blob(self.translation_path(job_id, index), text)
+        self._execute(
+            "UPDATE chunks SET translated = 1 WHERE job_id = ? AND idx = ?",
+            (job_id, index),
+        )
+
+    def translated_indices(self, job_id: str) -> List[int]:
+        """Номера уже переведенных чанков"""
+        rows = self._execute(
+            "SELECT idx FROM chunks WHERE job_id = ? AND translated = 1 ORDER BY idx",
+            (job_id,),
+        )
+        return [row["idx"] for row in rows]
+
+    def read_translation(self, job_id: str, index: int) -> Optional[str]:
+        """Перевод чанка или None, если он еще не готов"""
+        try:
+            return self.translation_path(job_id, index).read_text(encoding="utf-8")
+        except OSError:
+            return None
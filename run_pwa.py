@@ -4,9 +4,11 @@
 Запуск PWA приложения с проверкой зависимостей
 """
 
+import argparse
 import sys
 import subprocess
 import os
+import time
 
 def check_flask():
     """Проверка Flask"""
@@ -24,8 +26,41 @@ def install_flask():
     except subprocess.CalledProcessError:
         return False
 
+def start_inference_worker(workers):
+    """Запуск отдельного процесса транскрибации и ожидание его очереди"""
+    address = os.environ.setdefault("INFERENCE_WORKER_ADDRESS", "127.0.0.1:50055")
+    process = subprocess.Popen(
+        [sys.executable, "inference_worker.py", "--address", address, "--workers", str(workers)]
+    )
+
+    from inference_worker import WorkerClient
+
+    for _ in range(60):
+        if process.poll() is not None:
+            raise RuntimeError("Процесс транскрибации завершился при запуске")
+        try:
+            WorkerClient(address)
+            return process
+        except Exception:
+            time.sleep(0.5)
+    raise RuntimeError("Очередь транскрибации не отвечает")
+
 def main():
     """Главная функция"""
+    parser = argparse.ArgumentParser(description="Запуск PWA приложения")
+    parser.add_argument(
+        "--inference-workers",
+        type=int,
+        default=0,
+        help="Транскрибировать в отдельных процессах (0 - в процессе веб-сервера)",
+    )
+    parser.add_argument(
+        "--warmup",
+        action="store_true",
+        help="Загрузить и прогреть модель в фоне сразу после запуска",
+    )
+    args = parser.parse_args()
+
     print("=== PWA Приложение для транскрибации и перевода ===\n")
     
     # Проверяем Flask
@@ -40,6 +75,14 @@ def main():
     
     # Запускаем приложение
     try:
+        if args.inference_workers > 0:
+            print("🔄 Запуск процессов транскрибации...")
+            start_inference_worker(args.inference_workers)
+            print("✅ Транскрибация вынесена в отдельные процессы")
+
+        if args.warmup:
+            os.environ["TRANSCRIPTION_WARMUP"] = "1"
+
         from pwa_simple import app
         print("\n🚀 Запуск PWA приложения...")
         print("📱 Откройте в браузере: http://localhost:5000")
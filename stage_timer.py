@@ -0,0 +1,193 @@
+"""
+Замер времени этапов транскрибации
+
+Для каждого этапа (чтение, декодирование, ресэмплинг, извлечение признаков,
+генерация, декодирование токенов) записывается время по часам и процессорное
+время - по каждому чанку и по файлу целиком. Процессорное время этапа
+считается по потоку, который его выполнял: файлы транскрибируются
+параллельно, и время всего процесса включало бы работу соседних файлов.
+Потоки внутренних вычислений PyTorch в него не входят; время всего
+процесса за время обработки файла отдельно выводится в
+process_cpu_seconds. Итоговая сводка попадает в результат транскрибации
+и передается зарегистрированным обработчикам,
+чтобы ее можно было агрегировать (метрики, журнал).
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+_hooks: List[Callable[[Dict], None]] = []
+_hooks_lock = threading.Lock()
+
+
+def register_timing_hook(hook: Callable[[Dict], None]):
+    """
+    Регистрация обработчика сводок
+
+    Args:
+        hook: Функция, принимающая сводку StageTimer.summary()
+    """
+    with _hooks_lock:
+        if hook not in _hooks:
+            _hooks.append(hook)
+
+
+def unregister_timing_hook(hook: Callable[[Dict], None]):
+    """Удаление обработчика сводок"""
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+class JsonlTimingHook:
+    """Запись сводок в файл, по одной JSON-строке на файл"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, summary: Dict):
+        record = {key: value for key, value in summary.items() if key != "chunks"}
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class StageTimer:
+    """Накопитель времени этапов для одного файла"""
+
+    def __init__(self, name: str = "", cpu_clock: Callable[[], float] = time.thread_time):
+        """
+        Args:
+            name: Имя файла
+            cpu_clock: Часы процессорного времени этапов (по умолчанию -
+                время текущего потока)
+        """
+        self.name = name
+        self.cpu_clock = cpu_clock
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.chunks: List[Dict] = []
+        # Дополнительные поля сводки (например, накладные расходы перекрытия)
+        self.info: Dict = {}
+        self._chunk: Optional[Dict] = None
+        self._wall_start = time.perf_counter()
+        self._process_cpu_start = time.process_time()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Замер одного этапа"""
+        wall_start = time.perf_counter()
+        cpu_start = self.cpu_clock()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - wall_start, self.cpu_clock() - cpu_start)
+
+    def record(self, name: str, wall: float, cpu: float):
+        """Учет этапа, замеренного отдельно (например, в фоновом потоке)"""
+        self._add(self.stages, name, wall, cpu)
+        if self._chunk is not None:
+            self._add(self._chunk["stages"], name, wall, cpu)
+
+    def merge(self, other: "StageTimer"):
+        """Перенос этапов другого замера (подготовки файла заранее)"""
+        for name, entry in other.stages.items():
+            stage = self.stages.setdefault(name, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+            for key in ("wall", "cpu", "calls"):
+                stage[key] += entry[key]
+
+    def count(self, name: str, value: int = 1):
+        """Счетчик событий (остановки генерации, повторные декодирования) по файлу и чанку"""
+        self.info[name] = self.info.get(name, 0) + value
+        if self._chunk is not None:
+            self._chunk[name] = self._chunk.get(name, 0) + value
+
+    @staticmethod
+    def _add(stages: Dict, name: str, wall: float, cpu: float):
+        entry = stages.setdefault(name, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+        entry["wall"] += wall
+        entry["cpu"] += cpu
+        entry["calls"] += 1
+
+    def start_chunk(self, index: int, audio_seconds: float):
+        """Начало обработки чанка"""
+        self._chunk = {
+            "index": index,
+            "audio_seconds": round(audio_seconds, 3),
+            "stages": {},
+            "_start": time.perf_counter(),
+        }
+
+    def end_chunk(self):
+        """Окончание обработки чанка"""
+        if self._chunk is None:
+            return
+        chunk = self._chunk
+        chunk["wall"] = round(time.perf_counter() - chunk.pop("_start"), 4)
+        chunk["rtf"] = round(chunk["wall"] / chunk["audio_seconds"], 4) if chunk["audio_seconds"] else None
+        chunk["stages"] = self._rounded(chunk["stages"])
+        self.chunks.append(chunk)
+        self._chunk = None
+
+    @staticmethod
+    def _rounded(stages: Dict) -> Dict:
+        return {
+            name: {
+                "wall": round(entry["wall"], 4),
+                "cpu": round(entry["cpu"], 4),
+                "calls": entry["calls"],
+            }
+            for name, entry in stages.items()
+        }
+
+    def summary(self, audio_seconds: float) -> Dict:
+        """
+        Сводка по файлу
+
+        Args:
+            audio_seconds: Длительность аудио
+
+        Returns:
+            Dict: Время этапов, чанков и коэффициент реального времени (RTF) -
+            время обработки, деленное на длительность аудио. cpu_seconds -
+            сумма процессорного времени этапов файла, process_cpu_seconds -
+            время всего процесса, включая параллельно обрабатываемые файлы
+        """
+        wall = time.perf_counter() - self._wall_start
+        cpu = sum(entry["cpu"] for entry in self.stages.values())
+        summary = {
+            "file": self.name,
+            "audio_seconds": round(audio_seconds, 3),
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "process_cpu_seconds": round(time.process_time() - self._process_cpu_start, 4),
+            "rtf": round(wall / audio_seconds, 4) if audio_seconds else None,
+            "stages": self._rounded(self.stages),
+            "chunks": self.chunks,
+        }
+        if self.chunks:
+            # При перекрывающихся окнах часть аудио обрабатывается дважды
+            processed = sum(chunk["audio_seconds"] for chunk in self.chunks)
+            summary["processed_audio_seconds"] = round(processed, 3)
+        summary.update(self.info)
+        return summary
+
+    def finish(self, audio_seconds: float) -> Dict:
+        """Сводка по файлу с передачей зарегистрированным обработчикам"""
+        summary = self.summary(audio_seconds)
+        with _hooks_lock:
+            hooks = list(_hooks)
+        for hook in hooks:
+            try:
+                hook(summary)
+            except Exception as e:
+                print(f"⚠️ Ошибка обработчика замеров: {e}")
+        return summary
+
+
+# Журнал замеров можно включить без изменения кода
+if os.environ.get("TRANSCRIPTION_TIMINGS_LOG"):
+    register_timing_hook(JsonlTimingHook(os.environ["TRANSCRIPTION_TIMINGS_LOG"]))
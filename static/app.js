@@ -7,6 +7,8 @@ class AudioTranslatorApp {
         this.deferredPrompt = null;
         this.isTranslating = false;
         this.isTranscribing = false;
+        this.transcriptionJobId = null;
+        this.systemInfo = {};
     }
 
     init() {
@@ -15,6 +17,7 @@ class AudioTranslatorApp {
         this.setupDragAndDrop();
         this.setupPWA();
         this.loadSettings();
+        this.loadSystemInfo();
         this.updateStatus("Приложение готово к работе");
     }
 
@@ -37,6 +40,11 @@ class AudioTranslatorApp {
         });
     }
 
+    jobQuery() {
+        // Статус и результаты относятся к задаче, запущенной в этом окне
+        return '?job_id=' + encodeURIComponent(this.transcriptionJobId || '');
+    }
+
     setupEventListeners() {
         // Кнопки навигации
         document.getElementById('settingsBtn').addEventListener('click', () => this.showSettingsModal());
@@ -45,7 +53,7 @@ class AudioTranslatorApp {
         document.getElementById('folderInput').addEventListener('change', (e) => this.handleFolderSelect(e));
         document.getElementById('transcribeBtn').addEventListener('click', () => this.startTranscription());
         document.getElementById('downloadTranscriptionBtn').addEventListener('click', () => {
-            window.open('/api/download-transcription', '_blank');
+            window.open('/api/download-transcription' + this.jobQuery(), '_blank');
         });
         
         // Обработка текста
@@ -328,31 +336,57 @@ class AudioTranslatorApp {
         progressFill.style.width = '0%';
         resultsDiv.innerHTML = '';
 
-        const formData = new FormData();
-        this.audioFiles.forEach(file => {
-            formData.append('files', file);
-        });
-
         try {
-            const response = await fetch('/api/transcribe', {
-                method: 'POST',
-                body: formData
-            });
+            let response;
+            let uploads = [];
+
+            if (this.systemInfo.chunked_uploads) {
+                // Создаем загрузки и запускаем задачу сразу: сервер начнет
+                // обработку, пока файлы еще передаются частями
+                uploads = await Promise.all(this.audioFiles.map(file => this.createUpload(file)));
+                response = await fetch('/api/transcribe', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ upload_ids: uploads.map(u => u.upload_id) })
+                });
+            } else {
+                const formData = new FormData();
+                this.audioFiles.forEach(file => {
+                    formData.append('files', file);
+                });
+
+                response = await fetch('/api/transcribe', {
+                    method: 'POST',
+                    body: formData
+                });
+            }
 
             const result = await response.json();
 
             if (!result.success) {
-                this.showAlert(result.error, 'error');
+                uploads.forEach(u => fetch('/api/uploads/' + u.upload_id, { method: 'DELETE' }));
+                // 503: сервер занят, повторить можно через retry_after секунд
+                const retry = result.retry_after
+                    ? ` Повторите через ${Math.ceil(result.retry_after / 60)} мин.`
+                    : '';
+                this.showAlert(result.error + retry, 'error');
                 progressBar.style.display = 'none';
                 progressText.textContent = '';
                 return;
             }
 
-            // Polling для получения статуса
+            // Polling для получения статуса своей задачи: сервер возвращает
+            // только изменения после последней полученной версии
+            this.transcriptionJobId = result.job_id;
+            let version = null;
+            let results = [];
             const pollStatus = async () => {
                 try {
-                    const statusResponse = await fetch('/api/transcription-status');
+                    const query = this.jobQuery() + (version === null ? '' : '&since=' + version);
+                    const statusResponse = await fetch('/api/transcription-status' + query);
                     const status = await statusResponse.json();
+                    version = status.version ?? null;
+                    results = this.mergeStatus(status, 'results', results);
 
                     const progressFill = progressBar.querySelector('.progress-fill');
                     const progressText = progressBar.querySelector('.progress-text');
@@ -360,7 +394,7 @@ class AudioTranslatorApp {
                     progressText.textContent = `${status.status} (${Math.round(status.progress)}%)`;
 
                     if (status.status === 'completed') {
-                        this.displayTranscriptionResults(status.results);
+                        this.displayTranscriptionResults(results);
                         this.updateStatus('Транскрибация завершена');
                         progressBar.style.display = 'none';
                         progressText.textContent = '';
@@ -370,6 +404,10 @@ class AudioTranslatorApp {
                         this.showAlert(status.error || 'Ошибка транскрибации', 'error');
                         progressBar.style.display = 'none';
                         progressText.textContent = '';
+                    } else if (status.status === 'queued') {
+                        const eta = Math.ceil((status.eta_seconds || 0) / 60);
+                        this.updateStatus(`В очереди, ожидаемое время готовности ~${eta} мин`);
+                        setTimeout(pollStatus, 1000);
                     } else if (status.status === 'processing') {
                         this.updateStatus(status.status || 'Обработка...');
                         setTimeout(pollStatus, 1000);
@@ -381,6 +419,10 @@ class AudioTranslatorApp {
 
             setTimeout(pollStatus, 1000);
 
+            for (let i = 0; i < uploads.length; i++) {
+                await this.uploadFile(this.audioFiles[i], uploads[i].upload_id);
+            }
+
         } catch (error) {
             const errorData = error.response?.data;
             if (errorData?.install_available) {
@@ -397,6 +439,84 @@ class AudioTranslatorApp {
         }
     }
 
+    mergeStatus(status, field, current) {
+        // Полный снимок (или ответ сервера без версий) заменяет коллекцию,
+        // дельта обновляет только изменившиеся элементы
+        const merged = Array.isArray(current) ? [...current] : { ...current };
+        if (status.full !== false && status[field] !== undefined) {
+            return Array.isArray(current) ? [...status[field]] : { ...status[field] };
+        }
+        const changes = status.changes?.[field] || {};
+        Object.entries(changes).forEach(([key, value]) => {
+            merged[key] = value;
+        });
+        return merged;
+    }
+
+    loadSystemInfo() {
+        fetch('/api/system-info')
+            .then(response => response.json())
+            .then(info => {
+                this.systemInfo = info;
+            })
+            .catch(error => {
+                console.error('Ошибка загрузки информации о системе:', error);
+            });
+    }
+
+    async createUpload(file) {
+        const response = await fetch('/api/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size })
+        });
+        const result = await response.json();
+        if (!result.success) {
+            throw new Error(result.error);
+        }
+        return result;
+    }
+
+    async uploadFile(file, uploadId) {
+        const chunkSize = this.systemInfo.upload_chunk_size || 8 * 1024 * 1024;
+        const url = '/api/uploads/' + uploadId;
+        let offset = 0;
+        let failures = 0;
+
+        while (offset < file.size) {
+            const chunk = file.slice(offset, offset + chunkSize);
+            const headers = {
+                'Content-Type': 'application/offset+octet-stream',
+                'Upload-Offset': String(offset)
+            };
+
+            try {
+                const buffer = await chunk.arrayBuffer();
+                if (window.crypto?.subtle) {
+                    const digest = await crypto.subtle.digest('SHA-256', buffer);
+                    headers['Upload-Checksum'] = 'sha256 ' + btoa(String.fromCharCode(...new Uint8Array(digest)));
+                }
+
+                const response = await fetch(url, { method: 'PATCH', headers, body: buffer });
+                if (!response.ok) {
+                    throw new Error((await response.json()).error || response.statusText);
+                }
+                offset = parseInt(response.headers.get('Upload-Offset'), 10);
+                failures = 0;
+            } catch (error) {
+                // Возобновляем с подтвержденного сервером смещения
+                if (++failures > 3) throw error;
+                await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+                const head = await fetch(url, { method: 'HEAD' });
+                if (!head.ok) throw error;
+                offset = parseInt(head.headers.get('Upload-Offset'), 10);
+            }
+
+            const percent = Math.round((offset / file.size) * 100);
+            this.updateStatus(`Загрузка ${file.name}: ${percent}%`);
+        }
+    }
+
     displayTranscriptionResults(results) {
         const resultsDiv = document.getElementById('transcriptionResults');
 
@@ -419,7 +539,7 @@ class AudioTranslatorApp {
         resultsDiv.querySelectorAll('.download-txt').forEach(btn => {
             btn.addEventListener('click', () => {
                 const idx = btn.dataset.index;
-                window.open('/api/download-transcription/' + idx, '_blank');
+                window.open('/api/download-transcription/' + idx + this.jobQuery(), '_blank');
             });
         });
     }
@@ -567,14 +687,18 @@ class AudioTranslatorApp {
                 return;
             }
 
-            // Polling для получения статуса перевода
+            // Polling для получения статуса перевода: новые переводы
+            // приходят дельтами после последней полученной версии
+            let version = null;
             const pollStatus = async () => {
                 try {
-                    const statusResponse = await fetch('/api/translation-status');
+                    const query = version === null ? '' : '?since=' + version;
+                    const statusResponse = await fetch('/api/translation-status' + query);
                     const status = await statusResponse.json();
+                    version = status.version ?? null;
+                    this.translations = { ...this.translations, ...this.mergeStatus(status, 'translations', {}) };
 
                     if (status.status === 'completed') {
-                        this.translations = { ...this.translations, ...status.translations };
                         this.updateChunkDisplay();
                         this.updateOverallTranslationProgress();
                         this.updateStatus(translateAll ? 'Все части переведены' : 'Часть переведена');
@@ -612,25 +736,17 @@ class AudioTranslatorApp {
     }
 
     exportTranslation() {
-        fetch('/api/export-translation')
-            .then(response => response.json())
-            .then(result => {
-                if (result.success) {
-                    const blob = new Blob([result.translation], { type: 'text/plain;charset=utf-8' });
-                    const url = URL.createObjectURL(blob);
-                    const a = document.createElement('a');
-                    a.href = url;
-                    a.download = result.filename;
-                    a.click();
-                    URL.revokeObjectURL(url);
-                    this.updateStatus('Файл сохранен');
-                } else {
-                    this.showAlert(result.error, 'error');
-                }
-            })
-            .catch(error => {
-                this.showAlert('Ошибка экспорта: ' + error.message, 'error');
-            });
+        if (Object.keys(this.translations).length === 0) {
+            this.showAlert('Нет переводов для экспорта', 'error');
+            return;
+        }
+
+        // Сервер отдает файл потоком, браузер сохраняет его сам
+        const a = document.createElement('a');
+        a.href = '/api/export-translation?download=1';
+        a.download = 'translation.txt';
+        a.click();
+        this.updateStatus('Файл сохранен');
     }
 
     showSettingsModal() {
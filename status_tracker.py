@@ -0,0 +1,167 @@
+"""
+Состояние фоновых задач с версиями для инкрементального опроса
+
+Каждое изменение поля или элемента коллекции получает номер версии.
+Клиент передает последнюю полученную версию (курсор since) и получает
+только то, что изменилось после нее, а не весь текст на каждом опросе.
+"""
+
+import threading
+from typing import Any, Dict, Optional
+
+
+class StatusTracker:
+    """Словарь состояния задачи с версионированием изменений"""
+
+    def __init__(self, **fields):
+        self._lock = threading.RLock()
+        self._version = 0
+        self._reset_version = 0
+        self._fields: Dict[str, Any] = {}
+        self._field_versions: Dict[str, int] = {}
+        self._collections: Dict[str, Dict[Any, Any]] = {}
+        self._item_versions: Dict[str, Dict[Any, int]] = {}
+        self._list_collections = set()
+        self.reset(**fields)
+
+    @property
+    def version(self) -> int:
+        """Номер последнего изменения"""
+        return self._version
+
+    def reset(self, **fields):
+        """
+        Полная замена состояния (новая задача)
+
+        Списки и словари становятся коллекциями, изменения которых
+        отслеживаются поэлементно.
+        """
+        with self._lock:
+            self._version += 1
+            self._reset_version = self._version
+            self._fields = {}
+            self._field_versions = {}
+            self._collections = {}
+            self._item_versions = {}
+            self._list_collections = set()
+            for name, value in fields.items():
+                self._assign(name, value)
+
+    def _assign(self, name: str, value: Any):
+        """Присваивание поля без проверки блокировки"""
+        if isinstance(value, (list, dict)):
+            items = dict(enumerate(value)) if isinstance(value, list) else dict(value)
+            if isinstance(value, list):
+                self._list_collections.add(name)
+            else:
+                self._list_collections.discard(name)
+            self._fields.pop(name, None)
+            self._collections[name] = items
+            self._item_versions[name] = {key: self._version for key in items}
+            self._field_versions[name] = self._version
+        else:
+            self._collections.pop(name, None)
+            self._item_versions.pop(name, None)
+            self._fields[name] = value
+            self._field_versions[name] = self._version
+
+    def __setitem__(self, name: str, value: Any):
+        with self._lock:
+            if name in self._fields and self._fields[name] == value:
+                return
+            self._version += 1
+            if isinstance(value, (list, dict)):
+                # Удаленные элементы нельзя передать дельтой: клиенты
+                # получат полный снимок
+                self._reset_version = self._version
+            self._assign(name, value)
+
+    def __getitem__(self, name: str) -> Any:
+        with self._lock:
+            if name in self._collections:
+                return self._materialize(name)
+            return self._fields[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._fields or name in self._collections
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Значение поля или коллекции (копия)"""
+        with self._lock:
+            if name in self:
+                return self[name]
+            return default
+
+    def append(self, name: str, item: Any):
+        """Добавление элемента в список"""
+        with self._lock:
+            if name not in self._collections:
+                self._assign(name, [])
+            self.set_item(name, len(self._collections[name]), item)
+
+    def set_item(self, name: str, key: Any, value: Any):
+        """Изменение одного элемента коллекции"""
+        with self._lock:
+            if name not in self._collections:
+                self._assign(name, {})
+            self._version += 1
+            self._collections[name][key] = value
+            self._item_versions[name][key] = self._version
+
+    def _materialize(self, name: str) -> Any:
+        items = self._collections[name]
+        if name in self._list_collections:
+            return [items[i] for i in sorted(items)]
+        return dict(items)
+
+    def snapshot(self) -> Dict:
+        """Полное состояние в прежнем формате плюс номер версии"""
+        with self._lock:
+            data = dict(self._fields)
+            for name in self._collections:
+                data[name] = self._materialize(name)
+            data["version"] = self._version
+            data["full"] = True
+            return data
+
+    def delta(self, since: Optional[int] = None) -> Dict:
+        """
+        Изменения после версии since
+
+        Args:
+            since: Последняя версия, полученная клиентом
+
+        Returns:
+            Dict: Полный снимок, если курсор не передан или устарел (задача
+            была перезапущена), иначе только измененные поля; измененные
+            элементы коллекций возвращаются в "changes" по ключам
+        """
+        with self._lock:
+            if since is None or since < self._reset_version or since > self._version:
+                return self.snapshot()
+
+            data = {
+                name: value
+                for name, value in self._fields.items()
+                if self._field_versions[name] > since
+            }
+            # Статус и прогресс дешевые, отдаем их всегда
+            for name in ("status", "progress"):
+                if name in self._fields:
+                    data[name] = self._fields[name]
+
+            changes = {}
+            for name, versions in self._item_versions.items():
+                changed = {
+                    key: self._collections[name][key]
+                    for key, version in versions.items()
+                    if version > since
+                }
+                if changed:
+                    changes[name] = changed
+            if changes:
+                data["changes"] = changes
+
+            data["version"] = self._version
+            data["full"] = False
+            return data
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Тесты приема задач транскрибации
+"""
+
+import threading
+import time
+
+from admission import MEMORY_PER_AUDIO_SECOND, AdmissionController, estimate_duration, historical_rtf
+from benchmark import write_audio
+from result_store import ResultStore
+
+GB = 1024 ** 3
+
+
+def test_backlog_rejects_with_retry_after_and_drains(tmp_path):
+    """Длинная очередь дает 503 с Retry-After, готовые файлы ее сокращают"""
+    done = {}
+    admission = AdmissionController(
+        rtf=lambda: 0.5, job_progress=lambda job_id: done.get(job_id, set()),
+        disk_path=tmp_path, max_backlog=3600, memory=lambda: 64 * GB,
+    )
+
+    # На свободном сервере принимается даже задача длиннее очереди
+    first = admission.check([3600.0, 3600.0])
+    assert first["admitted"] and first["eta_seconds"] == 3600 and first["queue_position"] == 0
+    admission.admit("first", [3600.0, 3600.0])
+
+    second = admission.check([1800.0])
+    assert not second["admitted"] and second["status"] == 503
+    assert second["retry_after"] == 900
+
+    # Первый файл первой задачи готов: в очереди 1800 секунд обработки
+    done["first"] = {0}
+    third = admission.check([1800.0])
+    assert third["admitted"] and third["eta_seconds"] == 2700 and third["queue_position"] == 1
+
+
+def test_memory_and_slots(tmp_path):
+    """Память под декодирование проверяется заранее, задачи выполняются по очереди"""
+    admission = AdmissionController(
+        disk_path=tmp_path, max_active=1, files_in_memory=1,
+        memory=lambda: 512 * 1024 ** 2 + 3600 * MEMORY_PER_AUDIO_SECOND,
+    )
+    assert admission.check([7200.0])["status"] == 413
+
+    first = admission.admit("first", [600.0])
+    admission.wait_turn(first)
+    second = admission.admit("second", [600.0])
+    started = threading.Event()
+
+    def run_second():
+        admission.wait_turn(second)
+        started.set()
+
+    thread = threading.Thread(target=run_second)
+    thread.start()
+    time.sleep(0.2)
+    assert not started.is_set() and admission.status()["queued_jobs"] == 1
+    # Пока вторая задача ждет, ее память зарезервирована
+    assert admission.check([3600.0])["status"] == 503
+    admission.release(first)
+    assert started.wait(5)
+    thread.join()
+
+
+def test_duration_and_rtf_history(tmp_path):
+    """Длительность берется из заголовка, RTF - медиана последних транскрибаций"""
+    path = tmp_path / "clip.wav"
+    write_audio(path, 3.0, 16000, 1, "wav")
+    assert abs(estimate_duration(path) - 3.0) < 0.01
+    assert estimate_duration(None, 320000, "long.wav") == 10.0
+
+    store = ResultStore(tmp_path / "data")
+    job_id = store.create_job("transcription")
+    for i, rtf in enumerate([0.2, 0.4, 0.9]):
+        store.add_result(job_id, i, f"{i}.wav", "текст", True, timings={"rtf": rtf})
+    assert historical_rtf(store.recent_rtf()) == 0.4
+    assert historical_rtf([]) == 1.0
+
+
+def test_concurrent_admission_respects_backlog(tmp_path):
+    """Одновременные запросы не проходят проверку очереди вместе"""
+    def slow_memory():
+        time.sleep(0.05)
+        return 64 * GB
+
+    admission = AdmissionController(disk_path=tmp_path, max_backlog=3600, memory=slow_memory)
+    decisions = []
+
+    def submit(i):
+        decisions.append(admission.admit_if_allowed(f"job{i}", [2000.0]))
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    admitted = [ticket for decision, ticket in decisions if decision["admitted"]]
+    assert len(admitted) == 1 and admitted[0] is not None
+    assert all(ticket is None for decision, ticket in decisions if not decision["admitted"])
+    assert admission.status()["queued_jobs"] == 1
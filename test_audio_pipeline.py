@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Тесты фоновой подготовки данных
+"""
+
+import threading
+
+import pytest
+
+from audio_pipeline import Prefetcher
+
+
+def test_prefetcher_keeps_order_and_bounds_lookahead():
+    """Элементы выдаются по порядку, заранее готовится не больше depth + 1"""
+    started = []
+    lock = threading.Lock()
+
+    def prepare(item):
+        with lock:
+            started.append(item)
+        return item * 10
+
+    results = []
+    for item, value in Prefetcher(range(20), prepare, depth=2, workers=2):
+        with lock:
+            assert len(started) <= item + 3
+        results.append((item, value))
+    assert results == [(i, i * 10) for i in range(20)]
+
+
+def test_prefetcher_raises_preparation_error():
+    """Ошибка подготовки выбрасывается при получении элемента"""
+    def prepare(item):
+        if item == 2:
+            raise ValueError("битый файл")
+        return item
+
+    received = []
+    with pytest.raises(ValueError):
+        for item, _ in Prefetcher(range(5), prepare):
+            received.append(item)
+    assert received == [0, 1]
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Тесты определения параметров аудио по заголовкам
+"""
+
+import struct
+import wave
+
+import pytest
+
+from audio_probe import probe_audio
+from utils import get_audio_file_info
+
+# MPEG-1 Layer III, 128 кбит/с, 44.1 кГц, стерео: кадр 417 байт, 1152 сэмпла
+MP3_HEADER = b"\xff\xfb\x90\x44"
+
+
+def mp3_frames(count: int, first: bytes = b"") -> bytes:
+    frame = MP3_HEADER + b"\0" * 413
+    return (MP3_HEADER + first.ljust(413, b"\0") if first else frame) + frame * (count - 1)
+
+
+def test_wav_and_flac_headers(tmp_path):
+    """WAV и FLAC: длительность, частота и каналы из заголовков"""
+    path = tmp_path / "a.wav"
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(b"\0" * 4 * 8000 * 3)
+    assert probe_audio(path) == {
+        "duration_seconds": 3.0, "sample_rate": 8000, "channels": 2, "codec": "pcm",
+    }
+
+    # STREAMINFO: 44.1 кГц, 2 канала, 16 бит, 441000 сэмплов
+    packed = (44100 << 44) | (1 << 41) | (15 << 36) | 441000
+    streaminfo = b"\0" * 10 + packed.to_bytes(8, "big") + b"\0" * 16
+    path = tmp_path / "a.flac"
+    path.write_bytes(b"fLaC" + b"\x80\x00\x00\x22" + streaminfo)
+    info = probe_audio(path)
+    assert (info["duration_seconds"], info["sample_rate"], info["channels"]) == (10.0, 44100, 2)
+
+
+def test_mp3_cbr_and_xing(tmp_path):
+    """MP3: длительность по битрейту и по числу кадров из заголовка Xing"""
+    path = tmp_path / "cbr.mp3"
+    path.write_bytes(b"ID3\x04\x00\x00\x00\x00\x00\x0a" + b"\0" * 10 + mp3_frames(100))
+    info = probe_audio(path)
+    assert info["sample_rate"] == 44100 and info["channels"] == 2
+    assert info["duration_seconds"] == pytest.approx(100 * 1152 / 44100, rel=0.01)
+
+    # Заголовок Xing после 32 байт side information: 1000 кадров
+    xing = b"\0" * 32 + b"Xing" + struct.pack(">II", 1, 1000)
+    path = tmp_path / "vbr.mp3"
+    path.write_bytes(mp3_frames(10, first=xing))
+    assert probe_audio(path)["duration_seconds"] == pytest.approx(1000 * 1152 / 44100)
+
+    assert get_audio_file_info(path)["duration_formatted"] == "00:26"
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Тесты движков вывода
+"""
+
+import functools
+import threading
+from types import SimpleNamespace
+
+import pytest
+import torch
+from transformers import WhisperConfig, WhisperForConditionalGeneration
+
+import backends
+from backends import TorchBackend, _whisper_export_modules
+from model_manager import processor_bytes
+
+
+def tiny_config(decoder_layers=2):
+    return WhisperConfig(
+        vocab_size=64, num_mel_bins=80, d_model=32, encoder_layers=1, decoder_layers=decoder_layers,
+        encoder_attention_heads=2, decoder_attention_heads=2, encoder_ffn_dim=64,
+        decoder_ffn_dim=64, max_source_positions=1500, max_target_positions=448,
+        bos_token_id=1, decoder_start_token_id=1, eos_token_id=2, pad_token_id=2,
+    )
+
+
+def test_export_modules_match_transformers_decoder():
+    """Модули для экспорта в ONNX дают те же логиты, что и модель transformers"""
+    torch.manual_seed(0)
+    model = WhisperForConditionalGeneration(tiny_config()).eval()
+    features = torch.randn(1, 80, 3000)
+
+    backend = TorchBackend(model)
+    encoder_state = backend.encode(features)
+    prompt = torch.tensor([[1, 5, 6]])
+    expected, past = backend.decode_step(prompt, encoder_state)
+    expected_next, _ = backend.decode_step(torch.tensor([[7]]), encoder_state, past)
+
+    encoder, decoder = _whisper_export_modules(model)
+    with torch.no_grad():
+        cross = encoder(features)
+        empty = [torch.zeros(1, 2, 0, 16) for _ in range(4)]
+        logits, *present = decoder(prompt, *empty, *cross)
+        logits_next, *_ = decoder(torch.tensor([[7]]), *present, *cross)
+
+    assert torch.allclose(logits, expected, atol=1e-5)
+    assert torch.allclose(logits_next, expected_next, atol=1e-5)
+
+
+def test_static_cache_is_reused_per_batch_size():
+    """Статический кэш создается один раз на размер батча и сбрасывается между чанками"""
+    model = WhisperForConditionalGeneration(tiny_config(decoder_layers=1)).eval()
+    backend = TorchBackend(model, accelerate=False)
+    first = backend._static_cache(5)
+    assert backend._static_cache(5) is first
+    assert backend._static_cache(1) is not first
+    assert first.self_attention_cache.get_max_length() == 448
+    assert first.cross_attention_cache.get_max_length() == 1500
+
+
+def test_static_cache_generate_is_thread_safe():
+    """Одновременные generate() со статическим кэшем дают те же токены, что и по одному"""
+    torch.manual_seed(0)
+    model = WhisperForConditionalGeneration(tiny_config()).eval()
+    backend = TorchBackend(model, accelerate=False)
+    # Путь статического кэша без компиляции шага декодера
+    backend.accelerate = True
+    inputs = [torch.randn(1, 80, 3000) for _ in range(4)]
+    expected = [
+        backend.generate(input_features=features, max_new_tokens=20, min_new_tokens=20, num_beams=1)
+        for features in inputs
+    ]
+
+    results = {}
+
+    def run(i):
+        for _ in range(3):
+            output = backend.generate(input_features=inputs[i], max_new_tokens=20, min_new_tokens=20, num_beams=1)
+            results.setdefault(i, []).append(output)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(inputs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for i, outputs in results.items():
+        assert all(torch.equal(output, expected[i]) for output in outputs)
+
+
+def test_onnx_backend_matches_torch(tmp_path, monkeypatch):
+    """Экспорт в ONNX и генерация в ONNX Runtime дают те же токены, что и PyTorch"""
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    from backends import OnnxBackend
+
+    torch.manual_seed(0)
+    # Крупные случайные веса: без них модель повторяет один токен
+    config = tiny_config()
+    config.init_std = 0.3
+    model = WhisperForConditionalGeneration(config).eval()
+    model.generation_config.begin_suppress_tokens = [3]
+    model.generation_config.suppress_tokens = [4, 5]
+    features = torch.randn(2, 80, 3000)
+    kwargs = dict(max_new_tokens=12, num_beams=1)
+
+    expected = TorchBackend(model).generate(input_features=features, **kwargs)
+    assert expected[0].tolist() != expected[1].tolist() and len(set(expected[0].tolist())) > 2
+    backend = OnnxBackend(model, export_root=tmp_path)
+    assert (backend.export_dir / "export.json").exists()
+    assert backend.generate(input_features=features, **kwargs).tolist() == expected.tolist()
+
+    # Повторное создание берет готовый экспорт, одиночный чанк - тот же результат
+    again = OnnxBackend(model, export_root=tmp_path)
+    assert again.export_dir == backend.export_dir
+    assert again.generate(input_features=features[1:], **kwargs).tolist() == expected[1:].tolist()
+
+    # Движку ONNX веса PyTorch не нужны: они освобождаются, память считается по экспорту
+    monkeypatch.setitem(backends.BACKENDS, "onnx", functools.partial(OnnxBackend, export_root=tmp_path))
+    freed = backends.create_backend(model, "onnx")
+    assert all(parameter.is_meta for parameter in model.parameters())
+    assert freed.generate(input_features=features, **kwargs).tolist() == expected.tolist()
+    onnx_bytes = processor_bytes(SimpleNamespace(backend=freed, model=model))
+    assert onnx_bytes == sum(path.stat().st_size for path in tmp_path.rglob("*.onnx*"))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Тесты сборки чанков в батчи
+"""
+
+import threading
+
+import numpy as np
+
+import decoding
+from batch_scheduler import BatchScheduler
+from backends import TorchBackend
+from benchmark import tiny_whisper
+from stage_timer import StageTimer
+
+
+def test_scheduler_batches_by_key_and_routes_results():
+    """Элементы разных потоков собираются в батчи по ключу, результат возвращается отправителю"""
+    batches = []
+
+    def run_batch(key, items):
+        batches.append((key, list(items)))
+        return [f"{key}:{item}" for item in items]
+
+    scheduler = BatchScheduler(run_batch, max_batch_size=3, max_wait=0.2)
+    results = {}
+
+    def send(item, key):
+        results[item] = scheduler.submit(item, key).result(timeout=5)
+
+    threads = [
+        threading.Thread(target=send, args=(item, "ru" if item < 4 else "en"))
+        for item in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    scheduler.close()
+
+    assert results == {item: f"{'ru' if item < 4 else 'en'}:{item}" for item in range(6)}
+    assert all(len(items) <= 3 for _, items in batches)
+    assert all(all((item < 4) == (key == "ru") for item in items) for key, items in batches)
+    assert sum(len(items) for _, items in batches) == 6
+    assert len(batches) < 6
+
+
+def test_generate_batch_matches_single_chunks(monkeypatch):
+    """Батч из чанков разных файлов дает те же тексты, что и генерация по одному"""
+    monkeypatch.setattr(decoding, "FALLBACK_TEMPERATURE", 0)
+    model, processor = tiny_whisper()
+    backend = TorchBackend(model)
+    rng = np.random.default_rng(0)
+    chunks = []
+    for _ in range(3):
+        samples = (rng.standard_normal(16000 * 5) * 0.1).astype(np.float32)
+        features = processor(samples, sampling_rate=16000, return_tensors="pt").input_features
+        chunks.append(({"input_features": features}, samples, StageTimer()))
+
+    decode = processor.batch_decode
+    single = [
+        decoding.generate_chunk(backend, decode, inputs, samples, timer, num_beams=1)
+        for inputs, samples, timer in chunks
+    ]
+    timers = [StageTimer() for _ in chunks]
+    batched = decoding.generate_batch(
+        backend, decode, [(inputs, samples, timer) for (inputs, samples, _), timer in zip(chunks, timers)],
+        num_beams=1,
+    )
+
+    assert batched == single and all(single)
+    assert all(timer.info["batched_chunks"] == 1 for timer in timers)
+    assert all(timer.stages["generate"]["calls"] == 1 for timer in timers)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Тесты ограничения генерации
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+from decoding import (
+    MAX_NEW_TOKENS,
+    FileLanguage,
+    compression_ratio,
+    generate_batch,
+    make_repetition_stop,
+    speech_seconds,
+    token_budget,
+    trim_repetition,
+)
+from stage_timer import StageTimer
+
+
+def test_token_budget_follows_speech_duration():
+    """Лимит токенов растет с длительностью речи, тишина не генерируется"""
+    rng = np.random.default_rng(0)
+    samples = np.zeros(16000 * 30, dtype=np.float32)
+    assert speech_seconds(samples) == 0.0
+    assert token_budget(speech_seconds(samples)) == 0
+
+    samples[:16000 * 5] = rng.standard_normal(16000 * 5) * 0.1
+    assert speech_seconds(samples) == 5.0
+    short = token_budget(speech_seconds(samples))
+    assert 0 < short < token_budget(30.0) <= MAX_NEW_TOKENS
+    assert token_budget(600.0) == MAX_NEW_TOKENS
+
+
+def test_repetition_is_stopped_and_trimmed():
+    """Периодический хвост останавливает генерацию и обрезается в тексте"""
+    stop = make_repetition_stop()
+    normal = torch.arange(28).unsqueeze(0)
+    looped = torch.cat([torch.arange(10), torch.tensor([7, 8, 9] * 6)]).unsqueeze(0)
+    hits = stop(torch.cat([normal, looped]), None)
+    assert hits.tolist() == [False, True]
+    assert stop.triggered
+
+    text = "Добрый день. " + "Спасибо за внимание. " * 6
+    assert trim_repetition(text) == "Добрый день. Спасибо за внимание."
+    assert trim_repetition("да да да, конечно") == "да да да, конечно"
+    assert compression_ratio(text) > compression_ratio("Добрый день. Спасибо за внимание.")
+
+
+class PaddedBatchBackend:
+    """Движок, у которого вторая строка батча рано завершается и дополняется"""
+
+    def __init__(self):
+        self.generation_config = SimpleNamespace(eos_token_id=50257, pad_token_id=50257)
+
+    def generate(self, input_features, max_new_tokens, stopping_criteria, **kwargs):
+        rows = [list(range(100, 140)), list(range(200, 215)) + [50257] * 25]
+        for step in range(1, 41):
+            sequence = torch.tensor([row[:step] for row in rows])
+            if stopping_criteria(sequence, None).all():
+                break
+        return sequence
+
+
+def test_padded_rows_are_not_repetition():
+    """Дополнение завершенной строки батча токенами конца текста не считается зацикливанием"""
+    ids = torch.tensor([list(range(100, 140)), list(range(200, 215)) + [50257] * 25])
+    stop = make_repetition_stop([50257])
+    assert stop(ids, None).tolist() == [False, False]
+    assert not stop.triggered
+
+    samples = (np.random.default_rng(0).standard_normal(16000 * 5) * 0.1).astype(np.float32)
+    timers = [StageTimer(), StageTimer()]
+    texts = generate_batch(
+        PaddedBatchBackend(), lambda output: [str(len(row)) for row in output.tolist()],
+        [({"input_features": torch.zeros(1, 1)}, samples, timer) for timer in timers],
+    )
+    assert texts == ["40", "40"]
+    assert all("repetition_stops" not in timer.info for timer in timers)
+
+
+class FakeBackend:
+    """Движок, для которого русский вероятнее английского"""
+
+    def __init__(self):
+        self.generation_config = SimpleNamespace(
+            lang_to_id={"<|en|>": 0, "<|ru|>": 1}, decoder_start_token_id=2, language=None
+        )
+        self.calls = 0
+
+    def encode(self, input_features):
+        self.calls += 1
+        return input_features
+
+    def decode_step(self, input_ids, encoder_state, past=None):
+        return torch.tensor([[0.0, 3.0, 9.0]]), None
+
+
+def test_file_language_is_detected_once():
+    """Язык определяется по первому уверенному чанку и дальше не меняется"""
+    model = FakeBackend()
+    language = FileLanguage(model)
+    features = torch.zeros(1, 80, 3000)
+    for _ in range(3):
+        assert language.generate_kwargs(features) == {"language": "ru", "task": "transcribe"}
+    assert model.calls == 1
+
+    fixed = FileLanguage(model, mode="en")
+    assert fixed.generate_kwargs(features) == {"language": "en", "task": "transcribe"}
+    assert FileLanguage(model, mode="chunk").generate_kwargs(features) == {}
+    assert model.calls == 1
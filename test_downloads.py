@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Тесты скачивания результатов через веб-интерфейс
+"""
+
+import json
+
+import pytest
+
+from result_store import ResultStore
+from status_tracker import StatusTracker
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Приложение с хранилищем во временной папке"""
+    monkeypatch.chdir(tmp_path)
+    import pwa_simple
+
+    store = ResultStore(tmp_path / "data")
+    monkeypatch.setattr(pwa_simple, "result_store", store)
+    monkeypatch.setattr(pwa_simple, "transcription_jobs", type(pwa_simple.transcription_jobs)())
+    return pwa_simple, store
+
+
+def test_combined_download_streams_all_texts(app):
+    """Объединенный файл содержит тексты всех успешных файлов задачи"""
+    pwa_simple, store = app
+    job_id = store.create_job("transcription", status="completed")
+    store.add_result(job_id, 0, "a.wav", "первый текст", True)
+    store.add_result(job_id, 1, "b.wav", "", False, "ошибка")
+    store.add_result(job_id, 2, "c.wav", "третий текст", True)
+
+    response = pwa_simple.app.test_client().get(f"/api/download-transcription?job_id={job_id}")
+    assert response.status_code == 200
+    assert "attachment" in response.headers["Content-Disposition"]
+    body = response.get_data(as_text=True)
+    assert "Файл: a.wav\nТранскрипция:\nпервый текст" in body
+    assert "Файл: c.wav\nТранскрипция:\nтретий текст" in body
+    assert "b.wav" not in body
+
+
+def test_file_download_supports_range_and_etag(app):
+    """Отдельный файл докачивается по Range и не скачивается повторно по ETag"""
+    pwa_simple, store = app
+    job_id = store.create_job("transcription", status="completed")
+    store.add_result(job_id, 0, "a.wav", "0123456789", True)
+    client = pwa_simple.app.test_client()
+    url = f"/api/download-transcription/0?job_id={job_id}"
+
+    response = client.get(url)
+    assert response.status_code == 200 and response.get_data() == b"0123456789"
+    etag = response.headers["ETag"]
+
+    partial = client.get(url, headers={"Range": "bytes=4-"})
+    assert partial.status_code == 206 and partial.get_data() == b"456789"
+    assert partial.headers["Content-Range"] == "bytes 4-9/10"
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/api/download-transcription/5?job_id={job_id}").status_code == 400
+
+
+def test_translation_export_escapes_text(app, monkeypatch):
+    """Потоковый JSON перевода разбирается json.loads, ?download=1 отдает текст"""
+    pwa_simple, store = app
+    job_id = store.create_job("translation", status="completed")
+    texts = ['Он сказал: "привет"\nи ушел', "строка с \\ и\tтабуляцией"]
+    for i, text in enumerate(texts):
+        store.set_translation(job_id, i, text)
+    monkeypatch.setattr(pwa_simple, "translation_status", StatusTracker(
+        job_id=job_id, chunks=["a", "b", "c"], translations={"0": True, "1": True},
+    ))
+    client = pwa_simple.app.test_client()
+    expected = "\n\n".join(texts + ["[Чанк 3 не переведен]"])
+
+    data = json.loads(client.get("/api/export-translation").get_data(as_text=True))
+    assert data == {"success": True, "filename": "translation.txt", "translation": expected}
+
+    response = client.get("/api/export-translation?download=1")
+    assert "attachment" in response.headers["Content-Disposition"]
+    assert response.get_data(as_text=True) == expected
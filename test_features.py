@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Тесты лог-мел признаков для окон аудио
+"""
+
+import numpy as np
+from transformers import WhisperFeatureExtractor
+
+from features import LogMelExtractor
+from text_stitching import overlapping_windows
+
+
+def test_windows_match_whisper_feature_extractor():
+    """Признаки окон совпадают с WhisperFeatureExtractor, кроме крайних кадров"""
+    extractor = WhisperFeatureExtractor(feature_size=80)
+    rng = np.random.default_rng(0)
+    samples = (0.1 * rng.standard_normal(16000 * 65)).astype(np.float32)
+    windows = overlapping_windows(len(samples), 30 * 16000, 2 * 16000)
+
+    features, attention_mask = LogMelExtractor(extractor).windows(
+        samples, windows, return_attention_mask=True
+    )
+    expected = extractor(
+        [samples[start:end] for start, end in windows],
+        sampling_rate=16000,
+        return_tensors="np",
+        return_attention_mask=True,
+    )
+    assert features.shape == expected.input_features.shape
+    np.testing.assert_allclose(
+        features.numpy()[:, :, 2:-2], expected.input_features[:, :, 2:-2], atol=1e-4
+    )
+    assert (attention_mask.numpy() == expected.attention_mask).all()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Тесты журнала пакетной транскрибации
+"""
+
+import os
+
+from batch_transcribe import collect_files, output_path
+from file_index import FileIndex
+from result_store import file_sha256
+
+
+def test_current_after_touch_and_stale_after_change(tmp_path):
+    """Касание файла не требует повторной обработки, изменение содержимого - требует"""
+    audio = tmp_path / "a.wav"
+    audio.write_bytes(b"RIFF" + b"\0" * 100)
+    output = tmp_path / "a.txt"
+    output.write_text("текст", encoding="utf-8")
+
+    index = FileIndex(tmp_path / "index.db")
+    assert not index.is_current(audio, output)
+
+    index.mark_done(audio, os.stat(audio), file_sha256(audio), output, 1.0)
+    assert index.is_current(audio, output)
+
+    os.utime(audio, ns=(1, 1))
+    assert index.is_current(audio, output)
+
+    audio.write_bytes(b"RIFF" + b"\1" * 100)
+    assert not index.is_current(audio, output)
+
+
+def test_collect_files_filters_formats(tmp_path):
+    """Из папки берутся только аудиофайлы, структура сохраняется в выводе"""
+    (tmp_path / "in" / "sub").mkdir(parents=True)
+    for name in ("a.mp3", "sub/b.WAV", "notes.txt"):
+        (tmp_path / "in" / name).write_bytes(b"")
+
+    files = collect_files([str(tmp_path / "in")])
+    names = [path.relative_to(root).as_posix() for path, root in files]
+    assert names == ["a.mp3", "sub/b.WAV"]
+
+    path, root = files[1]
+    assert output_path(path, root, tmp_path / "out") == tmp_path / "out" / "sub" / "b.txt"
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Тесты записи результатов обработчика транскрибации
+"""
+
+from inference_worker import finish_job_if_done, transcribe_to_store, transcription_settings
+from result_store import ResultStore
+
+
+class StubProcessor:
+    """Модель, возвращающая имя файла вместо текста"""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe_file(self, path, progress_callback=None, samples=None, decode_timer=None):
+        self.calls.append(path)
+        return {"success": True, "text": f"текст {path}", "timings": {"rtf": 0.5}}
+
+
+def test_transcription_cache_hit_and_miss(tmp_path):
+    """Аудио, уже распознанное с теми же параметрами, не транскрибируется снова"""
+    store = ResultStore(tmp_path / "data")
+    processor = StubProcessor()
+    loads = []
+
+    def get_processor():
+        loads.append(1)
+        return processor
+
+    settings = transcription_settings("default")
+    first = store.create_job("transcription")
+    result = transcribe_to_store(store, get_processor, first, 0, "a.wav", "a.wav", "sha-a", settings=settings)
+    assert result["success"] and store.read_text(first, 0) == "текст a.wav"
+
+    second = store.create_job("transcription")
+    cached = transcribe_to_store(store, get_processor, second, 0, "copy.wav", "copy.wav", "sha-a",
+                                 settings=settings)
+    assert cached["success"] and store.read_text(second, 0) == "текст a.wav"
+    # Модель для кэшированного файла не загружалась
+    assert processor.calls == ["a.wav"] and len(loads) == 1
+
+    # Другая модель - промах кэша
+    transcribe_to_store(store, get_processor, second, 1, "copy.wav", "copy.wav", "sha-a",
+                        settings=transcription_settings("small"))
+    assert processor.calls == ["a.wav", "copy.wav"]
+
+
+def test_job_finishes_when_all_files_are_done(tmp_path):
+    """Задача завершается, когда в хранилище есть результаты всех файлов"""
+    store = ResultStore(tmp_path / "data")
+    job_id = store.create_job("transcription")
+    store.add_result(job_id, 0, "a.wav", "текст", True)
+    finish_job_if_done(store, job_id, 2)
+    job = store.get_job(job_id)
+    assert job["status"] == "processing" and job["progress"] == 50.0
+
+    store.add_result(job_id, 1, "b.wav", "", False, "ошибка")
+    finish_job_if_done(store, job_id, 2)
+    job = store.get_job(job_id)
+    assert job["status"] == "completed" and job["progress"] == 100
+
+
+def test_worker_results_update_web_metrics(tmp_path, monkeypatch):
+    """Счетчики файлов и кэша обработчика восстанавливаются сервером по записям"""
+    import metrics
+
+    monkeypatch.chdir(tmp_path)
+    import pwa_simple
+
+    store = ResultStore(tmp_path / "data")
+    settings = transcription_settings("default")
+    job_id = store.create_job("transcription")
+    transcribe_to_store(store, StubProcessor, job_id, 0, "a.wav", "a.wav", "sha-a", settings=settings)
+    transcribe_to_store(store, StubProcessor, job_id, 1, "b.wav", "b.wav", "sha-a", settings=settings)
+    store.add_result(job_id, 2, "c.wav", "", False, "Загрузка прервана")
+    entries = [entry for _, entry in store.results_after(0)]
+    assert [entry["cached"] for entry in entries] == [False, True, False]
+
+    def counts():
+        return (
+            [metrics.transcribed_files.value(status=status) for status in ("success", "cached", "error")],
+            [metrics.cache_requests.value(cache="transcription", result=result) for result in ("hit", "miss")],
+        )
+
+    files_before, cache_before = counts()
+    for entry in entries:
+        pwa_simple.observe_worker_result(entry)
+    files_after, cache_after = counts()
+    assert [a - b for a, b in zip(files_after, files_before)] == [1, 1, 1]
+    assert [a - b for a, b in zip(cache_after, cache_before)] == [1, 1]
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Тесты метрик в формате Prometheus
+"""
+
+from metrics import MetricsRegistry
+
+
+def test_render_counters_and_histograms():
+    """Счетчики с метками и гистограммы выводятся в формате экспозиции"""
+    registry = MetricsRegistry()
+    retries = registry.counter("retries_total", "Повторы", ("status",))
+    latency = registry.histogram("latency_seconds", "Задержка", buckets=(0.1, 1))
+
+    retries.inc(status="429")
+    retries.inc(2, status="429")
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    text = registry.render()
+    assert "# TYPE retries_total counter" in text
+    assert 'retries_total{status="429"} 3' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+    assert "latency_seconds_count 2" in text
+
+
+def test_gauge_function_and_defaults():
+    """Значение без меток видно сразу, функция вычисляется при чтении"""
+    registry = MetricsRegistry()
+    active = registry.gauge("active", "Активные")
+    depth = registry.gauge("depth", "Очередь")
+    depth.set_function(lambda: 7)
+
+    text = registry.render()
+    assert "active 0" in text
+    assert "depth 7" in text
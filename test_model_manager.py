@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Тесты управления памятью моделей
+"""
+
+import pytest
+import torch
+from safetensors.torch import save_file
+
+from model_manager import ModelManager, model_bytes
+from model_manifest import estimate_model_bytes, record_snapshot
+
+MB = 1024 ** 2
+
+
+class FakeProcessor:
+    """Модель из одного тензора заданного размера"""
+
+    def __init__(self, name, megabytes):
+        self.name = name
+        self.model = torch.nn.Linear(megabytes * MB // 4, 1, bias=False)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_least_recently_used_model_is_evicted():
+    """Новая модель вытесняет давно не нужную, а не последнюю"""
+    sizes = {"large": 6, "small": 2, "tiny": 1}
+    loaded = []
+
+    def factory(name):
+        loaded.append(name)
+        return FakeProcessor(name, sizes[name])
+
+    manager = ModelManager(factory, budget=8 * MB, estimate=lambda name: sizes[name] * MB)
+    with manager.use("small") as small:
+        assert small.name == "small"
+    with manager.use("large"):
+        pass
+    with manager.use("small") as again:
+        assert again is small
+    assert loaded == ["small", "large"]
+
+    # large + small + tiny не помещаются: выгружается large
+    with manager.use("tiny"):
+        pass
+    status = manager.status()
+    assert [model["name"] for model in status["models"]] == ["small", "tiny"]
+    assert status["used_bytes"] == 3 * MB
+    assert status["models"][0]["memory_bytes"] == model_bytes(small.model) == 2 * MB
+
+
+def test_model_in_use_is_kept_and_oversized_model_refused():
+    """Занятая модель не выгружается: задача ждет, а модель больше бюджета не загружается"""
+    sizes = {"large": 6, "small": 4, "huge": 9}
+    manager = ModelManager(
+        lambda name: FakeProcessor(name, sizes[name]),
+        budget=8 * MB,
+        wait_seconds=0.1,
+        estimate=lambda name: sizes[name] * MB,
+    )
+    large = manager.acquire("large")
+    with pytest.raises(Exception, match="Нет памяти"):
+        manager.acquire("small")
+    with pytest.raises(Exception, match="бюджет"):
+        manager.acquire("huge")
+    assert not manager.can_fit("huge")
+
+    manager.release("large")
+    with manager.use("small"):
+        pass
+    assert large.closed
+    assert [model["name"] for model in manager.status()["models"]] == ["small"]
+
+
+def test_estimate_from_safetensors_header(tmp_path):
+    """Память модели оценивается по заголовку safetensors (float16 на диске -> float32)"""
+    snapshot = tmp_path / "snapshot"
+    snapshot.mkdir()
+    save_file({"weight": torch.zeros(16, 8, dtype=torch.float16)}, str(snapshot / "model.safetensors"))
+    record_snapshot("org/model", snapshot, tmp_path)
+    assert estimate_model_bytes("org/model", tmp_path) == 16 * 8 * 4
+    assert estimate_model_bytes("org/other", tmp_path) is None
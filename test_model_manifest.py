@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Тесты манифеста локальных моделей
+"""
+
+import pytest
+
+from model_manifest import check_entry, find_local_model, load_manifest, record_snapshot
+
+
+def make_snapshot(root, repo_id, revision="abc123"):
+    snapshot = root / f"models--{repo_id.replace('/', '--')}" / "snapshots" / revision
+    snapshot.mkdir(parents=True)
+    (snapshot / "config.json").write_text("{}")
+    (snapshot / "model.safetensors").write_bytes(b"\0" * 64)
+    return snapshot
+
+
+def test_record_and_find_local_model(tmp_path):
+    """Снимки записываются в манифест, поврежденный снимок пропускается"""
+    assert find_local_model(tmp_path) is None
+
+    first = make_snapshot(tmp_path, "org/first")
+    second = make_snapshot(tmp_path, "org/second")
+    entry = record_snapshot("org/first", first, tmp_path)
+    record_snapshot("org/second", second, tmp_path)
+
+    assert entry["revision"] == "abc123"
+    assert entry["path"] == "models--org--first/snapshots/abc123"
+    assert set(load_manifest(tmp_path)["models"]) == {"org/first", "org/second"}
+    assert find_local_model(tmp_path, ["org/first", "org/second"]) == ("org/first", first)
+
+    (first / "model.safetensors").write_bytes(b"\0" * 32)
+    assert find_local_model(tmp_path, ["org/first", "org/second"]) == ("org/second", second)
+
+    # Подмена содержимого без изменения размера видна только при полной проверке
+    (second / "model.safetensors").write_bytes(b"\1" * 64)
+    second_entry = load_manifest(tmp_path)["models"]["org/second"]
+    assert check_entry(second_entry, tmp_path) == []
+    assert check_entry(second_entry, tmp_path, full=True) == ["model.safetensors: не совпадает SHA-256"]
+
+
+def test_record_snapshot_requires_safetensors(tmp_path):
+    """Снимок без весов safetensors не записывается"""
+    snapshot = tmp_path / "snapshot"
+    snapshot.mkdir()
+    (snapshot / "config.json").write_text("{}")
+    with pytest.raises(Exception, match="safetensors"):
+        record_snapshot("org/model", snapshot, tmp_path)
+    assert load_manifest(tmp_path)["models"] == {}
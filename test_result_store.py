@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Тесты постоянного хранилища результатов
+"""
+
+from result_store import ResultStore
+
+
+def test_results_survive_reopen(tmp_path):
+    """Результаты читаются после повторного открытия хранилища"""
+    store = ResultStore(tmp_path)
+    job_id = store.create_job("transcription")
+    store.add_result(job_id, 0, "a.wav", "первый текст", True, source_sha256="abc")
+    store.add_result(job_id, 1, "b.wav", "", False, error="Ошибка декодирования")
+    store.update_job(job_id, status="completed", progress=100)
+
+    reopened = ResultStore(tmp_path)
+    assert reopened.latest_job("transcription")["status"] == "completed"
+    results = reopened.list_results(job_id)
+    assert [r["filename"] for r in results] == ["a.wav", "b.wav"]
+    assert reopened.read_text(job_id, 0) == "первый текст"
+    assert "".join(reopened.iter_text(job_id, 0, block_size=4)) == "первый текст"
+    assert reopened.find_by_source("abc")["index"] == 0
+    assert reopened.find_by_filename("b.wav")[0]["error"] == "Ошибка декодирования"
+
+
+def test_translations_are_stored_per_chunk(tmp_path):
+    """Переводы сохраняются по чанкам"""
+    store = ResultStore(tmp_path)
+    job_id = store.create_job("translation", status="ready")
+    store.save_chunks(job_id, ["one", "two", "three"])
+    store.set_translation(job_id, 2, "три")
+
+    assert store.load_chunks(job_id) == ["one", "two", "three"]
+    assert store.translated_indices(job_id) == [2]
+    assert store.read_translation(job_id, 2) == "три"
+    assert store.read_translation(job_id, 0) is None
+
+
+def test_cache_lookup_respects_model_and_settings(tmp_path):
+    """Текст, полученный другой моделью или с другими параметрами, не берется из кэша"""
+    from inference_worker import transcribe_to_store, transcription_settings
+
+    store = ResultStore(tmp_path)
+    calls = []
+
+    class Processor:
+        def __init__(self, name):
+            self.name = name
+
+        def transcribe_file(self, path, **kwargs):
+            calls.append(self.name)
+            return {"success": True, "text": f"текст {self.name}"}
+
+    job_id = store.create_job("transcription")
+    for index, name in enumerate(["large", "small", "large"]):
+        transcribe_to_store(
+            store, lambda: Processor(name), job_id, index, "a.wav", "a.wav",
+            source_sha256="abc", settings=transcription_settings(name),
+        )
+    assert calls == ["large", "small"]
+    assert [store.read_text(job_id, i) for i in range(3)] == ["текст large", "текст small", "текст large"]
+
+    overlap = dict(transcription_settings("large"), overlap=2.0)
+    assert store.find_by_source("abc", overlap) is None
+    assert store.find_by_source("abc", transcription_settings("small"))["settings"]["model"] == "small"
+
+
+def test_results_after_follows_write_order(tmp_path):
+    """Новые результаты читаются по одному разу в порядке записи"""
+    store = ResultStore(tmp_path)
+    job_id = store.create_job("transcription")
+    store.add_result(job_id, 0, "a.wav", "a", True)
+    last = store.last_result_rowid()
+
+    store.add_result(job_id, 2, "c.wav", "c", True, timings={"rtf": 0.3})
+    store.add_result(job_id, 1, "b.wav", "b", True)
+    entries = store.results_after(last)
+    assert [entry["filename"] for _, entry in entries] == ["c.wav", "b.wav"]
+    assert entries[0][1]["timings"]["rtf"] == 0.3
+    assert store.results_after(entries[-1][0]) == []
+
+    # Перезапись результата - тоже новая запись
+    store.add_result(job_id, 0, "a.wav", "a2", True)
+    assert [entry["index"] for _, entry in store.results_after(entries[-1][0])] == [0]
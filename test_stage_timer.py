@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Тесты замера этапов транскрибации
+"""
+
+import threading
+import time
+
+from stage_timer import StageTimer, register_timing_hook, unregister_timing_hook
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_stage_cpu_excludes_other_threads():
+    """Процессорное время этапа не включает работу параллельных потоков"""
+    timer = StageTimer("a.wav")
+    busy = threading.Thread(target=spin, args=(0.4,))
+    busy.start()
+    with timer.stage("read"):
+        time.sleep(0.3)
+    busy.join()
+    with timer.stage("features"):
+        spin(0.1)
+
+    summary = timer.summary(10.0)
+    assert summary["stages"]["read"]["wall"] >= 0.3
+    assert summary["stages"]["read"]["cpu"] < 0.1
+    assert summary["stages"]["features"]["cpu"] >= 0.05
+    stages_cpu = summary["stages"]["read"]["cpu"] + summary["stages"]["features"]["cpu"]
+    assert abs(summary["cpu_seconds"] - stages_cpu) < 1e-3
+    # Время всего процесса учитывает и соседний поток
+    assert summary["process_cpu_seconds"] >= 0.3
+
+
+def test_chunks_merge_and_hooks():
+    """Этапы учитываются по чанкам, подготовка файла переносится, сводка уходит обработчикам"""
+    prepared = StageTimer("a.wav")
+    prepared.record("decode", 0.5, 0.4)
+
+    timer = StageTimer("a.wav")
+    timer.merge(prepared)
+    timer.start_chunk(0, 30.0)
+    timer.record("generate", 1.5, 1.0)
+    timer.count("repetition_stops")
+    timer.end_chunk()
+    timer.start_chunk(1, 10.0)
+    timer.record("generate", 0.5, 0.5)
+    timer.end_chunk()
+
+    received = []
+    register_timing_hook(received.append)
+    try:
+        summary = timer.finish(40.0)
+    finally:
+        unregister_timing_hook(received.append)
+
+    assert received == [summary]
+    assert summary["stages"]["generate"] == {"wall": 2.0, "cpu": 1.5, "calls": 2}
+    assert summary["stages"]["decode"]["calls"] == 1
+    assert summary["cpu_seconds"] == 1.9
+    assert [chunk["stages"]["generate"]["calls"] for chunk in summary["chunks"]] == [1, 1]
+    assert summary["chunks"][0]["repetition_stops"] == 1
+    assert summary["repetition_stops"] == 1
+    assert summary["processed_audio_seconds"] == 40.0
+    assert summary["rtf"] == round(summary["wall_seconds"] / 40.0, 4)
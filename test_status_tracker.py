@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Тесты инкрементального статуса задач
+"""
+
+from status_tracker import StatusTracker
+
+
+def test_delta_returns_only_changes():
+    """После курсора возвращаются только новые элементы"""
+    status = StatusTracker(progress=0, status="ready", chunks=["a", "b"], translations={})
+    cursor = status.snapshot()["version"]
+
+    status["status"] = "processing"
+    status.set_item("translations", "1", "перевод")
+
+    delta = status.delta(cursor)
+    assert delta["full"] is False
+    assert "chunks" not in delta
+    assert delta["changes"] == {"translations": {"1": "перевод"}}
+    assert delta["status"] == "processing"
+
+    empty = status.delta(delta["version"])
+    assert "changes" not in empty
+    assert empty["version"] == delta["version"]
+
+
+def test_reset_forces_full_snapshot():
+    """Перезапуск задачи делает старый курсор недействительным"""
+    status = StatusTracker(status="idle", results=[])
+    status.append("results", {"filename": "a.wav"})
+    cursor = status.version
+
+    status.reset(status="processing", results=[])
+    snapshot = status.delta(cursor)
+    assert snapshot["full"] is True
+    assert snapshot["results"] == []
+
+
+def test_list_collections_keep_legacy_shape():
+    """Списки читаются как раньше"""
+    status = StatusTracker(results=[])
+    status.append("results", {"filename": "a.wav"})
+    status.append("results", {"filename": "b.wav"})
+    assert [r["filename"] for r in status["results"]] == ["a.wav", "b.wav"]
+    assert status.delta(None)["results"][1]["filename"] == "b.wav"
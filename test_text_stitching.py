@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Тесты перекрывающихся окон и склейки текстов
+"""
+
+from text_stitching import overlap_overhead, overlapping_windows, stitch_texts
+
+
+def test_windows_cover_audio_with_overlap():
+    """Окна покрывают все аудио, соседние окна перекрываются"""
+    assert overlapping_windows(10, 30, 2) == [(0, 10)]
+    assert overlapping_windows(60, 30, 0) == [(0, 30), (30, 60)]
+    assert overlapping_windows(60, 30, 2) == [(0, 30), (28, 58), (56, 60)]
+    # Лишнее окно нужно, только если хвост не помещается в перекрытие
+    assert overlap_overhead(55, 30, overlapping_windows(55, 30, 2)) == 0
+    assert overlap_overhead(60, 30, overlapping_windows(60, 30, 2)) == 0.5
+
+
+def test_stitch_removes_duplicated_words():
+    """Повтор из перекрытия удаляется, искаженные слова на краю окна отбрасываются"""
+    texts = [
+        "Сегодня мы поговорим о погоде в Моск",
+        "погоде в Москве и области. Завтра ожидается дождь",
+    ]
+    assert stitch_texts(texts, overlap_seconds=2) == (
+        "Сегодня мы поговорим о погоде в Москве и области. Завтра ожидается дождь"
+    )
+    # Без совпадения тексты соединяются как есть
+    assert stitch_texts(["один два", "три четыре"], overlap_seconds=2) == "один два три четыре"
+    assert stitch_texts(["а", "", "б"]) == "а б"
+    # Общие слова вдали от стыка - не перекрытие
+    previous = "вчера было тепло и мы пошли домой вечером поздно"
+    following = "поздно ночью мы пошли в магазин за хлебом"
+    assert stitch_texts([previous, following], overlap_seconds=2) == f"{previous} {following}"
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Тесты повторов перевода против локальной имитации API
+"""
+
+import pytest
+
+from mock_openai_server import MockOpenAIServer
+from translation import TranslationProcessor
+
+
+def test_translation_through_mock_server():
+    """Обычный ответ разбирается как ответ OpenAI"""
+    with MockOpenAIServer() as server:
+        translator = TranslationProcessor(server.url, "token", model="mock")
+        assert translator.translate_text("hello") == "[перевод] hello"
+
+
+def test_rate_limit_honors_retry_after():
+    """После 429 пауза берется из Retry-After, а не из экспоненты"""
+    with MockOpenAIServer(rate_limit=1.0, retry_after=0.05) as server:
+        translator = TranslationProcessor(server.url, "token", model="mock")
+        response = translator.session.post(server.url, json={"messages": []})
+        assert response.status_code == 429
+        assert translator._retry_delay(response, attempt=5) == 0.05
+
+
+def test_last_rate_limited_attempt_fails_without_waiting(monkeypatch):
+    """429 на последней попытке сразу дает ошибку, без паузы и лишнего повтора"""
+    import time
+
+    import metrics
+
+    sleeps = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    retries = metrics.translation_retries.value(status="429")
+    with MockOpenAIServer(rate_limit=1.0, retry_after=30) as server:
+        translator = TranslationProcessor(server.url, "token", model="mock")
+        with pytest.raises(Exception, match="429"):
+            translator.translate_text("hello", retry_count=2)
+    assert sleeps == [30.0]
+    assert metrics.translation_retries.value(status="429") - retries == 1
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Тесты возобновляемой загрузки файлов частями
+"""
+
+import hashlib
+import io
+import threading
+
+import pytest
+
+from uploads import ChunkedUploadManager, UploadError
+
+DATA = bytes(range(256)) * 40
+
+
+def make_manager(tmp_path, **kwargs):
+    return ChunkedUploadManager(tmp_path / "uploads", decode_early=False, **kwargs)
+
+
+def test_size_is_required(tmp_path):
+    """Без размера загрузка не создается: ее окончание нельзя определить"""
+    manager = make_manager(tmp_path)
+    with pytest.raises(UploadError) as error:
+        manager.create("a.wav", None)
+    assert error.value.status_code == 400
+    with pytest.raises(UploadError):
+        manager.create("a.wav", -1)
+
+
+def test_offsets_duplicates_and_completion(tmp_path):
+    """Части принимаются только по текущему смещению, повтор части отклоняется"""
+    manager = make_manager(tmp_path)
+    upload = manager.create("a.wav", len(DATA), sha256=hashlib.sha256(DATA).hexdigest())
+
+    # Часть не с начала файла
+    with pytest.raises(UploadError) as error:
+        manager.append(upload.id, 100, io.BytesIO(DATA[100:200]))
+    assert error.value.status_code == 409
+    with pytest.raises(UploadError):
+        manager.append(upload.id, None, io.BytesIO(DATA))
+
+    manager.append(upload.id, 0, io.BytesIO(DATA[:4000]))
+    # Повтор той же части (клиент не получил ответ)
+    with pytest.raises(UploadError) as error:
+        manager.append(upload.id, 0, io.BytesIO(DATA[:4000]))
+    assert error.value.status_code == 409
+    assert upload.offset == 4000 and not upload.completed
+
+    # Данные сверх заявленного размера откатываются
+    with pytest.raises(UploadError) as error:
+        manager.append(upload.id, 4000, io.BytesIO(DATA[4000:] + b"x"))
+    assert error.value.status_code == 413
+    assert upload.offset == 4000
+
+    manager.append(upload.id, 4000, io.BytesIO(DATA[4000:]))
+    assert manager.wait(upload.id) is upload
+    assert upload.completed and upload.sha256 == hashlib.sha256(DATA).hexdigest()
+    assert upload.path.read_bytes() == DATA
+    with pytest.raises(UploadError) as error:
+        manager.append(upload.id, len(DATA), io.BytesIO(b"x"))
+    assert error.value.status_code == 409
+
+
+def test_hash_mismatch_and_discard(tmp_path):
+    """Неверный хэш удаляет загрузку, отмена будит ожидающую задачу"""
+    manager = make_manager(tmp_path)
+    upload = manager.create("a.wav", 10, sha256="0" * 64)
+    with pytest.raises(UploadError) as error:
+        manager.append(upload.id, 0, io.BytesIO(b"0123456789"))
+    assert error.value.status_code == 460
+    assert manager.get(upload.id) is None and not upload.path.exists()
+
+    upload = manager.create("b.wav", 10)
+    waited = []
+    thread = threading.Thread(target=lambda: waited.append(manager.wait(upload.id)))
+    thread.start()
+    manager.discard(upload.id)
+    thread.join(5)
+    assert waited and waited[0].error == "Загрузка отменена"
+    assert not upload.path.exists()
+    with pytest.raises(UploadError) as error:
+        manager.append(upload.id, 0, io.BytesIO(b"x"))
+    assert error.value.status_code == 404
+
+
+def test_idle_timeout(tmp_path):
+    """Загрузка без новых данных дольше idle_timeout считается прерванной"""
+    manager = make_manager(tmp_path, idle_timeout=0.5)
+    upload = manager.create("a.wav", 10)
+    manager.append(upload.id, 0, io.BytesIO(b"01234"))
+    assert manager.wait(upload.id).error.startswith("Загрузка прервана")
+    with pytest.raises(UploadError) as error:
+        manager.append(upload.id, 5, io.BytesIO(b"56789"))
+    assert error.value.status_code == 410
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Тесты фоновой загрузки модели
+"""
+
+import threading
+
+import pytest
+
+from warmup import ModelWarmup
+
+
+def test_warmup_loads_once_and_reports_ready():
+    """Модель загружается один раз в фоне, статус переходит в ready"""
+    release = threading.Event()
+    created = []
+
+    def factory():
+        release.wait(5)
+        created.append(object())
+        return created[-1]
+
+    warmup = ModelWarmup(factory, warm=False)
+    warmup.start()
+    assert warmup.status()["state"] == "loading"
+    assert not warmup.ready
+
+    release.set()
+    processor = warmup.get(timeout=5)
+    assert warmup.get() is processor
+    assert len(created) == 1
+    status = warmup.status()
+    assert status["ready"] and status["state"] == "ready"
+    assert status["load_seconds"] >= 0
+
+
+def test_warmup_retries_after_error():
+    """После ошибки загрузки следующий get() пробует снова"""
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise Exception("нет весов")
+        return "model"
+
+    warmup = ModelWarmup(factory, warm=False)
+    with pytest.raises(Exception, match="нет весов"):
+        warmup.get(timeout=5)
+    assert warmup.status()["state"] == "error"
+    assert warmup.get(timeout=5) == "model"
+    assert len(attempts) == 2
+
+
+def test_warmup_releases_model_to_manager():
+    """После прогрева модель возвращается менеджеру и может быть выгружена"""
+    from test_model_manager import MB, FakeProcessor
+
+    from model_manager import ModelManager
+
+    manager = ModelManager(
+        lambda name: FakeProcessor(name, 2), budget=3 * MB, estimate=lambda name: 2 * MB,
+    )
+    warmup = ModelWarmup(
+        lambda: manager.acquire("default"), warm=False,
+        release=lambda processor: manager.release("default"),
+    )
+    warmup.start()
+    warmup._done.wait(5)
+    assert warmup.ready
+    assert manager.status()["models"][0]["in_use"] == 0
+
+    with manager.use("small"):
+        pass
+    assert [entry["name"] for entry in manager.status()["models"]] == ["small"]
+
+
+def test_warmup_releases_model_after_failed_warm_up(monkeypatch):
+    """Ошибка прогрева не оставляет модель занятой"""
+    from test_model_manager import MB, FakeProcessor
+
+    import warmup as warmup_module
+    from model_manager import ModelManager
+
+    def failing_warm_up(processor):
+        raise Exception("ошибка прогрева")
+
+    monkeypatch.setattr(warmup_module, "warm_up", failing_warm_up)
+    manager = ModelManager(
+        lambda name: FakeProcessor(name, 2), budget=3 * MB, estimate=lambda name: 2 * MB,
+    )
+    warmup = ModelWarmup(
+        lambda: manager.acquire("default"),
+        release=lambda processor: manager.release("default"),
+    )
+    for _ in range(2):
+        warmup.reset()
+        warmup.start()
+        warmup._done.wait(5)
+        assert warmup.status()["state"] == "error"
+        assert manager.status()["models"][0]["in_use"] == 0
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Тесты наблюдения за папками
+"""
+
+import pytest
+
+from watch_folder import Debouncer, InotifyWatcher, PollingWatcher
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_debouncer_waits_until_file_stops_changing(tmp_path):
+    """Файл готов только после settle секунд без изменений"""
+    clock = FakeClock()
+    debouncer = Debouncer(settle=5, clock=clock)
+    audio = tmp_path / "a.wav"
+    audio.write_bytes(b"1")
+    debouncer.touch(audio)
+
+    clock.now = 3
+    audio.write_bytes(b"12")
+    assert debouncer.ready() == []
+
+    clock.now = 7
+    assert debouncer.ready() == []
+
+    clock.now = 8
+    assert debouncer.ready() == [audio]
+    assert len(debouncer) == 0
+
+
+@pytest.mark.parametrize("watcher_class", [InotifyWatcher, PollingWatcher])
+def test_watchers_report_new_audio_in_new_folders(tmp_path, watcher_class):
+    """Новые аудиофайлы находятся и во вложенных папках, прочие файлы - нет"""
+    formats = {".wav", ".mp3"}
+    try:
+        watcher = watcher_class([tmp_path], formats)
+    except OSError:
+        pytest.skip("inotify недоступен")
+
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "new.mp3").write_bytes(b"1")
+    (tmp_path / "notes.txt").write_bytes(b"1")
+
+    changed = set()
+    for _ in range(5):
+        changed |= watcher.changes(0.2)
+    watcher.close()
+    assert tmp_path / "sub" / "new.mp3" in changed
+    assert tmp_path / "notes.txt" not in changed
+
+
+def test_files_from_crashed_pool_are_retried(tmp_path, monkeypatch):
+    """После аварии пула файлы снова ждут в очереди, повторно падающий отмечается ошибкой"""
+    from concurrent.futures import Future
+    from concurrent.futures.process import BrokenProcessPool
+
+    import watch_folder
+    from file_index import FileIndex
+
+    class FakePool:
+        def shutdown(self, wait=True):
+            pass
+
+    clock = FakeClock()
+    daemon = object.__new__(watch_folder.WatchDaemon)
+    daemon.index = FileIndex(tmp_path / "index.db")
+    daemon.debouncer = Debouncer(settle=0, clock=clock)
+    daemon.translator = None
+    daemon._executor = FakePool()
+    daemon._pending = {}
+    daemon._crashes = {}
+    monkeypatch.setattr(daemon, "_start_pool", FakePool, raising=False)
+
+    def submit(path):
+        future = Future()
+        daemon._pending[future] = (path, tmp_path / f"{path.stem}.txt", path.stat())
+        return future
+
+    crashed, waiting = tmp_path / "a.wav", tmp_path / "b.wav"
+    for path in (crashed, waiting):
+        path.write_bytes(b"RIFF")
+    # Файл, ожидавший в том же пуле, возвращается в очередь
+    broken = submit(crashed)
+    queued = submit(waiting)
+    broken.set_exception(BrokenProcessPool("crash"))
+    daemon.collect_finished()
+    assert daemon._pending == {} and queued.cancelled()
+    assert daemon.debouncer.ready() == [crashed, waiting]
+
+    # Файл, на котором пул падает каждый раз, в итоге отмечается ошибкой
+    for attempt in range(watch_folder.MAX_CRASH_RETRIES):
+        submit(crashed).set_exception(BrokenProcessPool("crash"))
+        daemon.collect_finished()
+        retried = attempt + 1 < watch_folder.MAX_CRASH_RETRIES
+        assert daemon.debouncer.ready() == ([crashed] if retried else [])
+    assert daemon.index.get(crashed)["status"] == "failed"
+    assert daemon.index.get(waiting) is None
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Тесты чтения WAV через отображение в память
+"""
+
+import wave
+
+import numpy as np
+
+from wav_io import open_wav_samples
+
+
+def write_wav(path, frames: bytes, channels: int, width: int, rate: int = 16000):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(width)
+        f.setframerate(rate)
+        f.writeframes(frames)
+
+
+def test_pcm16_stereo_is_mixed_to_mono_lazily(tmp_path):
+    """Срез переводится в моно float32, частота не 16 кГц - обычный путь"""
+    left = np.arange(-1000, 1000, dtype=np.int16)
+    right = -left // 2
+    path = tmp_path / "stereo.wav"
+    write_wav(path, np.stack([left, right], axis=1).tobytes(), channels=2, width=2)
+
+    samples = open_wav_samples(path)
+    assert len(samples) == 2000
+    expected = (left.astype(np.float32) + right) / 2 / 32767
+    np.testing.assert_allclose(samples[10:20], expected[10:20], rtol=1e-6)
+    np.testing.assert_allclose(np.asarray(samples), expected, rtol=1e-6)
+
+    write_wav(tmp_path / "44k.wav", left.tobytes(), channels=1, width=2, rate=44100)
+    assert open_wav_samples(tmp_path / "44k.wav") is None
+
+
+def test_pcm24(tmp_path):
+    """24-битные сэмплы собираются из байтов со знаком"""
+    values = np.array([-(1 << 23), -1, 0, 1, (1 << 23) - 1], dtype=np.int32)
+    raw = np.stack([values & 0xFF, (values >> 8) & 0xFF, (values >> 16) & 0xFF], axis=1)
+    path = tmp_path / "24.wav"
+    write_wav(path, raw.astype(np.uint8).tobytes(), channels=1, width=3)
+
+    np.testing.assert_allclose(open_wav_samples(path)[:], values / (1 << 23), rtol=1e-6)
+
+
+def test_transcribers_release_mapped_wav(tmp_path, monkeypatch):
+    """WAV, открытый самим транскрибатором, закрывается; переданные сэмплы - нет"""
+    import transcription
+    import wav_io
+    from benchmark import offline_transcriber, tiny_whisper
+    from backends import TorchBackend
+
+    closed = []
+    monkeypatch.setattr(wav_io.WavSamples, "close", lambda self: closed.append(self.path.name))
+    model, processor = tiny_whisper()
+    path = tmp_path / "silence.wav"
+    write_wav(path, np.zeros(16000, dtype=np.int16).tobytes(), 1, 2)
+
+    simple = offline_transcriber(model, processor)
+    assert simple.transcribe_file(path)["success"]
+    assert closed == ["silence.wav"]
+    samples = open_wav_samples(path)
+    assert simple.transcribe_file(path, samples=samples)["success"]
+    assert closed == ["silence.wav"]
+
+    full = transcription.TranscriptionProcessor.__new__(transcription.TranscriptionProcessor)
+    full.device, full.torch_dtype = "cpu", None
+    full.processor, full.backend, full.scheduler = processor, TorchBackend(model), None
+    full.transcribe_file(path)
+    assert closed == ["silence.wav", "silence.wav"]
@@ -1,5 +1,4 @@
 import re
-import nltk
 from typing import List
 import os
 
@@ -11,6 +10,9 @@ class TextProcessor:
     
     def _download_nltk_data(self):
         """Скачивание необходимых данных NLTK"""
+        # NLTK импортируется при первом использовании: сервер стартует быстрее
+        import nltk
+
         try:
             # Проверяем, есть ли уже скачанные данные
             nltk.data.find('tokenizers/punkt')
@@ -33,6 +35,8 @@ class TextProcessor:
         """
         try:
             # Попытка использовать NLTK
+            import nltk
+
             sentences = nltk.sent_tokenize(text, language='russian')
             return [s.strip() for s in sentences if s.strip()]
         except:
@@ -0,0 +1,129 @@
+"""
+Перекрывающиеся окна аудио и склейка их текстов
+
+Жесткие разрезы по 30 секунд делят слова на границе чанков, и эти слова
+искажаются или теряются. В режиме с перекрытием соседние окна имеют общий
+участок аудио, а при склейке повтор из перекрытия находится сравнением
+слов конца предыдущего текста с началом следующего и удаляется. Слова у
+самого края окна распознаются хуже всего, поэтому от предыдущего окна
+берется текст до совпадения, а от следующего - начиная с него.
+"""
+
+import math
+import os
+import re
+from difflib import SequenceMatcher
+from typing import List, Optional, Tuple
+
+# Перекрытие 30-секундных окон в секундах (0 - жесткие разрезы)
+CHUNK_OVERLAP = float(os.environ.get("TRANSCRIPTION_CHUNK_OVERLAP", 0))
+
+# Примерный темп речи с запасом: сколько слов искать в перекрытии на секунду
+WORDS_PER_SECOND = 4
+# Сколько искаженных слов у края окна может отделять совпадение от стыка
+EDGE_WORDS = 2
+
+
+def overlapping_windows(n_samples: int, window: int, overlap: int = 0) -> List[Tuple[int, int]]:
+    """
+    Границы окон с перекрытием
+
+    Args:
+        n_samples: Длина аудио в сэмплах
+        window: Длина окна в сэмплах
+        overlap: Перекрытие соседних окон в сэмплах
+
+    Returns:
+        List[Tuple[int, int]]: Пары (начало, конец)
+    """
+    if overlap < 0 or overlap >= window:
+        raise Exception("Перекрытие должно быть неотрицательным и меньше окна")
+    step = window - overlap
+    bounds = []
+    start = 0
+    while True:
+        end = min(start + window, n_samples)
+        bounds.append((start, end))
+        if end >= n_samples:
+            return bounds
+        start += step
+
+
+def overlap_overhead(n_samples: int, window: int, bounds: List[Tuple[int, int]]) -> float:
+    """
+    Доля лишних окон по сравнению с жесткими разрезами
+
+    Whisper дополняет каждое окно до 30 секунд, поэтому стоимость
+    транскрибации определяется числом окон, а не длиной перекрытия.
+
+    Returns:
+        float: 0 - столько же окон, 0.5 - в полтора раза больше
+    """
+    hard_cuts = max(1, math.ceil(n_samples / window))
+    return round(len(bounds) / hard_cuts - 1, 4)
+
+
+def _normalize(words: List[str]) -> List[str]:
+    normalized = []
+    for i, word in enumerate(words):
+        key = re.sub(r"[^\w]", "", word.lower())
+        # Знаки препинания не должны совпадать друг с другом
+        normalized.append(key or f"\0{i}")
+    return normalized
+
+
+def stitch_pair(previous: List[str], following: List[str], search_words: int,
+                min_match: int = 2) -> List[str]:
+    """
+    Склейка слов двух соседних окон
+
+    Args:
+        previous: Слова предыдущего окна (или уже склеенного текста)
+        following: Слова следующего окна
+        search_words: Сколько слов конца и начала сравнивать
+        min_match: Минимальная длина совпадения; при более коротком
+            совпадении тексты просто соединяются
+
+    Returns:
+        List[str]: Слова без повтора из перекрытия
+    """
+    tail = previous[-search_words:]
+    head = following[:search_words]
+    matcher = SequenceMatcher(None, _normalize(tail), _normalize(head), autojunk=False)
+    match = matcher.find_longest_match(0, len(tail), 0, len(head))
+    if match.size < min_match:
+        return previous + following
+    # Повтор из перекрытия стоит на самом стыке: совпадение в глубине окон -
+    # просто одинаковые слова, и резать по нему нельзя
+    if len(tail) - (match.a + match.size) > EDGE_WORDS or match.b > EDGE_WORDS:
+        return previous + following
+    cut = len(previous) - len(tail) + match.a
+    return previous[:cut] + following[match.b:]
+
+
+def stitch_texts(texts: List[str], overlap_seconds: float = 0.0,
+                 search_words: Optional[int] = None, min_match: int = 2) -> str:
+    """
+    Склейка текстов окон в один текст
+
+    Args:
+        texts: Тексты окон по порядку
+        overlap_seconds: Перекрытие окон (0 - тексты соединяются пробелом)
+        search_words: Сколько слов сравнивать на стыке (по умолчанию
+            по длине перекрытия)
+        min_match: Минимальная длина совпадения в словах
+
+    Returns:
+        str: Итоговый текст
+    """
+    texts = [text.strip() for text in texts]
+    if overlap_seconds <= 0:
+        return " ".join(text for text in texts if text)
+    if search_words is None:
+        search_words = max(8, int(overlap_seconds * WORDS_PER_SECOND * 2))
+
+    words: List[str] = []
+    for text in texts:
+        following = text.split()
+        words = stitch_pair(words, following, search_words, min_match) if words else following
+    return " ".join(words)
@@ -1,5 +1,5 @@
 import io
-import math
+import time
 from pathlib import Path
 
 # Папка для хранения скачанных моделей
@@ -9,6 +9,17 @@ import numpy as np
 from pydub import AudioSegment
 from tqdm import tqdm
 
+import metrics
+from audio_pipeline import Prefetcher, timed
+from backends import BACKEND, create_backend
+from batch_scheduler import chunk_scheduler
+from decoding import FileLanguage, generate_chunk
+from features import LogMelExtractor
+from model_manifest import find_local_model
+from stage_timer import StageTimer
+from text_stitching import CHUNK_OVERLAP, overlap_overhead, overlapping_windows, stitch_texts
+from wav_io import open_wav_samples
+
 # Проверяем наличие PyTorch и Transformers
 try:
     import torch
@@ -19,8 +30,13 @@ except ImportError:
 
 class TranscriptionProcessor:
     """Класс для транскрибации аудиофайлов с помощью Whisper"""
+
+    # Перекрытие 30-секундных окон в секундах (0 - жесткие разрезы)
+    chunk_overlap = CHUNK_OVERLAP
     
-    def __init__(self):
+    def __init__(self, chunk_overlap=None, backend=None):
+        if chunk_overlap is not None:
+            self.chunk_overlap = chunk_overlap
         if not TRANSFORMERS_AVAILABLE:
             raise ImportError("PyTorch и Transformers не установлены. Для полной функциональности транскрибации необходимо установить: pip install torch transformers")
         
@@ -28,10 +44,36 @@ class TranscriptionProcessor:
         self.torch_dtype = torch.float16 if self.device == 'cuda' else torch.float32
         self.model = None
         self.processor = None
+        started = time.perf_counter()
         self._load_model()
+        self.backend = create_backend(self.model, backend or BACKEND)
+        # Чанки файлов, транскрибируемых параллельно, генерируются батчами
+        self.scheduler = chunk_scheduler(self.backend, self._decode)
+        metrics.model_load_seconds.set(
+            time.perf_counter() - started, model=self.model.name_or_path
+        )
     
+    def _decode(self, output):
+        """Тексты строк результата generate()"""
+        return self.processor.batch_decode(output, skip_special_tokens=True)
+
     def _load_model(self):
         """Загрузка модели Whisper"""
+        # Снимок из манифеста models/ загружается без обращения к хабу
+        local = find_local_model(MODELS_DIR)
+        if local is not None:
+            repo_id, snapshot_path = local
+            self.model = WhisperForConditionalGeneration.from_pretrained(
+                snapshot_path,
+                torch_dtype=self.torch_dtype,
+                low_cpu_mem_usage=True,
+                use_safetensors=True,
+                local_files_only=True,
+            ).to(self.device)
+            self.processor = WhisperProcessor.from_pretrained(snapshot_path, local_files_only=True)
+            self.model.name_or_path = repo_id
+            return
+
         try:
             # Загружаем модель и процессор
             self.model = WhisperForConditionalGeneration.from_pretrained(
@@ -77,67 +119,94 @@ class TranscriptionProcessor:
             dict: Результат транскрибации с текстом и путем к выходному файлу
         """
         file_path = Path(file_path)
+        timer = StageTimer(file_path.name)
+        samples = None
         
         try:
-            # Чтение аудиофайла
-            with open(file_path, "rb") as f:
-                audio_bytes = f.read()
-            
-            # Определение формата файла
-            audio_format = file_path.suffix.lower().lstrip('.')
-            if audio_format == 'mp3':
-                audio = AudioSegment.from_mp3(io.BytesIO(audio_bytes))
-            elif audio_format in ['wav', 'wave']:
-                audio = AudioSegment.from_wav(io.BytesIO(audio_bytes))
-            elif audio_format == 'flac':
-                audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format="flac")
-            elif audio_format in ['m4a', 'mp4']:
-                audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format="mp4")
-            elif audio_format == 'ogg':
-                audio = AudioSegment.from_ogg(io.BytesIO(audio_bytes))
+            # Быстрый путь: WAV 16 кГц отображается в память без pydub и копий
+            if file_path.suffix.lower() in ('.wav', '.wave'):
+                with timer.stage("mmap"):
+                    samples = open_wav_samples(file_path, 16000)
+            if samples is not None:
+                sr = 16000
             else:
-                audio = AudioSegment.from_file(io.BytesIO(audio_bytes))
+                # Чтение аудиофайла
+                with timer.stage("read"), open(file_path, "rb") as f:
+                    audio_bytes = f.read()
+            
+                # Определение формата файла
+                audio_format = file_path.suffix.lower().lstrip('.')
+                with timer.stage("decode"):
+                    if audio_format == 'mp3':
+                        audio = AudioSegment.from_mp3(io.BytesIO(audio_bytes))
+                    elif audio_format in ['wav', 'wave']:
+                        audio = AudioSegment.from_wav(io.BytesIO(audio_bytes))
+                    elif audio_format == 'flac':
+                        audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format="flac")
+                    elif audio_format in ['m4a', 'mp4']:
+                        audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format="mp4")
+                    elif audio_format == 'ogg':
+                        audio = AudioSegment.from_ogg(io.BytesIO(audio_bytes))
+                    else:
+                        audio = AudioSegment.from_file(io.BytesIO(audio_bytes))
             
-            # Конвертация в моно и 16kHz
-            audio = audio.set_channels(1).set_sample_width(2).set_frame_rate(16000)
-            samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
-            samples = samples / 32768.0  # Нормализуем в диапазон [-1, 1]
+                # Конвертация в моно и 16kHz
+                with timer.stage("resample"):
+                    audio = audio.set_channels(1).set_sample_width(2).set_frame_rate(16000)
+                with timer.stage("to_array"):
+                    samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+                    samples = samples / 32768.0  # Нормализуем в диапазон [-1, 1]
             
-            sr = audio.frame_rate  # Обычно 16000
+                sr = audio.frame_rate  # Обычно 16000
             
-            # Разбиваем на чанки по 30 секунд
+            # Разбиваем на чанки по 30 секунд (с перекрытием, если задано)
             chunk_s = 30
             chunk_sz = chunk_s * sr
-            n_chunks = math.ceil(len(samples) / chunk_sz)
+            # Перекрытие кратно шагу кадров признаков (10 мс)
+            overlap = int(self.chunk_overlap * sr) // 160 * 160
+            windows = overlapping_windows(len(samples), chunk_sz, overlap)
+            if self.chunk_overlap:
+                timer.info["overlap_overhead"] = overlap_overhead(len(samples), chunk_sz, windows)
             texts = []
             
-            for i in tqdm(range(n_chunks), desc=f"Транскрибация {file_path.name}"):
-                start = i * chunk_sz
-                end = min((i + 1) * chunk_sz, len(samples))
-                chunk = samples[start:end]
-                if len(chunk) == 0:
-                    continue
-                
+            mel = LogMelExtractor(self.processor.feature_extractor)
+
+            def chunk_inputs(bounds):
                 # Подготовка входов с attention_mask
-                inputs = self.processor(
-                    chunk,
-                    return_tensors="pt",
-                    sampling_rate=sr,
-                    return_attention_mask=True
-                )
-                inputs = {
-                    k: v.to(device=self.device, dtype=self.torch_dtype if v.dtype.is_floating_point else torch.long)
-                    for k, v in inputs.items()
+                features, attention_mask = mel.windows(samples, [bounds], return_attention_mask=True)
+                return {
+                    "input_features": features.to(device=self.device, dtype=self.torch_dtype),
+                    "attention_mask": attention_mask.to(self.device),
                 }
+
+            # Язык определяется один раз на файл
+            language = FileLanguage(self.backend)
+
+            # Признаки следующих чанков считаются в фоне во время генерации
+            windows = [(start, end) for start, end in windows if end > start]
+            prefetcher = Prefetcher(windows, timed(chunk_inputs))
+            for i, ((start, end), prepared) in enumerate(tqdm(prefetcher, total=len(windows), desc=f"Транскрибация {file_path.name}")):
+                timer.start_chunk(i, (end - start) / sr)
+                inputs, features_wall, features_cpu = prepared
+                timer.record("features", features_wall, features_cpu)
+                timer.record("features_wait", prefetcher.last_wait, 0.0)
                 
-                # Генерация транскрипции
-                with torch.no_grad():
-                    out = self.model.generate(**inputs)
-                transcription = self.processor.batch_decode(out, skip_special_tokens=True)[0]
+                # Генерация транскрипции с лимитом токенов по длительности речи
+                transcription = generate_chunk(
+                    self.backend,
+                    self._decode,
+                    inputs,
+                    samples[start:end],
+                    timer,
+                    language,
+                    scheduler=self.scheduler,
+                )
                 texts.append(transcription)
+                timer.end_chunk()
             
             # Объединяем результат
-            full_text = " ".join(texts)
+            with timer.stage("stitch"):
+                full_text = stitch_texts(texts, self.chunk_overlap)
             
             # Сохраняем результат
             output_path = file_path.with_suffix(file_path.suffix + ".txt")
@@ -146,11 +215,17 @@ class TranscriptionProcessor:
             
             return {
                 'text': full_text,
-                'output_file': str(output_path)
+                'output_file': str(output_path),
+                'timings': timer.finish(len(samples) / sr)
             }
             
         except Exception as e:
             raise Exception(f"Ошибка при транскрибации файла {file_path.name}: {str(e)}")
+        finally:
+            # Отображение WAV в память освобождается сразу: процесс
+            # приложения живет долго и транскрибирует много файлов
+            if hasattr(samples, "close"):
+                samples.close()
     
     def get_model_info(self):
         """Возвращает информацию о загруженной модели"""
@@ -158,5 +233,6 @@ class TranscriptionProcessor:
             'device': self.device,
             'dtype': str(self.torch_dtype),
             'model_loaded': self.model is not None,
-            'processor_loaded': self.processor is not None
+            'processor_loaded': self.processor is not None,
+            'backend': self.backend.name if self.model is not None else None
         }
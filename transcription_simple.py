@@ -5,6 +5,7 @@ import os
 import sys
 import subprocess
 import io
+import time
 from pathlib import Path
 
 # Папка для сохранения моделей, чтобы не скачивать их повторно
@@ -13,16 +14,51 @@ MODELS_DIR.mkdir(exist_ok=True)
 from pydub import AudioSegment
 from tqdm import tqdm
 
+import metrics
+from audio_pipeline import Prefetcher, timed
+from backends import BACKEND, create_backend
+from batch_scheduler import chunk_scheduler
+from decoding import FileLanguage, generate_chunk
+from features import FEATURE_BLOCK_WINDOWS, LogMelExtractor
+from model_manifest import MODEL_CANDIDATES, find_local_model
+from stage_timer import StageTimer
+from text_stitching import CHUNK_OVERLAP, overlap_overhead, overlapping_windows, stitch_texts
+from wav_io import open_wav_samples
+
 class TranscriptionProcessor:
     """Класс для транскрибации аудиофайлов с помощью Whisper"""
+
+    # Перекрытие 30-секундных окон в секундах (0 - жесткие разрезы)
+    chunk_overlap = CHUNK_OVERLAP
     
-    def __init__(self):
+    def __init__(self, chunk_overlap=None, backend=None, model_name=None):
+        """
+        Args:
+            chunk_overlap: Перекрытие окон в секундах (по умолчанию
+                TRANSCRIPTION_CHUNK_OVERLAP)
+            backend: Движок вывода torch или onnx (по умолчанию
+                TRANSCRIPTION_BACKEND)
+            model_name: Модель на хабе (по умолчанию русская large-v3
+                с запасной базовой)
+        """
+        if chunk_overlap is not None:
+            self.chunk_overlap = chunk_overlap
+        self.model_name = model_name
         self.device = 'cpu'
         self.torch_dtype = None
         self.model = None
         self.processor = None
+        self.backend = None
+        self.scheduler = None
         self._check_and_install_deps()
+        started = time.perf_counter()
         self._load_model()
+        self.backend = create_backend(self.model, backend or BACKEND)
+        # Чанки файлов, транскрибируемых параллельно, генерируются батчами
+        self.scheduler = chunk_scheduler(self.backend, self._decode)
+        metrics.model_load_seconds.set(
+            time.perf_counter() - started, model=self.model.name_or_path
+        )
     
     def _check_and_install_deps(self):
         """Проверка и установка зависимостей"""
@@ -71,82 +107,95 @@ class TranscriptionProcessor:
             from transformers import WhisperForConditionalGeneration, WhisperProcessor
             
             print("🔄 Загрузка модели Whisper...")
-            
-            # Загружаем русскую модель
-            try:
-                self.model = WhisperForConditionalGeneration.from_pretrained(
-                    "antony66/whisper-large-v3-russian",
-                    torch_dtype=self.torch_dtype,
-                    low_cpu_mem_usage=True,
-                    use_safetensors=True,
-                    cache_dir=MODELS_DIR,
-                ).to(self.device)
 
-                self.processor = WhisperProcessor.from_pretrained(
-                    "antony66/whisper-large-v3-russian",
-                    cache_dir=MODELS_DIR,
-                )
-                print("✅ Загружена русская модель Whisper Large V3")
-                
-            except Exception as e:
-                print(f"⚠️ Ошибка загрузки русской модели: {e}")
-                print("🔄 Загрузка базовой модели...")
-                
-                # Fallback к базовой модели
+            # Снимок из манифеста models/ загружается без обращения к хабу
+            candidates = [self.model_name] if self.model_name else MODEL_CANDIDATES
+            local = find_local_model(MODELS_DIR, candidates)
+            if local is not None:
+                repo_id, snapshot_path = local
                 self.model = WhisperForConditionalGeneration.from_pretrained(
-                    "openai/whisper-large-v3",
+                    snapshot_path,
                     torch_dtype=self.torch_dtype,
                     low_cpu_mem_usage=True,
                     use_safetensors=True,
-                    cache_dir=MODELS_DIR,
+                    local_files_only=True,
                 ).to(self.device)
+                self.processor = WhisperProcessor.from_pretrained(snapshot_path, local_files_only=True)
+                self.model.name_or_path = repo_id
+                print(f"✅ Загружена модель {repo_id} из {snapshot_path}")
+                return
+
+            # Модели по очереди: русская, при ошибке - базовая
+            for position, repo_id in enumerate(candidates):
+                try:
+                    self.model = WhisperForConditionalGeneration.from_pretrained(
+                        repo_id,
+                        torch_dtype=self.torch_dtype,
+                        low_cpu_mem_usage=True,
+                        use_safetensors=True,
+                        cache_dir=MODELS_DIR,
+                    ).to(self.device)
+
+                    self.processor = WhisperProcessor.from_pretrained(
+                        repo_id,
+                        cache_dir=MODELS_DIR,
+                    )
+                    print(f"✅ Загружена модель {repo_id}")
+                    return
+
+                except Exception as e:
+                    if position == len(candidates) - 1:
+                        raise
+                    print(f"⚠️ Ошибка загрузки модели {repo_id}: {e}")
+                    print("🔄 Загрузка запасной модели...")
 
-                self.processor = WhisperProcessor.from_pretrained(
-                    "openai/whisper-large-v3",
-                    cache_dir=MODELS_DIR,
-                )
-                print("✅ Загружена базовая модель Whisper Large V3")
-                
         except Exception as e:
             raise Exception(f"Критическая ошибка загрузки модели: {e}")
     
-    def transcribe_file(self, file_path, progress_callback=None):
+    @staticmethod
+    def load_audio(file_path, timer=None):
         """
-        Транскрибация одного аудиофайла
-        
+        Декодирование аудиофайла в моно 16 кГц (модель не нужна)
+
         Args:
             file_path: Путь к аудиофайлу
-            
+            timer: StageTimer для замера этапов
+
         Returns:
-            dict: Результат транскрибации с текстом и путем к выходному файлу
+            np.ndarray: Сэмплы float32 в диапазоне [-1, 1] (для WAV 16 кГц -
+            WavSamples, переводящий в float32 только нужные участки)
         """
-        if not self.model or not self.processor:
-            raise Exception("Модель не загружена")
-            
+        import numpy as np
+
         file_path = Path(file_path)
+        timer = timer or StageTimer(file_path.name)
+
+        # Проверка существования файла
+        if not file_path.exists():
+            raise Exception(f"Файл не найден: {file_path}")
+
+        # Быстрый путь: WAV 16 кГц отображается в память без pydub и копий
+        if file_path.suffix.lower() in ('.wav', '.wave'):
+            with timer.stage("mmap"):
+                samples = open_wav_samples(file_path, 16000)
+            if samples is not None:
+                return samples
         
+        # Чтение аудиофайла
         try:
-            import torch
-            import numpy as np
-            
-            # Проверка существования файла
-            if not file_path.exists():
-                raise Exception(f"Файл не найден: {file_path}")
-            
-            # Чтение аудиофайла
-            try:
-                with open(file_path, "rb") as f:
-                    audio_bytes = f.read()
-            except Exception as e:
-                raise Exception(f"Ошибка чтения файла: {e}")
-            
-            # Определение формата файла
-            audio_format = file_path.suffix.lower().lstrip('.')
+            with timer.stage("read"), open(file_path, "rb") as f:
+                audio_bytes = f.read()
+        except Exception as e:
+            raise Exception(f"Ошибка чтения файла: {e}")
+        
+        # Определение формата файла
+        audio_format = file_path.suffix.lower().lstrip('.')
+        
+        try:
+            # Создаем новый BytesIO объект для каждого использования
+            audio_io = io.BytesIO(audio_bytes)
             
-            try:
-                # Создаем новый BytesIO объект для каждого использования
-                audio_io = io.BytesIO(audio_bytes)
-                
+            with timer.stage("decode"):
                 if audio_format == 'mp3':
                     audio = AudioSegment.from_mp3(audio_io)
                 elif audio_format in ['wav', 'wave']:
@@ -157,71 +206,159 @@ class TranscriptionProcessor:
                     audio = AudioSegment.from_file(audio_io, format='mp4')
                 else:
                     raise Exception(f"Неподдерживаемый формат аудио: {audio_format}")
-                    
-                # BytesIO будет автоматически закрыт при сборке мусора
                 
-            except Exception as e:
-                raise Exception(f"Ошибка декодирования аудио: {e}")
+            # BytesIO будет автоматически закрыт при сборке мусора
             
-            # Конвертация в моно 16кГц
+        except Exception as e:
+            raise Exception(f"Ошибка декодирования аудио: {e}")
+        
+        # Конвертация в моно 16кГц
+        with timer.stage("resample"):
             audio = audio.set_channels(1).set_frame_rate(16000)
-            
-            # Преобразование в numpy array
+        
+        # Преобразование в numpy array
+        with timer.stage("to_array"):
             audio_array = np.array(audio.get_array_of_samples(), dtype=np.float32)
             audio_array = audio_array / np.iinfo(np.int16).max  # Нормализация
+        return audio_array
+
+    def _decode(self, output):
+        """Тексты строк результата generate()"""
+        return self.processor.batch_decode(output, skip_special_tokens=True)
+
+    def _window_features(self, audio_array, bounds):
+        """Лог-мел признаки окон аудио на устройстве модели"""
+        if getattr(self, "_mel", None) is None:
+            self._mel = LogMelExtractor(self.processor.feature_extractor)
+        features, _ = self._mel.windows(audio_array, bounds)
+        return features.to(
+            device=self.device,
+            dtype=self.torch_dtype
+        )
+
+    def transcribe_samples(self, audio_array, progress_callback=None, timer=None,
+                           overlap_seconds=None):
+        """
+        Транскрибация уже декодированного аудио
+
+        Args:
+            audio_array: Сэмплы моно 16 кГц в диапазоне [-1, 1]
+            progress_callback: Функция, принимающая прогресс в процентах
+            timer: StageTimer для замера этапов
+            overlap_seconds: Перекрытие окон (по умолчанию chunk_overlap)
+
+        Returns:
+            str: Распознанный текст
+        """
+        timer = timer or StageTimer()
+
+        if overlap_seconds is None:
+            overlap_seconds = self.chunk_overlap
+
+        # Разбивка на чанки если файл большой; перекрытие кратно шагу
+        # кадров признаков (10 мс), чтобы окна нарезались из общей спектрограммы
+        chunk_length = 30 * 16000  # 30 секунд
+        overlap = int(overlap_seconds * 16000) // 160 * 160
+        windows = overlapping_windows(len(audio_array), chunk_length, overlap)
+        if overlap:
+            timer.info["overlap_overhead"] = overlap_overhead(len(audio_array), chunk_length, windows)
+
+        # Признаки считаются блоками окон в фоне, пока модель генерирует
+        # текст текущего чанка
+        blocks = [
+            windows[i:i + FEATURE_BLOCK_WINDOWS]
+            for i in range(0, len(windows), FEATURE_BLOCK_WINDOWS)
+        ]
+        prefetcher = Prefetcher(
+            blocks, timed(lambda block: self._window_features(audio_array, block))
+        )
+
+        def chunk_inputs():
+            index = 0
+            for block, (features, features_wall, features_cpu) in prefetcher:
+                for position, (start, end) in enumerate(block):
+                    timer.start_chunk(index, (end - start) / 16000)
+                    if position == 0:
+                        timer.record("features", features_wall, features_cpu)
+                        timer.record("features_wait", prefetcher.last_wait, 0.0)
+                    yield features[position:position + 1]
+                    index += 1
+
+        # Транскрибация чанков; язык определяется один раз на файл
+        language = FileLanguage(self.backend)
+        all_text = []
+        total_chunks = len(windows)
+        for i, input_features in enumerate(tqdm(chunk_inputs(), total=total_chunks, desc="Транскрибация")):
+            # Генерация с лимитом токенов по длительности речи в чанке
+            start, end = windows[i]
+            transcription = generate_chunk(
+                self.backend,
+                self._decode,
+                {"input_features": input_features},
+                audio_array[start:end],
+                timer,
+                language,
+                scheduler=self.scheduler,
+                num_beams=5,
+                early_stopping=True
+            )
+
+            all_text.append(transcription)
+            timer.end_chunk()
+
+            if progress_callback:
+                progress = ((i + 1) / total_chunks) * 100
+                try:
+                    progress_callback(progress)
+                except Exception:
+                    pass
+        
+        # Объединение результатов
+        with timer.stage("stitch"):
+            return stitch_texts(all_text, overlap_seconds)
+
+    @staticmethod
+    def prepare_file(file_path):
+        """
+        Декодирование файла заранее, в фоновом потоке (без модели)
+
+        Returns:
+            tuple: (сэмплы, StageTimer с этапами декодирования) для
+            transcribe_file(samples=..., decode_timer=...)
+        """
+        timer = StageTimer(Path(file_path).name)
+        return TranscriptionProcessor.load_audio(file_path, timer=timer), timer
+
+    def transcribe_file(self, file_path, progress_callback=None, samples=None,
+                        decode_timer=None):
+        """
+        Транскрибация одного аудиофайла
+        
+        Args:
+            file_path: Путь к аудиофайлу
+            progress_callback: Функция, принимающая прогресс в процентах
+            samples: Уже декодированное аудио (например, при потоковой загрузке);
+                если не передано, файл декодируется заново
+            decode_timer: Замер декодирования samples из prepare_file
             
-            # Разбивка на чанки если файл большой
-            chunk_length = 30 * 16000  # 30 секунд
-            chunks = []
-            
-            if len(audio_array) <= chunk_length:
-                chunks = [audio_array]
-            else:
-                for i in range(0, len(audio_array), chunk_length):
-                    chunks.append(audio_array[i:i + chunk_length])
+        Returns:
+            dict: Результат транскрибации с текстом и путем к выходному файлу
+        """
+        if not self.model or not self.processor:
+            raise Exception("Модель не загружена")
             
-            # Транскрибация чанков
-            all_text = []
-            total_chunks = len(chunks)
-            for i, chunk in enumerate(tqdm(chunks, desc="Транскрибация")):
-                # Подготовка входных данных
-                inputs = self.processor(
-                    chunk,
-                    sampling_rate=16000,
-                    return_tensors="pt"
-                )
-                input_features = inputs.input_features.to(
-                    device=self.device,
-                    dtype=self.torch_dtype
-                )
-                
-                # Генерация
-                with torch.no_grad():
-                    predicted_ids = self.model.generate(
-                        input_features,
-                        max_length=448,
-                        num_beams=5,
-                        early_stopping=True,
-                        return_dict_in_generate=True
-                    )
-                
-                # Декодирование
-                transcription = self.processor.batch_decode(
-                    predicted_ids.sequences, 
-                    skip_special_tokens=True
-                )[0]
-                
-                all_text.append(transcription.strip())
+        file_path = Path(file_path)
+        timer = StageTimer(file_path.name)
+        if decode_timer is not None:
+            timer.merge(decode_timer)
+        
+        # Аудио, переданное вызывающим, закрывает он сам
+        opened = None
+        try:
+            if samples is None:
+                samples = opened = self.load_audio(file_path, timer=timer)
 
-                if progress_callback:
-                    progress = ((i + 1) / total_chunks) * 100
-                    try:
-                        progress_callback(progress)
-                    except Exception:
-                        pass
-            
-            # Объединение результатов
-            final_text = " ".join(all_text)
+            final_text = self.transcribe_samples(samples, progress_callback, timer=timer)
             
             # Сохранение результата
             output_file = file_path.with_suffix('.txt')
@@ -231,7 +368,8 @@ class TranscriptionProcessor:
             return {
                 'text': final_text,
                 'output_file': str(output_file),
-                'success': True
+                'success': True,
+                'timings': timer.finish(len(samples) / 16000)
             }
             
         except Exception as e:
@@ -241,14 +379,25 @@ class TranscriptionProcessor:
                 'success': False,
                 'error': str(e)
             }
+        finally:
+            # Отображенный в память WAV освобождается сразу после транскрибации
+            if hasattr(opened, "close"):
+                opened.close()
     
+    def close(self):
+        """Остановка планировщика батчей (его поток держит ссылку на модель)"""
+        if self.scheduler is not None:
+            self.scheduler.close()
+            self.scheduler = None
+
     def get_model_info(self):
         """Возвращает информацию о загруженной модели"""
         if self.model:
             return {
                 'model_loaded': True,
                 'device': self.device,
-                'torch_dtype': str(self.torch_dtype)
+                'torch_dtype': str(self.torch_dtype),
+                'backend': self.backend.name if self.backend else None
             }
         else:
             return {
@@ -3,15 +3,22 @@ import json
 import time
 from typing import Optional
 
+import metrics
+
 class TranslationProcessor:
     """Класс для перевода текста через API"""
     
+    # Дольше этого не ждем, даже если API просит в Retry-After
+    MAX_RETRY_AFTER = 60
+
     def __init__(self, api_endpoint: str, api_token: str, model: str = "gpt-3.5-turbo", 
-                 system_prompt: str = "Переведи следующий текст на русский язык."):
+                 system_prompt: str = "Переведи следующий текст на русский язык.",
+                 timeout: float = 60):
         self.api_endpoint = api_endpoint
         self.api_token = api_token
         self.model = model
         self.system_prompt = system_prompt
+        self.timeout = timeout
         self.session = requests.Session()
         
         # Настройка заголовков
@@ -38,20 +45,27 @@ class TranslationProcessor:
         payload = self._prepare_payload(text)
         
         for attempt in range(retry_count):
+            started = time.perf_counter()
+            response = None
             try:
                 response = self.session.post(
                     self.api_endpoint,
                     json=payload,
-                    timeout=60
+                    timeout=self.timeout
+                )
+                metrics.translation_latency.observe(
+                    time.perf_counter() - started, status=str(response.status_code)
                 )
                 
                 if response.status_code == 200:
                     result = response.json()
                     return self._extract_translation(result)
                 elif response.status_code == 429:  # Rate limit
-                    wait_time = 2 ** attempt  # Exponential backoff
-                    time.sleep(wait_time)
-                    continue
+                    if attempt < retry_count - 1:
+                        metrics.translation_retries.inc(status="429")
+                        time.sleep(self._retry_delay(response, attempt))
+                        continue
+                    raise Exception("Ошибка API: HTTP 429 - превышен лимит запросов")
                 else:
                     error_message = f"HTTP {response.status_code}"
                     try:
@@ -66,14 +80,20 @@ class TranslationProcessor:
                     raise Exception(f"Ошибка API: {error_message}")
                     
             except requests.exceptions.Timeout:
+                metrics.translation_latency.observe(time.perf_counter() - started, status="timeout")
                 if attempt < retry_count - 1:
+                    metrics.translation_retries.inc(status="timeout")
                     time.sleep(2 ** attempt)
                     continue
                 else:
                     raise Exception("Превышено время ожидания ответа от API")
             
             except requests.exceptions.RequestException as e:
+                # Ответ без корректного JSON уже учтен по коду ответа
+                if response is None:
+                    metrics.translation_latency.observe(time.perf_counter() - started, status="error")
                 if attempt < retry_count - 1:
+                    metrics.translation_retries.inc(status="error")
                     time.sleep(2 ** attempt)
                     continue
                 else:
@@ -81,6 +101,21 @@ class TranslationProcessor:
         
         raise Exception("Не удалось получить перевод после нескольких попыток")
     
+    def _retry_delay(self, response, attempt: int) -> float:
+        """
+        Пауза перед повтором после 429
+
+        Если API прислал Retry-After (в секундах), ждем столько, сколько он
+        просит, иначе - экспоненциальная задержка.
+        """
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0), self.MAX_RETRY_AFTER)
+            except ValueError:
+                pass
+        return 2 ** attempt  # Exponential backoff
+
     def _prepare_payload(self, text: str) -> dict:
         """
         Подготовка payload для API запроса
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест перевода
+
+Запускает TranslationProcessor из нескольких потоков против локальной
+имитации API (mock_openai_server.py) или любого OpenAI-совместимого
+эндпоинта и выводит пропускную способность, хвостовые задержки, ошибки и
+повторы по причинам. С --stream замеряется время до первой части
+потокового ответа, с --pwa-url - задача /api/translate запущенного сервера.
+
+Запуск:
+    python translation_loadtest.py --requests 200 --concurrency 1 8 32 \\
+        --latency 0.3 --distribution lognormal --rate-limit 0.05
+    python translation_loadtest.py --pwa-url http://localhost:5000 --requests 10
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+import metrics
+from mock_openai_server import add_server_arguments, server_from_args
+from translation import TranslationProcessor
+
+SAMPLE_SENTENCE = (
+    "Speech recognition turns long recordings into text that can be translated "
+    "chunk by chunk without losing the structure of the original. "
+)
+
+
+def percentile(values: List[float], share: float) -> Optional[float]:
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(share * len(values) + 0.5)) - 1))
+    return round(values[index], 4)
+
+
+def latency_summary(latencies: List[float]) -> Dict:
+    latencies = sorted(latencies)
+    return {
+        "p50": percentile(latencies, 0.50),
+        "p90": percentile(latencies, 0.90),
+        "p99": percentile(latencies, 0.99),
+        "max": round(latencies[-1], 4) if latencies else None,
+    }
+
+
+def make_chunks(count: int, chars: int) -> List[str]:
+    """Одинаковые по размеру тексты для перевода"""
+    text = SAMPLE_SENTENCE * (chars // len(SAMPLE_SENTENCE) + 1)
+    return [f"{i}. {text[:chars]}" for i in range(count)]
+
+
+def retries_snapshot() -> Dict[str, float]:
+    """Текущие значения счетчика повторов по причинам"""
+    return {
+        labels[0]: value
+        for _, _, labels, value in metrics.translation_retries.samples()
+    }
+
+
+def run_load(endpoint: str, chunks: List[str], concurrency: int,
+             timeout: float = 60, retries: int = 3, token: str = "mock-token",
+             model: str = "mock") -> Dict:
+    """
+    Перевод всех чанков через TranslationProcessor с заданной параллельностью
+
+    Args:
+        endpoint: URL chat/completions
+        chunks: Тексты для перевода
+        concurrency: Количество потоков
+        timeout: Таймаут одного запроса
+        retries: Попыток на чанк (retry_count)
+
+    Returns:
+        Dict: Пропускная способность, задержки успешных переводов,
+        ошибки по типам и повторы по причинам
+    """
+    local = threading.local()
+    before = retries_snapshot()
+
+    def translate(chunk):
+        # Отдельная сессия на поток, как у параллельных задач перевода
+        if not hasattr(local, "processor"):
+            local.processor = TranslationProcessor(endpoint, token, model=model, timeout=timeout)
+        started = time.perf_counter()
+        try:
+            local.processor.translate_text(chunk, retry_count=retries)
+            return time.perf_counter() - started, None
+        except Exception as e:
+            return time.perf_counter() - started, str(e).split(":")[0]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(translate, chunks))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, error in outcomes if error is None]
+    errors = Counter(error for _, error in outcomes if error is not None)
+    after = retries_snapshot()
+    return {
+        "concurrency": concurrency,
+        "requests": len(chunks),
+        "succeeded": len(latencies),
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency": latency_summary(latencies),
+        "errors": dict(errors),
+        "retries": {
+            reason: int(value - before.get(reason, 0))
+            for reason, value in after.items()
+            if value - before.get(reason, 0)
+        },
+    }
+
+
+def run_stream_load(endpoint: str, chunks: List[str], concurrency: int,
+                    timeout: float = 60, token: str = "mock-token") -> Dict:
+    """Потоковые запросы: время до первой части и до конца ответа"""
+    local = threading.local()
+
+    def stream(chunk):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+            local.session.headers["Authorization"] = f"Bearer {token}"
+        payload = {
+            "model": "mock",
+            "stream": True,
+            "messages": [{"role": "user", "content": chunk}],
+        }
+        started = time.perf_counter()
+        first = None
+        try:
+            with local.session.post(endpoint, json=payload, stream=True, timeout=timeout) as response:
+                if response.status_code != 200:
+                    return None, None, f"HTTP {response.status_code}"
+                for line in response.iter_lines():
+                    if not line.startswith(b"data: "):
+                        continue
+                    if first is None:
+                        first = time.perf_counter() - started
+                    if line == b"data: [DONE]":
+                        break
+        except requests.exceptions.RequestException as e:
+            return None, None, type(e).__name__
+        return first, time.perf_counter() - started, None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(stream, chunks))
+    elapsed = time.perf_counter() - started
+
+    done = [(first, total) for first, total, error in outcomes if error is None]
+    return {
+        "concurrency": concurrency,
+        "requests": len(chunks),
+        "succeeded": len(done),
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(len(done) / elapsed, 2) if elapsed else None,
+        "time_to_first_chunk": latency_summary([first for first, _ in done if first is not None]),
+        "latency": latency_summary([total for _, total in done]),
+        "errors": dict(Counter(error for _, _, error in outcomes if error)),
+    }
+
+
+def run_pwa_job(pwa_url: str, endpoint: str, chunks: List[str],
+                poll_interval: float = 0.5, timeout: float = 3600) -> Dict:
+    """
+    Задача перевода через /api/process-text и /api/translate сервера PWA
+
+    Сервер сам разбивает текст на чанки и переводит их последовательно,
+    поэтому замеряется время всей задачи, а не параллельная нагрузка.
+    """
+    session = requests.Session()
+    text = " ".join(chunks)
+    response = session.post(f"{pwa_url}/api/process-text", json={"text": text}, timeout=60)
+    response.raise_for_status()
+    total_chunks = response.json()["total_chunks"]
+
+    started = time.perf_counter()
+    response = session.post(
+        f"{pwa_url}/api/translate",
+        json={
+            "translate_all": True,
+            "settings": {"api_endpoint": endpoint, "api_token": "mock-token", "api_model": "mock"},
+        },
+        timeout=60,
+    )
+    response.raise_for_status()
+
+    version = None
+    status = {}
+    while time.perf_counter() - started < timeout:
+        params = {"since": version} if version is not None else {}
+        status = session.get(f"{pwa_url}/api/translation-status", params=params, timeout=60).json()
+        version = status.get("version", version)
+        if status.get("status") in ("completed", "error"):
+            break
+        time.sleep(poll_interval)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": "pwa",
+        "status": status.get("status"),
+        "error": status.get("error"),
+        "chunks": total_chunks,
+        "seconds": round(elapsed, 4),
+        "seconds_per_chunk": round(elapsed / total_chunks, 4) if total_chunks else None,
+    }
+
+
+def print_report(results: List[Dict]):
+    """Краткая таблица в stderr"""
+    for result in results:
+        if result.get("mode") == "pwa":
+            print(f"PWA: {result['status']} за {result['seconds']} с "
+                  f"({result['seconds_per_chunk']} с на чанк)", file=sys.stderr)
+            continue
+        latency = result["latency"]
+        print(
+            f"x{result['concurrency']:<3} {result['succeeded']}/{result['requests']} ок, "
+            f"{result['throughput_rps']} зап/с, p50 {latency['p50']} p90 {latency['p90']} "
+            f"p99 {latency['p99']} max {latency['max']}, "
+            f"ошибки {result['errors'] or '-'}, повторы {result.get('retries') or '-'}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Нагрузочный тест перевода")
+    parser.add_argument("--endpoint", help="Внешний эндпоинт (по умолчанию - встроенная имитация)")
+    parser.add_argument("--token", default="mock-token")
+    parser.add_argument("--model", default="mock")
+    parser.add_argument("--requests", type=int, default=100, help="Количество чанков")
+    parser.add_argument("--chunk-chars", type=int, default=3000, help="Размер чанка")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--client-timeout", type=float, default=60, help="Таймаут запроса")
+    parser.add_argument("--retries", type=int, default=3, help="Попыток на чанк")
+    parser.add_argument("--stream", action="store_true", help="Потоковые запросы")
+    parser.add_argument("--pwa-url", help="Перевод через /api/translate сервера PWA")
+    parser.add_argument("--json", dest="json_path", help="Файл для результатов в JSON")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if not endpoint:
+        server = server_from_args(args).start()
+        endpoint = server.url
+        print(f"🚀 Имитация API: {endpoint}", file=sys.stderr)
+
+    chunks = make_chunks(args.requests, args.chunk_chars)
+    results = []
+    try:
+        if args.pwa_url:
+            results.append(run_pwa_job(args.pwa_url.rstrip("/"), endpoint, chunks))
+        else:
+            for concurrency in args.concurrency:
+                if args.stream:
+                    result = run_stream_load(endpoint, chunks, concurrency,
+                                             args.client_timeout, args.token)
+                else:
+                    result = run_load(endpoint, chunks, concurrency, args.client_timeout,
+                                      args.retries, args.token, args.model)
+                results.append(result)
+                print_report([result])
+    finally:
+        if server is not None:
+            report_stats = server.stats()
+            server.stop()
+        else:
+            report_stats = None
+
+    if args.pwa_url:
+        print_report(results)
+
+    report = {"endpoint": endpoint, "results": results, "server": report_stats}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
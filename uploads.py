@@ -0,0 +1,416 @@
+"""
+Возобновляемая загрузка файлов частями (по мотивам протокола tus)
+
+Клиент создает загрузку, затем отправляет части запросами PATCH с заголовком
+Upload-Offset. Каждая часть сразу дописывается в файл на диске, хэш считается
+по мере поступления данных, а для потоковых форматов ffmpeg начинает
+декодировать уже полученный префикс еще до окончания загрузки.
+"""
+
+import base64
+import hashlib
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+from utils import sanitize_filename
+
+# Папка для частично загруженных файлов
+UPLOADS_DIR = Path("uploads")
+
+# Размер блока при чтении тела запроса
+READ_BLOCK_SIZE = 64 * 1024
+
+# Через сколько секунд без новых данных загрузка считается брошенной
+UPLOAD_IDLE_TIMEOUT = 600
+
+# Форматы, которые ffmpeg умеет декодировать из потока без перемотки.
+# В mp4/m4a атом moov обычно находится в конце файла, поэтому их
+# декодируем только после полной загрузки.
+STREAMABLE_FORMATS = {"mp3", "wav", "wave", "flac", "ogg", "aac"}
+
+
+class UploadError(Exception):
+    """Ошибка протокола загрузки с HTTP-кодом для ответа"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class StreamingDecoder:
+    """
+    Декодирование аудио через ffmpeg по мере поступления данных
+
+    Отдельный поток читает новые байты из растущего файла и передает их
+    в stdin ffmpeg, второй поток собирает PCM (16 кГц, моно, s16le) из stdout.
+    """
+
+    def __init__(self, upload: "ChunkedUpload"):
+        self.upload = upload
+        self.failed = False
+        self._pcm = bytearray()
+        self._process = subprocess.Popen(
+            [
+                "ffmpeg", "-hide_banner", "-loglevel", "error",
+                "-i", "pipe:0",
+                "-f", "s16le", "-ac", "1", "-ar", "16000",
+                "pipe:1",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._feeder = threading.Thread(target=self._feed, daemon=True)
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._feeder.start()
+        self._reader.start()
+
+    @property
+    def decoded_seconds(self) -> float:
+        """Длительность уже декодированного префикса в секундах"""
+        return len(self._pcm) / 2 / 16000
+
+    def _feed(self):
+        """Передача новых данных из файла в ffmpeg"""
+        upload = self.upload
+        fed = 0
+        try:
+            with open(upload.path, "rb") as f:
+                while True:
+                    with upload.condition:
+                        while (
+                            upload.offset <= fed
+                            and not upload.completed
+                            and upload.error is None
+                        ):
+                            upload.condition.wait(timeout=1.0)
+                        available = upload.offset
+                        finished = upload.completed or upload.error is not None
+
+                    f.seek(fed)
+                    while fed < available:
+                        data = f.read(min(READ_BLOCK_SIZE, available - fed))
+                        if not data:
+                            break
+                        self._process.stdin.write(data)
+                        fed += len(data)
+
+                    if finished and fed >= available:
+                        break
+        except (OSError, ValueError):
+            # ffmpeg завершился с ошибкой или файл удален
+            self.failed = True
+        finally:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+
+    def _read(self):
+        """Сбор декодированного PCM из stdout ffmpeg"""
+        while True:
+            data = self._process.stdout.read(READ_BLOCK_SIZE)
+            if not data:
+                break
+            self._pcm.extend(data)
+
+    def finish(self, timeout: float = 60):
+        """
+        Дождаться окончания декодирования
+
+        Returns:
+            np.ndarray | None: Сэмплы float32 в диапазоне [-1, 1] или None,
+            если потоковое декодирование не удалось
+        """
+        import numpy as np
+
+        self._feeder.join(timeout)
+        self._reader.join(timeout)
+        try:
+            returncode = self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self.failed = True
+            return None
+
+        if self.failed or returncode != 0 or not self._pcm:
+            return None
+
+        samples = np.frombuffer(bytes(self._pcm), dtype=np.int16).astype(np.float32)
+        self._pcm = bytearray()
+        return samples / 32768.0
+
+    def cancel(self):
+        """Остановить ffmpeg"""
+        self.failed = True
+        if self._process.poll() is None:
+            self._process.kill()
+
+
+class ChunkedUpload:
+    """Состояние одной загрузки"""
+
+    def __init__(self, filename: str, path: Path, size: int,
+                 sha256: Optional[str] = None):
+        self.id = path.stem
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.expected_sha256 = sha256.lower() if sha256 else None
+        self.offset = 0
+        self.completed = False
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.last_activity = self.created
+        self.condition = threading.Condition()
+        self.decoder: Optional[StreamingDecoder] = None
+        self._hasher = hashlib.sha256()
+        self._write_lock = threading.Lock()
+
+    @property
+    def sha256(self) -> Optional[str]:
+        """Хэш полностью загруженного файла"""
+        return self._hasher.hexdigest() if self.completed else None
+
+    def decoded_samples(self):
+        """
+        Сэмплы, декодированные во время загрузки
+
+        Returns:
+            np.ndarray | None: Аудио 16 кГц моно или None, если потоковое
+            декодирование не использовалось или не удалось
+        """
+        if self.decoder is None:
+            return None
+        return self.decoder.finish()
+
+    def to_dict(self) -> Dict:
+        """Информация о загрузке для API"""
+        info = {
+            "upload_id": self.id,
+            "filename": self.filename,
+            "offset": self.offset,
+            "size": self.size,
+            "completed": self.completed,
+            "sha256": self.sha256,
+        }
+        if self.decoder is not None:
+            info["decoded_seconds"] = round(self.decoder.decoded_seconds, 2)
+        if self.error:
+            info["error"] = self.error
+        return info
+
+
+class ChunkedUploadManager:
+    """Менеджер возобновляемых загрузок"""
+
+    def __init__(self, uploads_dir: Path = UPLOADS_DIR, decode_early: bool = True,
+                 idle_timeout: float = UPLOAD_IDLE_TIMEOUT):
+        self.uploads_dir = Path(uploads_dir)
+        self.uploads_dir.mkdir(exist_ok=True)
+        self.decode_early = decode_early and shutil.which("ffmpeg") is not None
+        self.idle_timeout = idle_timeout
+        self._uploads: Dict[str, ChunkedUpload] = {}
+        self._lock = threading.Lock()
+
+    def create(self, filename: str, size: int,
+               sha256: Optional[str] = None) -> ChunkedUpload:
+        """
+        Создание новой загрузки
+
+        Загрузка завершается, когда получены все size байт, поэтому размер
+        нужно знать заранее.
+
+        Args:
+            filename: Исходное имя файла
+            size: Полный размер файла в байтах
+            sha256: Ожидаемый хэш всего файла в hex (необязательно)
+
+        Returns:
+            ChunkedUpload: Созданная загрузка
+        """
+        if size is None:
+            raise UploadError("Не указан размер файла")
+        if not isinstance(size, int) or size < 0:
+            raise UploadError("Некорректный размер файла")
+
+        self.purge_stale()
+
+        upload_id = uuid.uuid4().hex
+        safe_name = sanitize_filename(Path(filename).name)
+        path = self.uploads_dir / f"{upload_id}{Path(safe_name).suffix.lower()}"
+        path.touch()
+
+        upload = ChunkedUpload(filename, path, size=size, sha256=sha256)
+
+        audio_format = path.suffix.lower().lstrip(".")
+        if self.decode_early and audio_format in STREAMABLE_FORMATS:
+            try:
+                upload.decoder = StreamingDecoder(upload)
+            except OSError:
+                upload.decoder = None
+
+        with self._lock:
+            self._uploads[upload_id] = upload
+
+        if size == 0:
+            self._finalize(upload)
+
+        return upload
+
+    def get(self, upload_id: str) -> Optional[ChunkedUpload]:
+        """Поиск загрузки по идентификатору"""
+        with self._lock:
+            return self._uploads.get(upload_id)
+
+    def append(self, upload_id: str, offset: Optional[int], stream,
+               checksum: Optional[str] = None) -> ChunkedUpload:
+        """
+        Дописывание части файла
+
+        Args:
+            upload_id: Идентификатор загрузки
+            offset: Смещение, с которого клиент отправляет данные
+            stream: Поток с телом запроса
+            checksum: Заголовок Upload-Checksum вида "sha256 <base64>"
+
+        Returns:
+            ChunkedUpload: Загрузка с обновленным смещением
+        """
+        upload = self.get(upload_id)
+        if upload is None:
+            raise UploadError("Загрузка не найдена", 404)
+        if offset is None:
+            raise UploadError("Не указан заголовок Upload-Offset")
+
+        chunk_hasher = None
+        if checksum:
+            algorithm, _, expected = checksum.partition(" ")
+            if algorithm.lower() != "sha256" or not expected:
+                raise UploadError("Поддерживается только Upload-Checksum: sha256")
+            chunk_hasher = hashlib.sha256()
+
+        with upload._write_lock:
+            if upload.error:
+                raise UploadError(upload.error, 410)
+            if upload.completed:
+                raise UploadError("Загрузка уже завершена", 409)
+            if offset != upload.offset:
+                raise UploadError(
+                    f"Неверное смещение: ожидалось {upload.offset}, получено {offset}",
+                    409,
+                )
+
+            # При ошибке файл обрезается до прежнего смещения, часть откатывается целиком
+            written = 0
+            file_hasher = upload._hasher.copy()
+            with open(upload.path, "r+b") as f:
+                f.seek(upload.offset)
+                while True:
+                    data = stream.read(READ_BLOCK_SIZE)
+                    if not data:
+                        break
+                    written += len(data)
+                    if upload.offset + written > upload.size:
+                        f.truncate(upload.offset)
+                        raise UploadError("Данные превышают заявленный размер", 413)
+                    f.write(data)
+                    file_hasher.update(data)
+                    if chunk_hasher is not None:
+                        chunk_hasher.update(data)
+
+                if chunk_hasher is not None:
+                    actual = base64.b64encode(chunk_hasher.digest()).decode("ascii")
+                    if actual != expected:
+                        f.truncate(upload.offset)
+                        # 460 - код несовпадения контрольной суммы в протоколе tus
+                        raise UploadError("Контрольная сумма части не совпадает", 460)
+
+            with upload.condition:
+                upload._hasher = file_hasher
+                upload.offset += written
+                upload.last_activity = time.time()
+                upload.condition.notify_all()
+
+            if upload.offset == upload.size:
+                self._finalize(upload)
+
+        return upload
+
+    def _finalize(self, upload: ChunkedUpload):
+        """Завершение загрузки с проверкой хэша"""
+        with upload.condition:
+            upload.completed = True
+            if (upload.expected_sha256
+                    and upload._hasher.hexdigest() != upload.expected_sha256):
+                upload.completed = False
+                upload.error = "Хэш файла не совпадает с заявленным"
+            upload.condition.notify_all()
+
+        if upload.error:
+            self.discard(upload.id)
+            raise UploadError(upload.error, 460)
+
+    def wait(self, upload_id: str) -> ChunkedUpload:
+        """
+        Ожидание окончания загрузки
+
+        Загрузка считается прерванной, если данные не поступали дольше
+        idle_timeout секунд.
+
+        Returns:
+            ChunkedUpload: Завершенная загрузка или загрузка с ошибкой
+        """
+        upload = self.get(upload_id)
+        if upload is None:
+            raise UploadError("Загрузка не найдена", 404)
+
+        with upload.condition:
+            while not upload.completed and upload.error is None:
+                upload.condition.wait(timeout=1.0)
+                if time.time() - upload.last_activity > self.idle_timeout:
+                    upload.error = "Загрузка прервана: нет данных от клиента"
+                    upload.condition.notify_all()
+        return upload
+
+    def release(self, upload_id: str):
+        """Передача завершенного файла другому владельцу без удаления"""
+        with self._lock:
+            upload = self._uploads.pop(upload_id, None)
+        if upload is not None and upload.decoder is not None:
+            upload.decoder.cancel()
+
+    def discard(self, upload_id: str):
+        """Удаление загрузки и ее файла"""
+        with self._lock:
+            upload = self._uploads.pop(upload_id, None)
+        if upload is None:
+            return
+
+        with upload.condition:
+            if not upload.completed and upload.error is None:
+                upload.error = "Загрузка отменена"
+            upload.condition.notify_all()
+
+        if upload.decoder is not None:
+            upload.decoder.cancel()
+        try:
+            upload.path.unlink()
+        except OSError:
+            pass
+
+    def purge_stale(self, max_age: float = 24 * 3600):
+        """Удаление давно брошенных загрузок"""
+        now = time.time()
+        with self._lock:
+            stale = [
+                upload_id for upload_id, upload in self._uploads.items()
+                if now - upload.last_activity > max_age
+            ]
+        for upload_id in stale:
+            self.discard(upload_id)
@@ -172,17 +172,28 @@ def get_audio_file_info(file_path: Path) -> Dict:
         Dict: Информация о файле
     """
     try:
-        from pydub import AudioSegment
-        
-        audio = AudioSegment.from_file(file_path)
+        from audio_probe import probe_audio
+
+        # Параметры из заголовков; декодирование целиком - только если
+        # формат не распознан и ffprobe не установлен
+        probe = probe_audio(file_path)
+        if probe is None:
+            from pydub import AudioSegment
+
+            audio = AudioSegment.from_file(file_path)
+            probe = {
+                'duration_seconds': len(audio) / 1000.0,
+                'sample_rate': audio.frame_rate,
+                'channels': audio.channels,
+            }
         
         return {
-            'duration_seconds': len(audio) / 1000.0,
-            'sample_rate': audio.frame_rate,
-            'channels': audio.channels,
+            'duration_seconds': probe['duration_seconds'],
+            'sample_rate': probe['sample_rate'],
+            'channels': probe['channels'],
             'file_size': file_path.stat().st_size,
             'format': file_path.suffix.lower().lstrip('.'),
-            'duration_formatted': format_duration(len(audio) / 1000.0)
+            'duration_formatted': format_duration(probe['duration_seconds'])
         }
     except Exception as e:
         return {
@@ -228,3 +239,30 @@ def check_disk_space(path: str, required_mb: int = 100) -> bool:
         return free_mb >= required_mb
     except:
         return True  # В случае ошибки считаем что места достаточно
+
+def write_text_atomic(path: Path, text: str) -> None:
+    """
+    Атомарно записывает текст в файл
+    
+    Текст пишется во временный файл рядом с целевым и переименовывается,
+    поэтому прерванная запись не оставляет обрезанный файл.
+    
+    Args:
+        path: Путь к файлу
+        text: Содержимое
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
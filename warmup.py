@@ -0,0 +1,143 @@
+"""
+Загрузка и прогрев модели в фоне
+
+Сервер начинает отвечать сразу, а PyTorch, transformers и веса Whisper
+загружаются в фоновом потоке. После загрузки модель один раз
+транскрибирует секунду тихого шума: первые вызовы PyTorch выбирают и
+компилируют ядра, и без прогрева это время достается первому
+пользователю. Задачи транскрибации получают ту же модель через get(),
+поэтому веса загружаются один раз на процесс, а не на каждую задачу.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import metrics
+
+# Прогрев при запуске сервера (иначе модель загрузится с первой задачей)
+WARMUP_ON_START = os.environ.get("TRANSCRIPTION_WARMUP", "0").lower() in ("1", "true", "yes")
+
+
+def warm_up(processor):
+    """Транскрибация секунды шума без записи замеров"""
+    import numpy as np
+
+    from stage_timer import StageTimer
+
+    # Не тишина: чанки без речи в модель не передаются
+    noise = np.random.default_rng(0).standard_normal(16000).astype(np.float32) * 0.03
+    processor.transcribe_samples(noise, timer=StageTimer("warmup"))
+
+
+class ModelWarmup:
+    """Модель транскрибации процесса с фоновой загрузкой"""
+
+    def __init__(self, factory: Callable, warm: bool = True,
+                 release: Optional[Callable] = None):
+        """
+        Args:
+            factory: Функция, создающая TranscriptionProcessor (тяжелые
+                модули импортируются внутри нее)
+            warm: Прогонять шум через модель после загрузки
+            release: Возврат модели после прогрева (например, в
+                ModelManager); тогда модель не удерживается и может быть
+                выгружена, а get() недоступен
+        """
+        self.factory = factory
+        self.warm = warm
+        self.release = release
+        self.model_name = ""
+        self.state = "idle"
+        self.error = ""
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._processor = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def start(self):
+        """Запуск загрузки в фоне (повторные вызовы ничего не делают)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.state = "loading"
+            self._thread = threading.Thread(target=self._run, name="model-warmup", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        processor = None
+        try:
+            started = time.perf_counter()
+            processor = self.factory()
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            if self.warm:
+                self.state = "warming"
+                started = time.perf_counter()
+                warm_up(processor)
+                self.warmup_seconds = round(time.perf_counter() - started, 3)
+            self.model_name = getattr(getattr(processor, "model", None), "name_or_path", "")
+            if self.release is None:
+                self._processor = processor
+            self.state = "ready"
+            metrics.model_ready.set(1)
+            print(f"✅ Модель готова: загрузка {self.load_seconds} с, прогрев {self.warmup_seconds} с")
+        except Exception as e:
+            self.state = "error"
+            self.error = str(e)
+            print(f"❌ Ошибка загрузки модели: {e}")
+        finally:
+            # Полученная модель возвращается и при ошибке прогрева, иначе
+            # она останется занятой и не сможет быть выгружена
+            if processor is not None and self.release is not None:
+                self.release(processor)
+            self._done.set()
+
+    def get(self, timeout: Optional[float] = None):
+        """
+        Модель, при необходимости с ожиданием загрузки
+
+        Args:
+            timeout: Сколько ждать загрузки (None - без ограничения)
+
+        Returns:
+            TranscriptionProcessor
+        """
+        self.reset()
+        self.start()
+        if not self._done.wait(timeout):
+            raise Exception("Модель еще загружается")
+        if self._processor is None:
+            if self.release is not None:
+                raise Exception("Модель после прогрева возвращена владельцу")
+            raise Exception(f"Модель не загружена: {self.error}")
+        return self._processor
+
+    def reset(self):
+        """Сброс после ошибки, чтобы следующая задача попробовала снова"""
+        with self._lock:
+            if self.state != "error":
+                return
+            self._thread = None
+            self._done.clear()
+            self.state = "idle"
+            self.error = ""
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def status(self) -> Dict:
+        """Состояние для проверки готовности"""
+        status = {"state": self.state, "ready": self.ready}
+        if self.error:
+            status["error"] = self.error
+        if self.load_seconds is not None:
+            status["load_seconds"] = self.load_seconds
+        if self.warmup_seconds is not None:
+            status["warmup_seconds"] = self.warmup_seconds
+        if self.model_name:
+            status["model"] = self.model_name
+        return status
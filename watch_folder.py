@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Наблюдение за папками и автоматическая транскрибация новых записей
+
+Изменения отслеживаются через inotify (Linux), а где он недоступен -
+периодическим обходом папок. Файл берется в работу, только когда его размер
+и время изменения не меняются заданное время (запись закончена). Тексты
+пишутся рядом с аудио или в --output-dir, по желанию сразу переводятся.
+Журнал FileIndex общий с batch_transcribe.py: после перезапуска уже
+обработанные файлы проверяются только по размеру и времени изменения.
+
+Запуск:
+    python watch_folder.py incoming/ --output-dir transcripts --translate
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import batch_transcribe
+from file_index import DEFAULT_INDEX, FileIndex
+from utils import get_supported_audio_formats, load_settings, write_text_atomic
+
+# Маски событий inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+# Сколько раз файл ставится в очередь заново после аварии процесса обработки
+# (при аварии падают все файлы пула, и виновный среди них неизвестен)
+MAX_CRASH_RETRIES = 2
+
+
+def is_audio(path: Path, formats: Set[str]) -> bool:
+    return path.suffix.lower() in formats and not path.name.startswith(".")
+
+
+def scan(roots: Iterable[Path], formats: Set[str]) -> Dict[Path, Tuple[int, int]]:
+    """Все аудиофайлы в папках с размером и временем изменения"""
+    found = {}
+    for root in roots:
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                path = Path(dirpath) / name
+                if not is_audio(path, formats):
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                found[path] = (stat.st_size, stat.st_mtime_ns)
+    return found
+
+
+class PollingWatcher:
+    """Отслеживание изменений периодическим обходом папок"""
+
+    def __init__(self, roots: List[Path], formats: Set[str], interval: float = 5.0):
+        self.roots = roots
+        self.formats = formats
+        self.interval = interval
+        self._known = scan(roots, formats)
+
+    def initial(self) -> Set[Path]:
+        return set(self._known)
+
+    def changes(self, timeout: float) -> Set[Path]:
+        """Файлы, появившиеся или изменившиеся с прошлого обхода"""
+        time.sleep(min(timeout, self.interval))
+        current = scan(self.roots, self.formats)
+        changed = {path for path, state in current.items() if self._known.get(path) != state}
+        self._known = current
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Отслеживание изменений через inotify без сторонних библиотек"""
+
+    def __init__(self, roots: List[Path], formats: Set[str]):
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or not libc_name:
+            raise OSError("inotify доступен только в Linux")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.roots = roots
+        self.formats = formats
+        self._dirs: Dict[int, Path] = {}
+        for root in roots:
+            self._add_tree(root)
+
+    def _add_watch(self, directory: Path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch: {os.strerror(errno)}", str(directory))
+        self._dirs[wd] = directory
+
+    def _add_tree(self, root: Path) -> Set[Path]:
+        """Подписка на папку и вложенные папки; возвращает найденные в них файлы"""
+        found = set()
+        for dirpath, _, filenames in os.walk(root):
+            self._add_watch(Path(dirpath))
+            found.update(
+                Path(dirpath) / name for name in filenames
+                if is_audio(Path(dirpath) / name, self.formats)
+            )
+        return found
+
+    def initial(self) -> Set[Path]:
+        return set(scan(self.roots, self.formats))
+
+    def changes(self, timeout: float) -> Set[Path]:
+        """Файлы, о которых пришли события за время ожидания"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # События потеряны - полный обход
+                changed.update(scan(self.roots, self.formats))
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_DELETE_SELF:
+                self._dirs.pop(wd, None)
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Файлы могли появиться до подписки на новую папку
+                    changed.update(self._add_tree(path))
+            elif is_audio(path, self.formats):
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def make_watcher(roots: List[Path], formats: Set[str], polling: bool = False,
+                 interval: float = 5.0):
+    """inotify, если доступен, иначе обход папок"""
+    if not polling:
+        try:
+            return InotifyWatcher(roots, formats)
+        except OSError as e:
+            print(f"⚠️ inotify недоступен ({e}), используется периодический обход")
+    return PollingWatcher(roots, formats, interval)
+
+
+class Debouncer:
+    """
+    Ожидание окончания записи файлов
+
+    Файл считается готовым, когда его размер и время изменения не менялись
+    settle секунд.
+    """
+
+    def __init__(self, settle: float = 5.0, clock=time.monotonic):
+        self.settle = settle
+        self.clock = clock
+        self._files: Dict[Path, Tuple[Tuple[int, int], float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def touch(self, path: Path):
+        """Файл изменился или появился"""
+        state = self._state(path)
+        if state is None:
+            self._files.pop(path, None)
+            return
+        previous = self._files.get(path)
+        if previous is None or previous[0] != state:
+            self._files[path] = (state, self.clock())
+
+    @staticmethod
+    def _state(path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def ready(self) -> List[Path]:
+        """Файлы, запись которых закончена (удаляются из ожидания)"""
+        now = self.clock()
+        ready = []
+        for path, (state, since) in list(self._files.items()):
+            current = self._state(path)
+            if current is None:
+                del self._files[path]
+            elif current != state:
+                self._files[path] = (current, now)
+            elif now - since >= self.settle and current[0] > 0:
+                ready.append(path)
+                del self._files[path]
+        return sorted(ready)
+
+
+class Translator:
+    """Перевод готовых текстов по настройкам API приложения"""
+
+    def __init__(self, settings: Dict):
+        from text_processor import TextProcessor
+        from translation import TranslationProcessor
+
+        if not settings.get("api_endpoint") or not settings.get("api_token"):
+            raise Exception("Не настроены параметры API (settings.json)")
+        self.text_processor = TextProcessor()
+        self.translator = TranslationProcessor(
+            api_endpoint=settings["api_endpoint"],
+            api_token=settings["api_token"],
+            model=settings.get("api_model", "gpt-3.5-turbo"),
+            system_prompt=settings.get(
+                "system_prompt", "Переведи следующий текст на русский язык."
+            ),
+        )
+
+    def translate_file(self, transcript: Path) -> Path:
+        """Перевод текста по чанкам в файл <имя>.translation.txt"""
+        text = transcript.read_text(encoding="utf-8")
+        chunks = self.text_processor.split_into_chunks(text)
+        translated = [self.translator.translate_text(chunk) for chunk in chunks]
+        output = transcript.with_name(f"{transcript.stem}.translation.txt")
+        write_text_atomic(output, "\n\n".join(translated))
+        return output
+
+
+class WatchDaemon:
+    """Очередь готовых файлов в транскрибацию и перевод"""
+
+    def __init__(self, roots: List[Path], index: FileIndex,
+                 output_dir: Optional[Path] = None, workers: int = 1,
+                 threads: int = 0, settle: float = 5.0, polling: bool = False,
+                 interval: float = 5.0, translator: Optional[Translator] = None):
+        self.roots = [root.resolve() for root in roots]
+        self.index = index
+        self.output_dir = output_dir
+        self.workers = workers
+        self.threads = threads
+        self.formats = {ext.lower() for ext in get_supported_audio_formats()}
+        self.watcher = make_watcher(self.roots, self.formats, polling, interval)
+        self.debouncer = Debouncer(settle)
+        self.translator = translator
+        self._translations = ThreadPoolExecutor(max_workers=1) if translator else None
+        self._executor = self._start_pool()
+        self._pending = {}
+        self._crashes: Dict[Path, int] = {}
+
+    def _start_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=batch_transcribe.init_worker,
+            initargs=(self.threads,),
+        )
+
+    def output_for(self, path: Path) -> Path:
+        for root in self.roots:
+            if path.is_relative_to(root):
+                return batch_transcribe.output_path(path, root, self.output_dir)
+        return batch_transcribe.output_path(path, path.parent, self.output_dir)
+
+    def _in_flight(self, path: Path) -> bool:
+        return any(item[0] == path for item in self._pending.values())
+
+    def consider(self, paths: Iterable[Path]):
+        """Новые или измененные файлы - в ожидание окончания записи"""
+        for path in paths:
+            if not self._in_flight(path):
+                self.debouncer.touch(path)
+
+    def submit_ready(self):
+        for path in self.debouncer.ready():
+            output = self.output_for(path)
+            if self.index.is_current(path, output):
+                self._translate_if_needed(path, output)
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            future = self._executor.submit(batch_transcribe.transcribe_one, str(path), str(output))
+            self._pending[future] = (path, output, stat)
+            print(f"🎤 В очереди: {path}")
+
+    def collect_finished(self):
+        broken = False
+        for future in [f for f in self._pending if f.done()]:
+            path, output, stat = self._pending.pop(future)
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                broken = True
+                self._retry_after_crash(path, stat)
+                continue
+            except Exception as e:
+                self.index.mark_failed(path, stat, str(e))
+                print(f"❌ {path}: {e}")
+                continue
+            self._crashes.pop(path, None)
+            self.index.mark_done(path, stat, result["sha256"], output, result["audio_seconds"])
+            print(f"✅ {path} -> {output} (RTF {result['timings']['rtf']})")
+            # Файл мог измениться во время транскрибации
+            self.debouncer.touch(path)
+            self._translate_if_needed(path, output)
+        if broken:
+            # Остальные файлы были в упавшем пуле: готовые результаты
+            # забираются на следующем проходе, прочие ставятся в очередь снова
+            for future in list(self._pending):
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    continue
+                future.cancel()
+                path, output, stat = self._pending.pop(future)
+                self._retry_after_crash(path, stat)
+            self._executor.shutdown(wait=False)
+            self._executor = self._start_pool()
+
+    def _retry_after_crash(self, path: Path, stat: os.stat_result):
+        """Повтор файла после аварии пула; после MAX_CRASH_RETRIES - ошибка"""
+        crashes = self._crashes.get(path, 0) + 1
+        if crashes > MAX_CRASH_RETRIES:
+            self._crashes.pop(path, None)
+            self.index.mark_failed(path, stat, "Процесс обработки завершился аварийно")
+            print(f"❌ {path}: процесс обработки завершился аварийно")
+            return
+        self._crashes[path] = crashes
+        print(f"🔁 {path}: процесс обработки завершился аварийно, файл будет обработан снова")
+        self.debouncer.touch(path)
+
+    def _translate_if_needed(self, path: Path, output: Path):
+        if self.translator is None:
+            return
+        entry = self.index.get(path)
+        if entry and entry.get("translation") and Path(entry["translation"]).exists():
+            return
+
+        def task():
+            try:
+                translation = self.translator.translate_file(output)
+                self.index.mark_translated(path, translation)
+                print(f"🌐 {output} -> {translation}")
+            except Exception as e:
+                print(f"❌ Перевод {output}: {e}")
+
+        self._translations.submit(task)
+
+    def run(self, poll_timeout: float = 1.0):
+        """Основной цикл (до Ctrl+C)"""
+        initial = self.watcher.initial()
+        print(f"👀 Наблюдение за {', '.join(map(str, self.roots))}: файлов {len(initial)}")
+        self.consider(initial)
+        try:
+            while True:
+                self.consider(self.watcher.changes(poll_timeout))
+                self.submit_ready()
+                self.collect_finished()
+        finally:
+            self.watcher.close()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            if self._translations:
+                self._translations.shutdown(wait=False, cancel_futures=True)
+
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Транскрибация новых файлов в папках")
+    parser.add_argument("folders", nargs="+", type=Path, help="Наблюдаемые папки")
+    parser.add_argument("--output-dir", type=Path, help="Папка для текстов (по умолчанию рядом с аудио)")
+    parser.add_argument("--workers", type=int, default=1, help="Процессов с моделью")
+    parser.add_argument("--threads", type=int, default=0, help="Потоков PyTorch на процесс")
+    parser.add_argument("--settle", type=float, default=5.0,
+                        help="Сколько секунд файл не должен меняться перед обработкой")
+    parser.add_argument("--polling", action="store_true", help="Обход папок вместо inotify")
+    parser.add_argument("--interval", type=float, default=5.0, help="Период обхода папок")
+    parser.add_argument("--translate", action="store_true", help="Переводить готовые тексты")
+    parser.add_argument("--index", type=Path, default=DEFAULT_INDEX, help="Журнал обработанных файлов")
+    args = parser.parse_args()
+
+    for folder in args.folders:
+        if not folder.is_dir():
+            print(f"❌ Папка не найдена: {folder}")
+            sys.exit(1)
+
+    translator = Translator(load_settings()) if args.translate else None
+    daemon = WatchDaemon(
+        args.folders,
+        FileIndex(args.index),
+        output_dir=args.output_dir.resolve() if args.output_dir else None,
+        workers=max(1, args.workers),
+        threads=args.threads,
+        settle=args.settle,
+        polling=args.polling,
+        interval=args.interval,
+        translator=translator,
+    )
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        print("\n⏹️ Остановлено")
+
+
+if __name__ == "__main__":
+    main()
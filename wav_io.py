@@ -0,0 +1,193 @@
+"""
+Чтение WAV без pydub и ffmpeg
+
+Заголовок RIFF разбирается вручную, данные отображаются в память через
+np.memmap, а в float32 моно переводится только запрошенный участок.
+Файл, который уже записан с частотой 16 кГц (PCM 8/16/24/32 бит или
+float), транскрибируется без полной копии в памяти: признаки каждого
+окна считаются из его собственного среза.
+"""
+
+import struct
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavInfo(NamedTuple):
+    """Параметры WAV из заголовка"""
+    format_tag: int
+    channels: int
+    sample_rate: int
+    sample_width: int
+    data_offset: int
+    frames: int
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.frames / self.sample_rate if self.sample_rate else 0.0
+
+
+def parse_wav_header(file_path: Path) -> Optional[WavInfo]:
+    """
+    Разбор заголовка WAV без чтения сэмплов
+
+    Args:
+        file_path: Путь к файлу
+
+    Returns:
+        Optional[WavInfo]: Параметры или None, если это не WAV
+        (или формат, который здесь не разбирается, например RF64)
+    """
+    file_path = Path(file_path)
+    file_size = file_path.stat().st_size
+    with open(file_path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            return None
+
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                body = f.read(chunk_size + (chunk_size & 1))
+                if len(body) < 16:
+                    return None
+                format_tag, channels, sample_rate, _, block_align, bits = struct.unpack(
+                    "<HHIIHH", body[:16]
+                )
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    # Настоящий формат - первые два байта GUID подформата
+                    format_tag = struct.unpack("<H", body[24:26])[0]
+                fmt = (format_tag, channels, sample_rate, block_align, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    return None
+                format_tag, channels, sample_rate, block_align, bits = fmt
+                if not channels or not block_align:
+                    return None
+                data_offset = f.tell()
+                # Размер 0 или 0xFFFFFFFF пишут программы, записывающие поток
+                available = file_size - data_offset
+                if chunk_size == 0 or chunk_size > available:
+                    chunk_size = available
+                return WavInfo(
+                    format_tag=format_tag,
+                    channels=channels,
+                    sample_rate=sample_rate,
+                    sample_width=block_align // channels,
+                    data_offset=data_offset,
+                    frames=chunk_size // block_align,
+                )
+            else:
+                # Чанки выровнены по четной границе
+                f.seek(chunk_size + (chunk_size & 1), 1)
+
+
+class WavSamples:
+    """
+    Сэмплы WAV как моно float32 с ленивым преобразованием
+
+    Поддерживает len() и срезы samples[start:end], как массив NumPy;
+    np.asarray(samples) создает полную копию.
+    """
+
+    def __init__(self, file_path: Path, info: WavInfo):
+        self.path = Path(file_path)
+        self.info = info
+        width = info.sample_width
+        if info.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+            dtype = {4: "<f4", 8: "<f8"}[width]
+            self._scale = 1.0
+            self._offset = 0.0
+        elif width == 3:
+            # 24 бит не отображаются на тип NumPy: байты собираются при чтении
+            dtype = "u1"
+            self._scale = 1.0 / (1 << 23)
+            self._offset = 0.0
+        else:
+            dtype = {1: "u1", 2: "<i2", 4: "<i4"}[width]
+            # Для 16 бит - та же нормализация, что и при декодировании через pydub
+            self._scale = {1: 1.0 / 128, 2: 1.0 / np.iinfo(np.int16).max, 4: 1.0 / (1 << 31)}[width]
+            self._offset = 128.0 if width == 1 else 0.0
+
+        shape = (info.frames, info.channels, 3) if width == 3 else (info.frames, info.channels)
+        if info.frames:
+            self._data = np.memmap(self.path, dtype=dtype, mode="r",
+                                   offset=info.data_offset, shape=shape)
+        else:
+            self._data = np.zeros(shape, dtype=dtype)
+
+    def __len__(self) -> int:
+        return self.info.frames
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise Exception("Срез с шагом не поддерживается")
+            return self._convert(self._data[start:max(start, stop)])
+        index = range(len(self))[key]
+        return self._convert(self._data[index:index + 1])[0]
+
+    def _convert(self, block: np.ndarray) -> np.ndarray:
+        if self.info.sample_width == 3:
+            raw = block.astype(np.int32)
+            block = (raw[..., 0] | (raw[..., 1] << 8) | (raw[..., 2] << 16)) << 8 >> 8
+        samples = block.astype(np.float32)
+        if self._offset:
+            samples -= self._offset
+        if self.info.channels > 1:
+            samples = samples.mean(axis=1)
+        else:
+            samples = samples[:, 0]
+        if self._scale != 1.0:
+            samples *= self._scale
+        return samples
+
+    def __array__(self, dtype=None, copy=None):
+        samples = self[:]
+        return samples.astype(dtype) if dtype is not None else samples
+
+    def close(self):
+        """
+        Освобождение отображения файла (на Windows файл нельзя удалить,
+        пока он отображен в память); срезы - копии и остаются доступны
+        """
+        self._data = np.zeros((0,) + self._data.shape[1:], dtype=self._data.dtype)
+        self.info = self.info._replace(frames=0)
+
+
+def open_wav_samples(file_path: Path, sample_rate: int = 16000) -> Optional[WavSamples]:
+    """
+    Быстрое открытие WAV, уже записанного с нужной частотой
+
+    Args:
+        file_path: Путь к файлу
+        sample_rate: Частота, которую ожидает модель
+
+    Returns:
+        Optional[WavSamples]: Сэмплы или None, если файл нужно декодировать
+        обычным путем (другая частота, сжатый формат, не WAV)
+    """
+    try:
+        info = parse_wav_header(file_path)
+    except (OSError, struct.error):
+        return None
+    if info is None or info.sample_rate != sample_rate:
+        return None
+    supported = (
+        (info.format_tag == WAVE_FORMAT_PCM and info.sample_width in (1, 2, 3, 4))
+        or (info.format_tag == WAVE_FORMAT_IEEE_FLOAT and info.sample_width in (4, 8))
+    )
+    if not supported:
+        return None
+    return WavSamples(file_path, info)